@@ -0,0 +1,106 @@
+# %%
+""" times the duplicate detection of a generated bib library with known duplicates
+
+    python benchmarks/bib_dedupe.py
+    python benchmarks/bib_dedupe.py --entries 1000 50000 --duplicates 0.05
+
+    A fraction of the generated entries is copied under a new key with a changed title (other case, punctuation,
+    curly brackets, a short word dropped from a long title or a typo), a doi url or an abbreviated first name. The
+    clusters are compared with the known duplicates. For the smallest library, they are also compared with comparing
+    every pair of entries. Exits with 1 if a duplicate is missed or the pairwise comparison finds other clusters.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+from itertools import combinations
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from pybtex.database import parse_string # type: ignore
+
+import pylatex_tools as pl
+from generators import generate_bibliography, bib_key
+
+def add_duplicates(bib_str: str, n_entries: int, fraction: float, seed: int = 0) -> tuple[str, dict[str, str]]:
+    """appends changed copies of a fraction of the entries, returns the bib file and copy key -> original key"""
+    rng = random.Random(seed)
+    bib_dict = parse_string(bib_str, 'bibtex')
+    out = [bib_str]
+    originals = {}
+    for n, i in enumerate(rng.sample(range(n_entries), int(fraction * n_entries))):
+        entry = bib_dict.entries[bib_key(i)]
+        title = entry.fields['title']
+        change = n % 4
+        if change == 0:
+            title = title.upper().replace('{', '').replace('}', '') + '.'
+        elif change == 1 and len(title.split()) >= 9:
+            # a short word (e.g., 'of'), a longer word or a word in a shorter title changes more than 10% of the title (see threshold)
+            words = title.split()
+            del words[rng.choice([k for k in range(1, len(words)) if len(words[k]) <= 4] or [len(words) - 1])]
+            title = ' '.join(words)
+        elif change == 1:
+            title = title.replace(' ', ': ', 1)
+        elif change == 2:
+            k = rng.randrange(len(title) // 2, len(title) - 1)
+            title = title[:k] + title[k + 1] + title[k] + title[k + 2:]
+        authors = ' and '.join(str(p) for p in entry.persons['author'])
+        if n % 3 == 0:
+            first = entry.persons['author'][0]
+            authors = ' and '.join(['%s, %s.' % (' '.join(first.last_names), first.first_names[0][0])] + authors.split(' and ')[1:])
+        key = 'copy%06d' % n
+        fields = ['  title={%s}' % title, '  author={%s}' % authors, '  year={%s}' % entry.fields['year']]
+        if n % 5 == 0:
+            # doi only in the copy, the title has to be recognized
+            fields.append('  url={https://doi.org/10.5555/%06d}' % i)
+        out.append('@article{%s,\n%s\n}\n\n' % (key, ',\n'.join(fields)))
+        originals[key] = bib_key(i)
+    return ''.join(out), originals
+
+def pairwise_clusters(duplicates: 'pl.BibliographyDuplicates') -> set[frozenset[str]]:
+    """clusters found by comparing every pair of entries with the same criteria"""
+    records = duplicates.records
+    parent = list(range(len(records)))
+    def find(i: int) -> int:
+        while parent[i] != i:
+            i = parent[i]
+        return i
+    for i, j in combinations(range(len(records)), 2):
+        r, s = records[i], records[j]
+        same = (r.doi and r.doi == s.doi) or (r.title and (r.title, r.year, r.author) == (s.title, s.year, s.author)) or duplicates._similar(r, s)
+        if same:
+            parent[max(find(i), find(j))] = min(find(i), find(j))
+    clusters: dict[int, set[str]] = {}
+    for i, r in enumerate(records):
+        clusters.setdefault(find(i), set()).add(r.key)
+    return {frozenset(c) for c in clusters.values() if len(c) > 1}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "times the duplicate detection of bib libraries with known duplicates",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-e', '--entries', type = int, nargs = '*', default = [1000, 50000], help = 'numbers of entries of the bib libraries. Default 1000 50000.')
+    parser.add_argument('-d', '--duplicates', type = float, default = 0.05, help = 'fraction of the entries that are copied. Default 0.05.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed. Default 0.')
+    args = parser.parse_args()
+
+    ok = True
+    print('%9s %11s %10s %10s %10s' % ('entries', 'duplicates', 'clusters', 'missed', 'time [s]'))
+    for n in args.entries:
+        bib_str, originals = add_duplicates(generate_bibliography(n, seed=args.seed), n, args.duplicates, args.seed)
+        bib_dict = parse_string(bib_str, 'bibtex')
+        start = time.perf_counter()
+        duplicates = pl.BibliographyDuplicates(bib_dict)
+        seconds = time.perf_counter() - start
+        missed = [k for k, original in originals.items() if duplicates.canonical_key(k) != original]
+        print('%9d %11d %10d %10d %10.3f' % (len(bib_dict.entries), len(originals), len(duplicates), len(missed), seconds))
+        ok = ok and not missed
+        if n == min(args.entries):
+            start = time.perf_counter()
+            same = pairwise_clusters(duplicates) == {frozenset(c['keys']) for c in duplicates.clusters}
+            print('%9s %11s %10s %10s %10.3f  every pair: clusters %s' % ('', '', '', '', time.perf_counter() - start, 'same' if same else 'DIFFERENT'))
+            ok = ok and same
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,94 @@
+# %%
+""" compares the regex and the tokenizer detex backend
+
+    python benchmarks/detex_backends.py
+    python benchmarks/detex_backends.py --sections 100 1000 5000 --lines 2000 4000 8000 16000 --depths 16000 64000 256000
+
+    For generated theses: time, throughput and number of words of both backends. For documents with unclosed curly
+    brackets: the time per line, which stays constant for the tokenizer (linear time) and grows for the regex rules.
+    For deeply nested commands (e.g., \section{\section{...}}, with optional arguments and stacked accents): the time
+    per token of the tokenizer, which has to stay constant. Exits with 1 if it grows with the depth.
+"""
+import gc
+import os
+import sys
+import time
+import argparse
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pylatex_tools as pl
+from generators import generate_thesis
+
+def best_time(func, repeats: int = 3) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def unclosed_braces(n_lines: int) -> str:
+    """a document where every line opens a curly bracket that is never closed"""
+    return '\\begin{document}\n' + 'word {\\emph{nested} more text\n' * n_lines
+
+def compare_theses(sections: list[int], seed: int = 0) -> None:
+    print('%-10s %9s %10s %10s %10s' % ('backend', 'sections', 'time [s]', 'MB/s', 'words'))
+    for n in sections:
+        text = generate_thesis(n, seed=seed)
+        for backend in pl.detex_backends:
+            seconds = best_time(lambda: pl.detex(text, backend))
+            words = len(pl.detex(text, backend).replace('\\', '').split())
+            print('%-10s %9d %10.3f %10.2f %10d' % (backend, n, seconds, len(text) / 1e6 / seconds, words))
+
+def compare_scaling(lines: list[int]) -> None:
+    print('\n%-10s %9s %10s %14s' % ('backend', 'lines', 'time [s]', 'us per line'))
+    for n in lines:
+        text = unclosed_braces(n)
+        for backend in pl.detex_backends:
+            seconds = best_time(lambda: pl.detex(text, backend), repeats=1)
+            print('%-10s %9d %10.3f %14.1f' % (backend, n, seconds, 1e6 * seconds / n))
+
+# documents with commands nested n times
+nested_commands = {
+    'section': lambda n: '\\section{word ' * n,
+    'section[opt]': lambda n: '\\section[short]{word ' * n + '}' * n,
+    'href': lambda n: '\\href{url ' * n + '}{text}' * n,
+    'accent': lambda n: '\\"{' * n + 'e' + '}' * n,
+}
+
+def compare_nesting(depths: list[int], max_growth: float = 2) -> bool:
+    """returns whether the time per token of the tokenizer grows by at most max_growth from the smallest to the largest depth"""
+    print('\n%-14s %9s %10s %14s' % ('nested', 'depth', 'time [s]', 'us per token'))
+    ok = True
+    for name, make in nested_commands.items():
+        per_token = []
+        for n in depths:
+            text = make(n)
+            # the garbage collector walks the deep stack of open brackets, which is not part of the algorithm
+            gc.disable()
+            try:
+                seconds = best_time(lambda: pl.detex(text, 'tokenizer'), repeats=1)
+            finally:
+                gc.enable()
+            per_token.append(1e6 * seconds / n)
+            print('%-14s %9d %10.3f %14.1f' % (name, n, seconds, per_token[-1]))
+        if per_token[-1] > max_growth * per_token[0]:
+            print('%s: the time per token grows with the depth' % name)
+            ok = False
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "compares the time of the regex and the tokenizer detex backend",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sections', type = int, nargs = '*', default = [100, 1000], help = 'numbers of sections of the theses. Default 100 1000.')
+    parser.add_argument('-l', '--lines', type = int, nargs = '*', default = [2000, 4000, 8000], help = 'numbers of lines of the documents with unclosed brackets. Default 2000 4000 8000.')
+    parser.add_argument('-d', '--depths', type = int, nargs = '*', default = [16000, 64000, 256000], help = 'numbers of nested commands. Default 16000 64000 256000.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed of the theses. Default 0.')
+    args = parser.parse_args()
+
+    compare_theses(args.sections, args.seed)
+    compare_scaling(args.lines)
+    sys.exit(0 if compare_nesting(args.depths) else 1)
@@ -0,0 +1,149 @@
+# %%
+""" seeded generators of large synthetic inputs: theses (tex) and bib libraries
+
+    the same arguments (and seed) always give the same text, so results can be compared across commits
+"""
+import os
+import random
+import argparse
+
+words = ('the of and to in is that for on with as by this are be from at an which results model data we our method these '
+         'analysis between using were it not was also can than has have more two both each different however study '
+         'protein quantum structure measurement signal network learning cell function energy field sample theory').split()
+first_names = ['Ulrich', 'Albert', 'Boris', 'Nathan', 'Helmut', 'Marie', 'Ada', 'Alan', 'Grace', 'Emmy', 'Niels', 'Lise', 'Paul', 'Rosalind']
+last_names = ['Laemmli', 'Einstein', 'Podolsky', 'Rosen', 'Schmidt', 'Curie', 'Lovelace', 'Turing', 'Hopper', 'Noether', 'Bohr', 'Meitner',
+              'Dirac', 'Franklin', 'M{\\"u}ller', 'Schr{\\"o}dinger']
+journals = ['Nature', 'Physical review', 'Science', 'The Journal of Parapsychology', 'Cell', 'Neuron', 'Journal of Machine Learning Research']
+
+def bib_key(i: int) -> str:
+    """key of the i-th entry of generate_bibliography"""
+    return 'key%06d' % i
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return ' '.join(rng.choice(words) for _ in range(n))
+
+def _cite(rng: random.Random, n_keys: int) -> str:
+    keys = ','.join(bib_key(rng.randrange(n_keys)) for _ in range(rng.randint(1, 3)))
+    return rng.choice(['\\cite{%s}', '\\citep{%s}', '\\citet[p.~5]{%s}', '\\autocite{%s}', '\\parencite[see][12]{%s}']) % keys
+
+def _paragraph(rng: random.Random, n_keys: int, cite_density: float) -> str:
+    parts = []
+    for _ in range(rng.randint(3, 8)):
+        s = _sentence(rng, rng.randint(8, 25))
+        r = rng.random()
+        if r < 0.15:
+            s += ' \\emph{%s}' % _sentence(rng, 3)
+        elif r < 0.25:
+            # nested braces
+            s += ' \\textbf{%s \\emph{%s {%s}} %s}' % (_sentence(rng, 2), _sentence(rng, 2), _sentence(rng, 1), _sentence(rng, 2))
+        elif r < 0.32:
+            s += ' $a_{%d} + b^{2}$' % rng.randint(0, 9)
+        elif r < 0.36:
+            s += '\\footnote{%s}' % _sentence(rng, 6)
+        if rng.random() < cite_density:
+            s += ' ' + _cite(rng, n_keys)
+        parts.append(s + '.')
+        if rng.random() < 0.05:
+            parts.append('%% %s' % _sentence(rng, 5))
+    return '\n'.join(parts) + '\n\n'
+
+def _table(rng: random.Random) -> str:
+    rows = ['%s & %d & %.2f \\\\' % (rng.choice(words), rng.randint(0, 100), rng.random()) for _ in range(rng.randint(3, 10))]
+    return ('\\begin{table}[h]\n\\centering\n\\begin{tabular}{l|r|r}\n\\hline\n%s\n\\hline\n\\end{tabular}\n\\caption{%s}\n\\label{tab:%d}\n\\end{table}\n\n'
+            % ('\n'.join(rows), _sentence(rng, 8), rng.randrange(10**6)))
+
+def _figure(rng: random.Random) -> str:
+    return '\\begin{figure}[h]\n\\includegraphics[width=0.5\\textwidth]{fig%d.png}\n\\caption{%s}\n\\end{figure}\n\n' % (rng.randrange(1000), _sentence(rng, 10))
+
+def _comment_environment(rng: random.Random) -> str:
+    return '\\begin{comment}\n%s\\end{comment}\n\n' % _paragraph(rng, 1, 0)
+
+def generate_thesis(n_sections: int = 100, n_keys: int = 1000, cite_density: float = 0.3, seed: int = 0) -> str:
+    """generates a thesis-like tex document
+
+        Chapters with sections, subsections and paragraphs of random text with dense citations (natbib and biblatex
+        commands with optional arguments), nested braces, math, footnotes, tables, figures, line comments,
+        comment environments and %TC:ignore blocks.
+
+    Args:
+        n_sections (int, optional): number of sections. Defaults to 100.
+        n_keys (int, optional): citation keys are drawn from the first n_keys keys of generate_bibliography. Defaults to 1000.
+        cite_density (float, optional): probability of a citation after a sentence. Defaults to 0.3.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        str: tex document
+    """
+    rng = random.Random(seed)
+    out = ['\\documentclass{report}\n\\usepackage{natbib}\n\\usepackage{comment}\n\\title{%s}\n\\author{%s %s}\n\\begin{document}\n\\maketitle\n\n'
+           % (_sentence(rng, 6), rng.choice(first_names), rng.choice(last_names))]
+    for s in range(n_sections):
+        if s % 10 == 0:
+            out.append('\\chapter{%s}\n\n' % _sentence(rng, 3))
+        out.append('\\section{%s}\n\\label{sec:%d}\n\n' % (_sentence(rng, 4), s))
+        for ss in range(rng.randint(0, 3)):
+            out.append('\\subsection{%s}\n\n' % _sentence(rng, 3))
+            if rng.random() < 0.3:
+                out.append('\\subsubsection*{%s}\n\n' % _sentence(rng, 2))
+            for p in range(rng.randint(1, 4)):
+                if rng.random() < 0.2:
+                    out.append('\\paragraph{%s}\n' % _sentence(rng, 2))
+                out.append(_paragraph(rng, n_keys, cite_density))
+            r = rng.random()
+            if r < 0.2:
+                out.append(_table(rng))
+            elif r < 0.35:
+                out.append(_figure(rng))
+            elif r < 0.4:
+                out.append(_comment_environment(rng))
+            elif r < 0.45:
+                out.append('%%TC:ignore\n%s%%TC:endignore\n\n' % _paragraph(rng, n_keys, cite_density))
+    out.append('\\bibliographystyle{plain}\n\\bibliography{references}\n\\end{document}\n')
+    return ''.join(out)
+
+def generate_bibliography(n_entries: int = 1000, seed: int = 0) -> str:
+    """generates a bib library with n_entries entries (keys see bib_key) and a few @string macros
+
+    Args:
+        n_entries (int, optional): number of entries. Defaults to 1000.
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        str: bib file
+    """
+    rng = random.Random(seed)
+    out = ['@string{nat = "Nature"}\n@string{prl = "Physical Review Letters"}\n\n']
+    for i in range(n_entries):
+        authors = ' and '.join('%s, %s' % (rng.choice(last_names), rng.choice(first_names)) for _ in range(rng.randint(1, 6)))
+        fields = ['  title={%s {%s} %s}' % (_sentence(rng, rng.randint(3, 8)).capitalize(), rng.choice(words).upper(), _sentence(rng, 3)),
+                  '  author={%s}' % authors,
+                  '  journal=%s' % rng.choice(['nat', 'prl', '{%s}' % rng.choice(journals)]),
+                  '  volume={%d}' % rng.randint(1, 500),
+                  '  pages={%d--%d}' % (rng.randint(1, 500), rng.randint(501, 999)),
+                  '  year={%d}' % rng.randint(1900, 2024)]
+        if rng.random() < 0.5:
+            fields.append('  abstract={%s}' % _sentence(rng, rng.randint(50, 150)))
+        if rng.random() < 0.3:
+            fields.append('  keywords={%s}' % ', '.join(rng.choice(words) for _ in range(4)))
+        if rng.random() < 0.3:
+            fields.append('  file={:files/%d.pdf:pdf}' % i)
+        out.append('@article{%s,\n%s\n}\n\n' % (bib_key(i), ',\n'.join(fields)))
+    return ''.join(out)
+
+def write(text: str, filename: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return filename
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "writes a synthetic thesis and bib library",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sections', type = int, default = 1000, help = 'number of sections of the thesis. Default 1000.')
+    parser.add_argument('-e', '--entries', type = int, default = 10000, help = 'number of entries of the bib library. Default 10000.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed. Default 0.')
+    parser.add_argument('-o', '--out_dir', type = str, default = 'benchmark-data', help = 'output directory. Default benchmark-data.')
+    args = parser.parse_args()
+
+    print(write(generate_thesis(args.sections, min(args.entries, 1000), seed=args.seed), os.path.join(args.out_dir, 'thesis.tex')))
+    print(write(generate_bibliography(args.entries, seed=args.seed), os.path.join(args.out_dir, 'references.bib')))
@@ -0,0 +1,74 @@
+# %%
+""" checks that the command line tool starts fast: runs pylatex-tools.py with python -X importtime and fails
+    (exit code 1) if the imports take longer than the budget or if modules are imported that the operation does not need
+    (e.g., pybtex for detex and count_words). Also fails if importing a submodule directly replaces the functions of the
+    package with modules (e.g., pylatex_tools.detex after import pylatex_tools.count_words)
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget_ms 80 --tex_filename small.tex
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# operation -> modules that must not be imported
+forbidden_modules = {
+    'detex': ['pybtex', 'pylatex_tools.texproject', 'pylatex_tools.count_words', 'http.server'],
+    'count_words': ['pybtex', 'http.server'],
+    'count_citations': ['pybtex', 'http.server'],
+}
+
+def measure_imports(operation: str, tex_filename: str) -> dict[str, tuple[int, bool]]:
+    """runs an operation with python -X importtime
+
+    Returns:
+        dict: name of each imported module -> (cumulative import time in microseconds, whether it is a top level import)
+    """
+    cmd = [sys.executable, '-X', 'importtime', os.path.join(root, 'pylatex-tools.py'), operation, tex_filename, '--no_cache']
+    output = subprocess.run(cmd, capture_output=True, text=True, cwd=root)
+    if output.returncode != 0:
+        raise RuntimeError('%s failed:\n%s' % (' '.join(cmd), output.stderr))
+    times = {}
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # top level imports are indented by a single space
+        times[name.strip()] = (int(cumulative), name.startswith(' ') and not name.startswith('  '))
+    return times
+
+def check(operation: str, tex_filename: str, budget_ms: float) -> dict:
+    times = measure_imports(operation, tex_filename)
+    total_ms = sum(t for t, top_level in times.values() if top_level) / 1000
+    forbidden = [m for m in forbidden_modules.get(operation, []) if m in times]
+    return {'operation': operation, 'import_ms': round(total_ms, 1), 'budget_ms': budget_ms, 'forbidden_imports': forbidden,
+            'ok': total_ms <= budget_ms and not forbidden}
+
+def check_submodule_import(module: str = 'count_words') -> dict:
+    """checks that importing a submodule directly (e.g., import pylatex_tools.count_words) does not replace the public
+    names of the package (pylatex_tools.count_words, pylatex_tools.detex, ...) with modules"""
+    code = ('import json, types, pylatex_tools.%s, pylatex_tools as pl\n'
+            # vars: getattr would import the other submodules, which binds the names again
+            'print(json.dumps([n for n, v in vars(pl).items() if n in pl.__all__ and isinstance(v, types.ModuleType)]))' % module)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=root)
+    if output.returncode != 0:
+        raise RuntimeError('import pylatex_tools.%s failed:\n%s' % (module, output.stderr))
+    shadowed = json.loads(output.stdout)
+    return {'operation': 'import pylatex_tools.%s' % module, 'names_bound_to_modules': shadowed, 'ok': not shadowed}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "checks the import time of pylatex-tools.py against a budget",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--operations', nargs = '*', default = ['detex', 'count_words', 'count_citations'], help = 'operations to check')
+    parser.add_argument('-t', '--tex_filename', type = str, default = os.path.join(root, 'example', 'main.tex'), help = 'path to a (small) latex file')
+    parser.add_argument('-b', '--budget_ms', type = float, default = 100, help = 'maximum import time in ms. Default 100.')
+    args = parser.parse_args()
+
+    results = [check(op, args.tex_filename, args.budget_ms) for op in args.operations]
+    results.append(check_submodule_import())
+    print(json.dumps(results, indent = 2))
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
@@ -0,0 +1,80 @@
+# %%
+""" times the suggestions for mistyped citation keys against comparing them with every key of the bibliography
+
+    python benchmarks/key_suggestions.py
+    python benchmarks/key_suggestions.py --keys 50000 --queries 200
+
+    The keys look like author_year_word (e.g., laemmli_1970_cleavage). For the 'dense' keys the authors come from a
+    short list, so many keys share long parts. Each query is a key with a typo (swapped, dropped or inserted
+    character), a few queries are not close to any key. The suggestions of the index are compared with the closest
+    keys found by computing the distance to every key. Exits with 1 if they differ.
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pylatex_tools as pl
+from pylatex_tools.keyindex import edit_distance
+from generators import last_names, words
+
+syllables = ['ba', 'ko', 'mi', 'ler', 'son', 'berg', 'man', 'ri', 'ta', 'vo', 'ne', 'schu', 'holt', 'wa', 'ge', 'lin', 'ar', 'dt', 'ez', 'ova']
+
+def generate_keys(n: int, dense: bool, rng: random.Random) -> list[str]:
+    """n distinct keys author_year_word[word]"""
+    keys: dict[str, None] = {}
+    while len(keys) < n:
+        author = re.sub(r'[^a-z]', '', rng.choice(last_names).lower()) if dense else ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+        keys['%s_%d_%s%s' % (author, rng.randint(1900, 2024), rng.choice(words), rng.choice(['', rng.choice(words)]))] = None
+    return list(keys)
+
+def typo(key: str, rng: random.Random) -> str:
+    i = rng.randrange(len(key) - 1)
+    change = rng.randrange(3)
+    if change == 0:
+        return key[:i] + key[i + 1] + key[i] + key[i + 2:]
+    if change == 1:
+        return key[:i] + key[i + 1:]
+    return key[:i] + rng.choice('abcdefgh') + key[i:]
+
+def brute_force(key: str, keys: list[str], k: int = 3) -> list[tuple[str, int]]:
+    """closest keys within the default maximum distance of KeyIndex.suggest, computed for every key"""
+    lower = key.lower()
+    max_distance = 2 if len(lower) < 24 else 3
+    distances = [(edit_distance(lower, other.lower(), max_distance), i) for i, other in enumerate(keys) if other.lower() != lower]
+    return [(keys[i], d) for d, i in sorted(distances) if d <= max_distance][:k]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "times the suggestions for mistyped citation keys",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', '--keys', type = int, default = 50000, help = 'number of keys of the bibliography. Default 50000.')
+    parser.add_argument('-q', '--queries', type = int, default = 200, help = 'number of mistyped keys. Default 200.')
+    parser.add_argument('-c', '--compare', type = int, default = 20, help = 'number of queries that are also compared with every key. Default 20.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed. Default 0.')
+    args = parser.parse_args()
+
+    ok = True
+    print('%6s %8s %10s %14s %14s %10s' % ('keys', '', 'build [s]', 'index [ms/q]', 'every [ms/q]', 'mismatch'))
+    for dense in [False, True]:
+        rng = random.Random(args.seed)
+        keys = generate_keys(args.keys, dense, rng)
+        start = time.perf_counter()
+        index = pl.KeyIndex(keys)
+        build = time.perf_counter() - start
+        queries = [typo(k, rng) for k in rng.sample(keys, args.queries)] + ['x', 'zz_1', 'nothing_like_any_key_at_all']
+        start = time.perf_counter()
+        suggestions = [index.suggest(q) for q in queries]
+        per_query = 1000 * (time.perf_counter() - start) / len(queries)
+        compared = list(zip(queries, suggestions))[:args.compare] + list(zip(queries, suggestions))[-3:]
+        start = time.perf_counter()
+        mismatch = sum(brute_force(q, keys) != s for q, s in compared)
+        every = 1000 * (time.perf_counter() - start) / len(compared)
+        print('%6d %8s %10.2f %14.2f %14.2f %10d' % (len(index), 'dense' if dense else 'realistic', build, per_query, every, mismatch))
+        ok = ok and not mismatch
+    sys.exit(0 if ok else 1)
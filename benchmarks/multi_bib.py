@@ -0,0 +1,76 @@
+# %%
+""" times merging several bib files with BibStore against parsing every file
+
+    python benchmarks/multi_bib.py
+    python benchmarks/multi_bib.py --entries 50000 --cited 500
+
+    A generated thesis cites the keys of a personal, a lab-wide and a project bib file: half of the cited keys are
+    defined in the (small) personal file, which also redefines uncited and cited keys of the (large) lab file
+    with different entries. The keys of the project file are not cited, so it does not have to be parsed. The
+    entries and conflicts found by BibStore (parsing whole files or only the cited entries) are compared with
+    parsing every file and merging them (the first file that defines a key is used). Exits with 1 if they differ.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pylatex_tools as pl
+from pylatex_tools.bibcache import parse_bib_file
+from generators import generate_bibliography, bib_key, write
+
+def renumber(bib_str: str, prefix: str = 'key', offset: int = 0) -> str:
+    """renames the keys key000000, key000001, ... of a generated bib file to prefix + (number + offset)"""
+    return re.sub(r'@article\{key(\d{6}),', lambda m: '@article{%s%06d,' % (prefix, int(m.group(1)) + offset), bib_str)
+
+def merge_every_file(bib_filenames: list[str]) -> dict:
+    """parses every file and keeps the first definition of each key"""
+    entries: dict = {}
+    for bib_filename in bib_filenames:
+        for key, entry in parse_bib_file(bib_filename).entries.items():
+            entries.setdefault(key.lower(), entry)
+    return entries
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "times merging several bib files with BibStore",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-e', '--entries', type = int, default = 50000, help = 'number of entries of the lab-wide bib file. Default 50000.')
+    parser.add_argument('-c', '--cited', type = int, default = 500, help = 'number of cited keys. Default 500.')
+    parser.add_argument('-j', '--jobs', type = int, default = None, help = 'worker processes of BibStore. Default: one per file that has to be parsed.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed. Default 0.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # personal: keys cited / 2 ... cited / 2 + 2 * cited, defined with other entries than in the lab file
+        bib_filenames = [write(renumber(generate_bibliography(2 * args.cited, seed=args.seed + 1), offset=args.cited // 2), os.path.join(tmp, 'personal.bib')),
+                         write(generate_bibliography(args.entries, seed=args.seed), os.path.join(tmp, 'lab.bib')),
+                         write(renumber(generate_bibliography(args.entries // 2, seed=args.seed + 2), 'proj'), os.path.join(tmp, 'project.bib'))]
+        cite_keys = [bib_key(i) for i in range(args.cited)]
+        expected_conflicts = [bib_key(i) for i in range(args.cited // 2, args.cited)]
+
+        start = time.perf_counter()
+        merged = merge_every_file(bib_filenames)
+        every_file = time.perf_counter() - start
+        expected = {k: merged[k.lower()].to_string('bibtex') for k in cite_keys}
+
+        ok = True
+        print('%-28s %10s %10s %10s' % ('', 'time [s]', 'entries', 'conflicts'))
+        print('%-28s %10.3f %10d %10s' % ('parse every file', every_file, len(expected), ''))
+        for fast_subset in [False, True]:
+            start = time.perf_counter()
+            store = pl.BibStore(bib_filenames, use_cache=False, verbose=False, jobs=args.jobs)
+            bib_dict = store.get_bibliography(cite_keys, fast_subset)
+            conflicts = store.conflicts(cite_keys)
+            seconds = time.perf_counter() - start
+            store.close()
+            same = {k: bib_dict.entries[k].to_string('bibtex') for k in cite_keys if k in bib_dict.entries} == expected and list(conflicts) == expected_conflicts
+            print('%-28s %10.3f %10d %10d  %s' % ('BibStore' + (' (fast_subset)' if fast_subset else ''), seconds, len(bib_dict.entries), len(conflicts),
+                                                 'same' if same else 'DIFFERENT'))
+            ok = ok and same
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,72 @@
+# %%
+""" checks that the parallel detex gives the same output as the serial detex and reports the speedup
+
+    python benchmarks/parallel_detex.py
+    python benchmarks/parallel_detex.py --sections 1000 5000 --jobs 2 4 8
+
+    detex_parallel and count_words_in_list(..., jobs=n) are compared with the serial run on generated theses
+    (several seeds and sizes, small chunks so that even small documents are split) and on the example document.
+    Exits with 1 if any output differs.
+"""
+import os
+import sys
+import time
+import argparse
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pylatex_tools as pl
+from generators import generate_thesis
+
+def best_time(func, repeats: int = 3) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def check_corpus(seeds: list[int], jobs: int) -> int:
+    """compares serial and parallel output, returns the number of documents with a different output"""
+    documents = {'example': pl.get_tex_string_from_file(os.path.join(root, 'example', 'main.tex'))}
+    for seed in seeds:
+        for n in [1, 10, 200]:
+            documents['thesis-%d-seed-%d' % (n, seed)] = generate_thesis(n, seed=seed)
+    failed = 0
+    for name, text in documents.items():
+        lines = pl.strip_comments_in_tex(text.splitlines(keepends=True))
+        same_detex = pl.detex_parallel(text, jobs, min_chunk_size=1) == pl.detex(text)
+        same_counts = pl.count_words_in_list(lines, verbose=False, jobs=jobs) == pl.count_words_in_list(lines, verbose=False)
+        if not (same_detex and same_counts):
+            failed += 1
+            print('%-25s differs (detex %s, count_words_in_list %s)' % (name, 'same' if same_detex else 'different', 'same' if same_counts else 'different'))
+    print('%d of %d documents with the same output in parallel (%d jobs)\n' % (len(documents) - failed, len(documents), jobs))
+    return failed
+
+def report_speedup(sections: list[int], jobs: list[int], seed: int = 0) -> None:
+    """prints the time of the serial and parallel detex and count_words_in_list"""
+    print('%-22s %9s %6s %10s %10s %8s' % ('operation', 'sections', 'jobs', 'serial [s]', 'parallel [s]', 'speedup'))
+    for n in sections:
+        text = generate_thesis(n, seed=seed)
+        lines = pl.strip_comments_in_tex(text.splitlines(keepends=True))
+        serial = {'detex': best_time(lambda: pl.detex(text)),
+                  'count_words_in_list': best_time(lambda: pl.count_words_in_list(lines, verbose=False))}
+        for j in jobs:
+            parallel = {'detex': best_time(lambda: pl.detex_parallel(text, j)),
+                        'count_words_in_list': best_time(lambda: pl.count_words_in_list(lines, verbose=False, jobs=j))}
+            for name in serial:
+                print('%-22s %9d %6d %10.3f %10.3f %7.2fx' % (name, n, j, serial[name], parallel[name], serial[name] / parallel[name]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "compares the output of the serial and parallel detex and reports the speedup",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sections', type = int, nargs = '*', default = [1000, 5000], help = 'numbers of sections of the theses for the speedup. Default 1000 5000.')
+    parser.add_argument('-j', '--jobs', type = int, nargs = '*', default = [2, 4, os.cpu_count() or 1], help = 'numbers of worker processes. Default 2 4 and the number of cpus.')
+    parser.add_argument('--seeds', type = int, nargs = '*', default = [0, 1, 2], help = 'random seeds of the theses for the correctness check. Default 0 1 2.')
+    args = parser.parse_args()
+
+    failed = check_corpus(args.seeds, max(args.jobs))
+    report_speedup(args.sections, sorted(set(args.jobs)))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,160 @@
+# %%
+""" times the main operations on synthetic inputs of several sizes (see generators.py) and writes the results as json
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py --sections 100 1000 --entries 1000 10000 100000 -o results.json
+    python benchmarks/run_benchmarks.py --compare old-results.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from typing import Any, Callable, Optional
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pylatex_tools as pl
+from generators import generate_thesis, generate_bibliography, write
+
+def measure(func: Callable[[], Any], min_time: float = 1.0, max_repeats: int = 5) -> dict[str, float]:
+    """runs func once with tracemalloc to get the peak memory and then repeatedly (until min_time has passed) to get the fastest time
+
+    Returns:
+        dict: seconds (fastest run), peak_memory_mb and repeats
+    """
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = []
+    while len(times) < max_repeats and sum(times) < min_time:
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'peak_memory_mb': peak / 1e6, 'repeats': len(times)}
+
+def tex_benchmarks(tex_filename: str) -> dict[str, Callable[[], Any]]:
+    """benchmarks that only need a tex document"""
+    text = pl.get_tex_string_from_file(tex_filename)
+    lines = pl.strip_comments_in_tex(pl.load_file_as_list(tex_filename))
+    return {
+        'detex': lambda: pl.detex(text),
+        'detex_tokenizer': lambda: pl.detex(text, backend='tokenizer'),
+        # reading included, to compare the peak memory with streaming
+        'detex_file': lambda: pl.detex(pl.get_tex_string_from_file(tex_filename)),
+        'detex_file_stream': lambda: sum(len(chunk) for chunk in pl.detex_file_stream(tex_filename)),
+        'load_preprocessed': lambda: pl.load_preprocessed(tex_filename, ignore_via_tc_ignore=True),
+        'count_words_in_list': lambda: pl.count_words_in_list(lines, verbose=False),
+        'count_words_in_list_single_pass': lambda: pl.count_words_in_list(lines, single_pass=True, verbose=False),
+        'get_citations_in_tex': lambda: pl.get_citations_in_tex(lines, unique_set=False),
+        'count_citations': lambda: pl.count_citations(tex_filename, verbose=False),
+    }
+
+def bib_benchmarks(tex_filename: str, bib_filename: str, out_filename: str) -> dict[str, Callable[[], Any]]:
+    """benchmarks that need a tex document and a bib library"""
+    remove_fields = ['file', 'abstract', 'note']
+    return {
+        'count_citations_with_bibliography': lambda: pl.count_citations(tex_filename, bibliography=bib_filename, use_cache=False, verbose=False),
+        'create_new_bibliography': lambda: pl.create_new_bibliography(tex_filename, bib_filename, out_filename, remove_fields, use_cache=False, verbose=False),
+        'create_new_bibliography_fast_subset': lambda: pl.create_new_bibliography(tex_filename, bib_filename, out_filename, remove_fields, fast_subset=True, verbose=False),
+        'dedupe_bibliography': lambda: pl.dedupe_bibliography(bib_filename, use_cache=False, verbose=False),
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=root, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sections: list[int], entries: list[int], bib_sections: int = 200, seed: int = 0, only: Optional[list[str]] = None) -> dict[str, Any]:
+    """runs all benchmarks
+
+    Args:
+        sections (list): numbers of sections of the generated theses
+        entries (list): numbers of entries of the generated bib libraries
+        bib_sections (int, optional): number of sections of the thesis used with the bib libraries. Defaults to 200.
+        seed (int, optional): random seed of the generators. Defaults to 0.
+        only (list, optional): names of the benchmarks to run. Defaults to None (all).
+
+    Returns:
+        dict: information about the run and one result per benchmark and size
+    """
+    results = []
+    data_dir = tempfile.mkdtemp(prefix='pylatex-tools-benchmark-')
+    try:
+        for n in sections:
+            tex_filename = write(generate_thesis(n, seed=seed), os.path.join(data_dir, 'thesis-%d.tex' % n))
+            size = os.path.getsize(tex_filename)
+            for name, func in tex_benchmarks(tex_filename).items():
+                if only and name not in only:
+                    continue
+                r = {'name': name, 'sections': n, 'bytes': size}
+                r.update(measure(func))
+                r['mb_per_s'] = size / 1e6 / r['seconds']
+                results.append(r)
+                print('%-40s %6d sections %8.3f s %8.2f MB/s %8.1f MB peak' % (name, n, r['seconds'], r['mb_per_s'], r['peak_memory_mb']), file=sys.stderr)
+
+        tex_filename = write(generate_thesis(bib_sections, seed=seed), os.path.join(data_dir, 'thesis-bib.tex'))
+        for n in entries:
+            bib_filename = write(generate_bibliography(n, seed=seed), os.path.join(data_dir, 'references-%d.bib' % n))
+            size = os.path.getsize(bib_filename)
+            for name, func in bib_benchmarks(tex_filename, bib_filename, os.path.join(data_dir, 'out.bib')).items():
+                if only and name not in only:
+                    continue
+                r = {'name': name, 'entries': n, 'bytes': size}
+                r.update(measure(func))
+                r['mb_per_s'] = size / 1e6 / r['seconds']
+                r['entries_per_s'] = n / r['seconds']
+                results.append(r)
+                print('%-40s %6d entries  %8.3f s %8.2f MB/s %8.1f MB peak' % (name, n, r['seconds'], r['mb_per_s'], r['peak_memory_mb']), file=sys.stderr)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return {'commit': git_commit(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'seed': seed, 'results': results}
+
+def _result_key(r: dict[str, Any]) -> tuple[str, str, int]:
+    unit = 'sections' if 'sections' in r else 'entries'
+    return r['name'], unit, r[unit]
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> None:
+    """prints the speedup of each benchmark of new relative to old"""
+    old_results = {_result_key(r): r for r in old['results']}
+    print('%-40s %16s %10s %10s %8s' % ('benchmark', 'size', 'old [s]', 'new [s]', 'speedup'))
+    for r in new['results']:
+        key = _result_key(r)
+        if key in old_results:
+            o = old_results[key]
+            print('%-40s %7d %-8s %10.3f %10.3f %7.2fx' % (key[0], key[2], key[1], o['seconds'], r['seconds'], o['seconds'] / r['seconds']))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "times detex, count_words_in_list, get_citations_in_tex, count_citations and create_new_bibliography on synthetic inputs",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sections', type = int, nargs = '*', default = [100, 1000, 5000], help = 'numbers of sections of the theses. Default 100 1000 5000.')
+    parser.add_argument('-e', '--entries', type = int, nargs = '*', default = [1000, 10000, 100000], help = 'numbers of entries of the bib libraries. Default 1000 10000 100000.')
+    parser.add_argument('-b', '--benchmarks', type = str, nargs = '*', default = None, help = 'names of the benchmarks to run. Default: all.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed of the generators. Default 0.')
+    parser.add_argument('-o', '--out_filename', type = str, default = None, help = 'path to the json file with the results. Default: print to stdout.')
+    parser.add_argument('-c', '--compare', type = str, default = None, help = 'path to the json results of an earlier run to compare with.')
+    args = parser.parse_args()
+
+    results = run(args.sections, args.entries, seed=args.seed, only=args.benchmarks)
+    if args.out_filename:
+        with open(args.out_filename, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), results)
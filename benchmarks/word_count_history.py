@@ -0,0 +1,72 @@
+# %%
+""" times the word count history of a generated thesis with many commits
+
+    python benchmarks/word_count_history.py
+    python benchmarks/word_count_history.py --sections 500 --commits 300
+
+    A temporary git repository is created, each commit adds a sentence to one section. count_words_history (only
+    changed sections are detexed) is compared with counting every revision from scratch. Exits with 1 if the word
+    counts differ.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pylatex_tools as pl
+from generators import generate_thesis
+
+def git(directory: str, *args: str) -> None:
+    subprocess.run(['git', '-c', 'user.name=benchmark', '-c', 'user.email=benchmark@example.com'] + list(args), cwd=directory, check=True,
+                   stdout=subprocess.DEVNULL)
+
+def create_repository(directory: str, n_sections: int, n_commits: int, seed: int = 0) -> list[str]:
+    """commits a thesis and n_commits edits of it, returns the text of each revision"""
+    rng = random.Random(seed)
+    lines = generate_thesis(n_sections, seed=seed).splitlines(keepends=True)
+    headings = [i for i, line in enumerate(lines) if line.startswith('\\section{')]
+    git(directory, 'init', '-q')
+    revisions = []
+    for k in range(n_commits + 1):
+        if k > 0:
+            i = rng.choice(headings)
+            lines[i] = lines[i] + 'Edit %d adds a few more words to this section.\n' % k
+        revisions.append(''.join(lines))
+        with open(os.path.join(directory, 'thesis.tex'), 'w', encoding='utf-8') as f:
+            f.write(revisions[-1])
+        git(directory, 'add', 'thesis.tex')
+        git(directory, 'commit', '-q', '-m', 'revision %d' % k)
+    return revisions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "times the word count history against counting every revision from scratch",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sections', type = int, default = 200, help = 'number of sections of the thesis. Default 200.')
+    parser.add_argument('-c', '--commits', type = int, default = 100, help = 'number of commits after the first one. Default 100.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed. Default 0.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        revisions = create_repository(directory, args.sections, args.commits, args.seed)
+
+        start = time.perf_counter()
+        history = pl.count_words_history(os.path.join(directory, 'thesis.tex'), verbose=False)
+        seconds_history = time.perf_counter() - start
+
+        start = time.perf_counter()
+        words = [sum(pl.count_words_in_list(pl.strip_comments_in_tex(text.splitlines(keepends=True)), verbose=False)[2]) for text in revisions]
+        seconds_scratch = time.perf_counter() - start
+
+    same = words == [h['words'] for h in history]
+    print('%d revisions of a thesis with %d sections' % (len(revisions), args.sections))
+    print('%-22s %10.3f s' % ('count_words_history', seconds_history))
+    print('%-22s %10.3f s' % ('every revision', seconds_scratch))
+    print('word counts %s' % ('same' if same else 'DIFFERENT'))
+    sys.exit(0 if same else 1)
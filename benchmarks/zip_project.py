@@ -0,0 +1,97 @@
+# %%
+""" times reading a latex project from a zip archive against reading the extracted project
+
+    python benchmarks/zip_project.py
+    python benchmarks/zip_project.py --sections 1000 --entries 10000
+
+    A generated thesis is split into one file per chapter (\\include in main.tex) with a few figure files
+    (standalone) and written to a directory and to a zip archive (as downloaded from Overleaf, without the
+    directory). The root document and the bib file are found in the archive. count_words, detex, count_citations
+    and create_new_bibliography are run on the archive (without extracting it), on the extracted project and
+    on extracting the archive first. Exits with 1 if the results differ.
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+import pylatex_tools as pl
+from generators import generate_bibliography, generate_thesis, write
+
+def write_project(directory: str, n_sections: int, n_entries: int, seed: int = 0) -> None:
+    """writes a thesis split into chapters, figure files and the bib file to directory"""
+    parts = re.split(r'(?=\\chapter\{)', generate_thesis(n_sections, min(n_entries, 1000), seed=seed))
+    preamble, chapters = parts[0], parts[1:]
+    end = chapters[-1].index('\\bibliographystyle')
+    chapters[-1], tail = chapters[-1][:end], chapters[-1][end:]
+    includes = ''.join('\\include{chapters/chapter%02d}\n' % i for i in range(len(chapters)))
+    write(preamble + includes + tail, os.path.join(directory, 'main.tex'))
+    os.makedirs(os.path.join(directory, 'chapters'))
+    os.makedirs(os.path.join(directory, 'figures'))
+    for i, chapter in enumerate(chapters):
+        write(chapter, os.path.join(directory, 'chapters', 'chapter%02d.tex' % i))
+    for i in range(3):
+        write('\\documentclass{standalone}\n\\begin{document}\nfigure %d\n\\end{document}\n' % i, os.path.join(directory, 'figures', 'fig%d.tex' % i))
+    write(generate_bibliography(n_entries, seed=seed), os.path.join(directory, 'references.bib'))
+
+def run(filename: str, bib_filename: str, out_filename: str) -> tuple[float, tuple]:
+    """runs all operations on a fresh Document, returns the time and the results"""
+    start = time.perf_counter()
+    document = pl.Document(filename, follow_includes=True)
+    counts = document.count_words(verbose=False)
+    detexed = document.detexed()
+    citations = document.count_citations(bibliography=bib_filename, use_cache=False, verbose=False)
+    document.create_new_bibliography(bib_filename, out_filename, use_cache=False, verbose=False)
+    seconds = time.perf_counter() - start
+    with open(out_filename, 'r', encoding='utf8') as f:
+        new_bib = f.read()
+    return seconds, (counts, detexed, citations['counts'], new_bib)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "times reading a latex project from a zip archive",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sections', type = int, default = 1000, help = 'number of sections of the thesis. Default 1000.')
+    parser.add_argument('-e', '--entries', type = int, default = 10000, help = 'number of entries of the bib file. Default 10000.')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed. Default 0.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        project = os.path.join(tmp, 'project')
+        write_project(project, args.sections, args.entries, args.seed)
+        zip_filename = os.path.join(tmp, 'project.zip')
+        with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as f:
+            for directory, _, filenames in os.walk(project):
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    f.write(path, os.path.relpath(path, project).replace(os.sep, '/'))
+
+        archive = pl.get_archive(zip_filename)
+        found = archive.root == 'main.tex' and pl.Document(zip_filename, follow_includes=True).bib_files == [os.path.join(zip_filename, 'references.bib')]
+        print('root document %s, bib files found: %s' % (archive.root, found))
+
+        seconds, expected = run(os.path.join(project, 'main.tex'), os.path.join(project, 'references.bib'), os.path.join(tmp, 'out.bib'))
+        ok = found
+        print('%-24s %10s' % ('', 'time [s]'))
+        print('%-24s %10.3f' % ('extracted project', seconds))
+        start = time.perf_counter()
+        extracted = os.path.join(tmp, 'extracted')
+        with zipfile.ZipFile(zip_filename) as f:
+            f.extractall(extracted)
+        extract_seconds = time.perf_counter() - start
+        seconds, results = run(os.path.join(extracted, 'main.tex'), os.path.join(extracted, 'references.bib'), os.path.join(tmp, 'out.bib'))
+        shutil.rmtree(extracted)
+        print('%-24s %10.3f  %s' % ('extract, then read', extract_seconds + seconds, 'same' if results == expected else 'DIFFERENT'))
+        ok = ok and results == expected
+        seconds, results = run(zip_filename, os.path.join(zip_filename, 'references.bib'), os.path.join(tmp, 'out.bib'))
+        print('%-24s %10.3f  %s' % ('zip archive', seconds, 'same' if results == expected else 'DIFFERENT'))
+        ok = ok and results == expected
+        archive.close()
+    sys.exit(0 if ok else 1)
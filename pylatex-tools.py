@@ -1,3 +1,5 @@
+import sys
+import json
 import argparse
 from typing import Union, Optional
 import pylatex_tools as pl
@@ -12,78 +14,186 @@ def str2bool(v: Union[str, bool]) -> bool:
     else:
         raise argparse.ArgumentTypeError('Boolean value expected.')
 
+# operations that work on a single document and can be combined
+document_operations = ['count_citations', 'count_words', 'create_new_bibliography', 'detex']
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description= "extracts citation keys and displays how often you used that citation",
             formatter_class=argparse.RawDescriptionHelpFormatter)
-    parser.add_argument('operation', type=str, choices=['count_citations', 'count_words', 'create_new_bibliography', 'detex'])
-    parser.add_argument('tex_filename', type=str, help='path to the latex file')   
-    parser.add_argument('-b', '--bibliography', type=str, default = None, help='for operations [count_citations, create_new_bibliography]: path to the bibliography (bibtex file)')
+    parser.add_argument('operation', type=str, help='one of count_citations, count_words, create_new_bibliography, dedupe_bibliography, detex, batch, serve. Several of count_citations, count_words, create_new_bibliography and detex can be separated by commas (e.g., count_words,count_citations), they share the loaded document.')
+    parser.add_argument('tex_filename', type=str, nargs='*', help='path to the latex file, a zip archive of a latex project (e.g., an Overleaf "Download source" zip, read without extracting it, the root document is the file with \\documentclass and the bib files of \\bibliography and \\addbibresource are read from the archive) or a file in it (e.g., project.zip/thesis.tex) (for operation batch: the operation [count_citations, count_words, detex] followed by the paths to the latex files or glob patterns, for operation dedupe_bibliography: path to the bibliography, not used for operation serve)')   
+    parser.add_argument('-b', '--bibliography', type=str, nargs='+', default = None, help='for operations [count_citations, create_new_bibliography, batch]: path to the bibliography (bibtex file). Several bib files (e.g., a personal, a lab-wide and a project bib file) are merged, the first file that defines a key is used. Only the files with the used definitions of the cited keys are parsed (concurrently), keys defined with different entries in several files are reported.')
     parser.add_argument('-r', '--remove_fields', nargs='*', default=[''], help='for operations [create_new_bibliography]: bibliography fields that should not be included in the newly written bib file (default: file, abstract, note)')
     parser.add_argument('-c', '--citation_keys', nargs='*', default=[], help='for operations [count_citations]: if citation keys are provided - only these are searched for (also searches for partial matches of citation keys with the argument) (default: []])')
     parser.add_argument('-p', '--pattern_match_in_bibliography', nargs='*', default=[], help='for operations [count_citations]: performs pattern matching in author names and title of the references - requires argument --bibliography to be specified (default: None)')
-    parser.add_argument('-i', '--ignore_via_tc_ignore', type=str2bool, default=False, nargs='?', const=True,  help='for operations [count_words]: wethere to ignore lines between "%TC:ignore" and "%TC:endignore".')    
+    parser.add_argument('-i', '--ignore_via_tc_ignore', type=str2bool, default=False, nargs='?', const=True,  help='for operations [count_citations, count_words, create_new_bibliography, detex, batch]: wethere to ignore lines between "%TC:ignore" and "%TC:endignore".')    
     parser.add_argument('-w', '--write_csv_output', type=str2bool, default=False, nargs='?', const=True, help='for operations [count_words]: whether to write the word count to csv file. Default True.')
-    parser.add_argument('-o', '--out_filename', type=str, default = None, help='for operations [detex, create_new_bibliography]: specify a path to an output file (default: None)')
+    parser.add_argument('-f', '--follow_includes', type=str2bool, default=False, nargs='?', const=True, help='for operations [count_citations, count_words, create_new_bibliography, detex]: whether to follow \\input, \\include, \\subfile and \\import commands and include the text of these files.')
+    parser.add_argument('-s', '--single_pass', type=str2bool, default=False, nargs='?', const=True, help='for operations [count_words]: whether to detex the whole document at once instead of each section separately (faster for documents with many sections).')
+    parser.add_argument('-d', '--dedupe', type=str2bool, default=False, nargs='?', const=True, help='for operations [create_new_bibliography]: write cited entries that describe the same work (same doi, or same title, year and first author) only once, under the key that is cited first. The other keys are written to its ids field (biblatex resolves them) and printed.')
+    parser.add_argument('--window', type=int, default=5, help='for operations [dedupe_bibliography]: number of neighbouring entries (sorted by title and by first author, year and title) each entry is compared with (default: 5)')
+    parser.add_argument('-x', '--fast_subset', type=str2bool, default=False, nargs='?', const=True, help='for operations [create_new_bibliography]: only parse the cited entries of the bibliography instead of the whole file (faster for large bibliographies).')
+    parser.add_argument('--history', type=str, default=None, help='for operations [count_words]: count the words of each section in every commit of this git revision range that changed the tex file (e.g., HEAD, v1.0..HEAD). Only sections that changed are detexed again. With --out_filename, the timeline is written to a .csv or .json file.')
+    parser.add_argument('--per_section', type=str2bool, default=False, nargs='?', const=True, help='for operations [count_citations]: print the number of citations and citations per 1000 words of each heading (with all its subparts). The sections are detexed to count their words.')
+    parser.add_argument('--index_filename', type=str, default=None, help='for operations [count_citations]: path to a .csv or .json file to which every citation is written with its file, line and section (the json file also contains the numbers of --per_section)')
+    parser.add_argument('--report_filename', type=str, default=None, help='for operations [count_citations, create_new_bibliography]: path to a .json file to which the results are written (per operation), including the cited keys that are not in the bibliography and the closest keys of the bibliography for each of them')
+    parser.add_argument('--watch', type=str2bool, default=False, nargs='?', const=True, help='for operations [count_citations, count_words]: keep running and update the counts whenever the tex file (or an included file or the bibliography) is saved.')
+    parser.add_argument('--no_cache', type=str2bool, default=False, nargs='?', const=True, help='for operations [count_citations, count_words, create_new_bibliography, detex]: do not use the cache of detexed text (in .pylatex-tools-cache) and parsed bib files (in ~/.cache/pylatex-tools).')
+    parser.add_argument('--cache_stats', type=str2bool, default=False, nargs='?', const=True, help='for operations [count_words, detex]: print the number of cache hits and misses.')
+    parser.add_argument('--profile', type=str, default=None, nargs='?', const='', help='for operations [count_citations, count_words, create_new_bibliography, detex]: print the time spent in each detex rule and stage, in loading files, stripping comments and parsing the bibliography (slowest first). If a path to a .json file is given, the profile is written to that file.')
+    parser.add_argument('--backend', type=str, default='regex', choices=['regex', 'tokenizer'], help='for operations [count_words, detex]: detex with the regex rules or with a single pass tokenizer that also handles nested arguments such as \\footnote{see \\cite{key}}, --stream only supports regex (default: regex)')
+    parser.add_argument('--stream', type=str2bool, default=False, nargs='?', const=True, help='for operations [detex]: read, detex and write the document chunk by chunk (split at blank lines), so the memory needed does not grow with the size of the document. The cache is not used and only the regex backend is supported.')
+    parser.add_argument('--chunk_size', type=int, default=1024 * 1024, help='for operations [detex] with --stream: minimum number of characters of a chunk (default: 1048576)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='for operations [batch, count_words, detex, serve]: number of worker processes for batch (default: number of cpus), count_words and detex (default: 1), number of threads for serve (default: 4). The output is the same for any number of processes.')
+    parser.add_argument('--port', type=int, default=None, help='for operations [serve]: answer requests via http on this port instead of stdin/stdout (default: None)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='for operations [serve]: host of the http server (default: 127.0.0.1)')
+    parser.add_argument('--root', type=str, default=None, help='for operations [serve]: directory that contains all files of the requests, relative paths are relative to it and other paths are rejected (default: None, the current directory with --port, any path for stdin/stdout)')
+    parser.add_argument('-o', '--out_filename', type=str, default = None, help='for operations [detex, create_new_bibliography, dedupe_bibliography, batch, count_words with --history]: specify a path to an output file, for batch, dedupe_bibliography and --history a .csv or .json report (default: None)')
 
     args = parser.parse_args()    
-    tex_filename = args.tex_filename
+    operations = args.operation.split(',')
+    for operation in operations:
+        if operation not in document_operations + ['dedupe_bibliography', 'batch', 'serve']:
+            parser.error('unknown operation %s (supported: %s, dedupe_bibliography, batch, serve)' % (operation, ', '.join(document_operations)))
+    if len(operations) > 1 and any(o not in document_operations for o in operations):
+        parser.error('dedupe_bibliography, batch and serve cannot be combined with other operations')
+    if len(operations) != len(set(operations)):
+        parser.error('each operation can only be given once')
+    if args.out_filename is not None and len([o for o in operations if o in ['create_new_bibliography', 'detex'] or (o == 'count_words' and args.history is not None)]) > 1:
+        parser.error('--out_filename can only be used by one of the operations')
+    if operations[0] not in ['batch', 'serve'] and len(args.tex_filename) != 1:
+        parser.error('operation %s takes a single tex_filename' % args.operation)
+    if args.stream and args.backend != 'regex' and 'detex' in operations:
+        parser.error('--stream only supports --backend regex')
+    tex_filename = args.tex_filename[0] if args.tex_filename else None
+    follow_includes = args.follow_includes
+    profiler = pl.Profiler().start() if args.profile is not None else None
+    cache = None if args.no_cache or not (any(o in ['count_words', 'detex'] for o in operations) or args.per_section) else pl.DetexCache()
+    # the operations share the lines, headings, citations and bibliographies of the document
+    document = pl.Document(tex_filename, ignore_via_tc_ignore=args.ignore_via_tc_ignore, follow_includes=follow_includes) if operations[0] in document_operations else None
+    reports = {}
     
-    if args.operation == "count_citations":
+    for operation in operations:
+
+        if operation == "count_citations":
 
-        citation_keys = args.citation_keys
-        pattern_match_in_bibliography = args.pattern_match_in_bibliography
-        bibliography = args.bibliography
-        if pattern_match_in_bibliography:
-            assert bibliography, "you need to specify the bibliography file via --bibliography when using --pattern_match_in_bibliography"
+            citation_keys = args.citation_keys
+            pattern_match_in_bibliography = args.pattern_match_in_bibliography
+            bibliography = args.bibliography
+            if pattern_match_in_bibliography:
+                assert bibliography or pl.split_archive_path(tex_filename), "you need to specify the bibliography file via --bibliography when using --pattern_match_in_bibliography"
 
-        print((f"counting citations in {tex_filename}").upper())
-        pl.count_citations(tex_filename, citation_keys, pattern_match_in_bibliography, bibliography)
+            print((f"counting citations in {tex_filename}").upper())
+            if args.watch:
+                pl.watch_count_citations(tex_filename, citation_keys, pattern_match_in_bibliography, bibliography, args.ignore_via_tc_ignore, follow_includes, use_cache=not args.no_cache)
+            else:
+                reports[operation] = document.count_citations(citation_keys, pattern_match_in_bibliography, bibliography, use_cache=not args.no_cache,
+                                                              per_section=args.per_section, index_filename=args.index_filename, cache=cache)
 
-    elif args.operation == "count_words":
+        elif operation == "count_words":
 
-        ignore_via_tc_ignore = args.ignore_via_tc_ignore
-        write_csv_output = args.write_csv_output   
+            ignore_via_tc_ignore = args.ignore_via_tc_ignore
+            write_csv_output = args.write_csv_output   
+            single_pass = args.single_pass
 
-        print((f"counting words in {tex_filename}{' - writing counts to two csv files' if write_csv_output else ''}").upper())
+            print((f"counting words in {tex_filename}{' - writing counts to two csv files' if write_csv_output else ''}").upper())
         
-        pl.count_words(tex_filename, ignore_via_tc_ignore=ignore_via_tc_ignore, write_csv_output=write_csv_output)
+            if args.history is not None:
+                history = pl.count_words_history(tex_filename, args.history, ignore_via_tc_ignore=ignore_via_tc_ignore, cache=cache, backend=args.backend)
+                if args.out_filename is not None:
+                    pl.write_history(args.out_filename, history)
+                    print('timeline written to %s' % args.out_filename)
+            elif args.watch:
+                pl.watch_count_words(tex_filename, ignore_via_tc_ignore=ignore_via_tc_ignore, single_pass=single_pass, follow_includes=follow_includes, cache=cache)
+            else:
+                document.count_words(single_pass=single_pass, cache=cache, jobs=args.jobs or 1, backend=args.backend, write_csv_output=write_csv_output)
 
-    elif args.operation == "create_new_bibliography":
+        elif operation == "create_new_bibliography":
         
-        bibliography = args.bibliography
-        assert bibliography, "--bibliography has to be specified for operation create_new_bibliography"
-        output_bibliography = args.out_filename
-        assert output_bibliography, "--out_filename has to be specified for operation create_new_bibliography"
-        remove_fields = args.remove_fields
+            bibliography = args.bibliography or document.bib_files
+            assert bibliography, "--bibliography has to be specified for operation create_new_bibliography (no \\bibliography or \\addbibresource found in the document)"
+            output_bibliography = args.out_filename
+            assert output_bibliography, "--out_filename has to be specified for operation create_new_bibliography"
+            remove_fields = args.remove_fields
         
-        if len(remove_fields) >= 1 and 'most' in remove_fields:
-            remove_fields = [f for f in remove_fields if f != 'most']
-            remove_fields += ['file', 'abstract', 'day', 'month', 'keywords', 'urldate', 'language', 'issn', 'note', 'isbn']
+            if len(remove_fields) >= 1 and 'most' in remove_fields:
+                remove_fields = [f for f in remove_fields if f != 'most']
+                remove_fields += ['file', 'abstract', 'day', 'month', 'keywords', 'urldate', 'language', 'issn', 'note', 'isbn']
 
-        print(('creating new bibfile').upper())
-        if len(remove_fields)>0:
-                print('the following fields will be removed from the new bibliography: %s' % ', '.join(remove_fields))
+            print(('creating new bibfile').upper())
+            if len(remove_fields)>0:
+                    print('the following fields will be removed from the new bibliography: %s' % ', '.join(remove_fields))
                 
-        print('input tex document: %s' % tex_filename)
-        print('input bibtex database: %s' % bibliography)
+            print('input tex document: %s' % tex_filename)
+            print('input bibtex database: %s' % ', '.join(bibliography))
+
+            reports[operation] = document.create_new_bibliography(bibliography, output_bibliography, remove_fields, use_cache=not args.no_cache,
+                                                                  fast_subset=args.fast_subset, dedupe=args.dedupe)
+
+        elif operation == "dedupe_bibliography":
+
+            print((f"finding duplicates in {tex_filename}").upper())
+            pl.dedupe_bibliography(tex_filename, args.out_filename, window=args.window, use_cache=not args.no_cache)
 
-        pl.create_new_bibliography(tex_filename, bibliography, output_bibliography, remove_fields)
+        elif operation == "detex" and args.stream:
 
-    elif args.operation == "detex":
+            print((f"detex file {tex_filename}").upper())
+            chunks = (chunk.replace('\\', '') for chunk in pl.detex_file_stream(tex_filename, args.chunk_size, args.ignore_via_tc_ignore, follow_includes))
+            if args.out_filename is not None:
+                with open(args.out_filename, 'w', encoding="utf8") as f:
+                    f.writelines(chunks)
+                print('\noutput written to file %s' % args.out_filename)
+            else:
+                sys.stdout.writelines(chunks)
+                print()
 
-        out_filename = args.out_filename
-        tex_string = pl.get_tex_string_from_file(tex_filename)
-        detex_string = pl.detex(tex_string)
-        detex_string = detex_string.replace('\\', '').replace('\\','')
+        elif operation == "detex":
+
+            out_filename = args.out_filename
+            detex_string = document.detexed(args.backend, cache, args.jobs or 1)
+            detex_string = detex_string.replace('\\', '').replace('\\','')
         
     
-        print((f"detex file {tex_filename}").upper())
-        if args.out_filename is not None:
-            with open(out_filename, 'w', encoding="utf8") as f:
-                f.write(detex_string)
-                print('\noutput written to file %s' % out_filename)
-        else:
-            print(detex_string)
+            print((f"detex file {tex_filename}").upper())
+            if args.out_filename is not None:
+                with open(out_filename, 'w', encoding="utf8") as f:
+                    f.write(detex_string)
+                    print('\noutput written to file %s' % out_filename)
+            else:
+                print(detex_string)
     
-    else:
-        raise Exception(f"operation {args.operation} not known")
+        elif operation == "batch":
+
+            operation = args.tex_filename[0]
+            if operation not in ['count_citations', 'count_words', 'detex'] or len(args.tex_filename) < 2:
+                parser.error('usage for operation batch: batch {count_citations,count_words,detex} tex_filename [tex_filename ...]')
+
+            print((f"batch {operation}").upper())
+            pl.batch(operation, args.tex_filename[1:], jobs=args.jobs, bibliography=args.bibliography, pattern_match_in_bibliography=args.pattern_match_in_bibliography,
+                     ignore_via_tc_ignore=args.ignore_via_tc_ignore, follow_includes=follow_includes, single_pass=args.single_pass, output_file=args.out_filename, use_cache=not args.no_cache)
+
+        elif operation == "serve":
+
+            pl.serve(args.port, args.host, max_workers=args.jobs or 4, use_cache=not args.no_cache, root=args.root)
+
+        else:
+            raise Exception(f"operation {operation} not known")
+
+    if args.report_filename is not None and reports:
+        with open(args.report_filename, 'w', encoding="utf8") as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+        print('report written to %s' % args.report_filename)
+
+    if cache is not None:
+        if args.cache_stats:
+            print(cache.stats())
+        cache.close()
+
+    if profiler is not None:
+        profiler.stop()
+        if args.profile:
+            with open(args.profile, 'w', encoding="utf8") as f:
+                f.write(profiler.to_json())
+            print('profile written to %s' % args.profile)
+        else:
+            print(profiler.report())
@@ -1,5 +1,64 @@
-from .texhelpers import *
-from .detex import *
-from .count_words import count_words
-from .create_new_bibliography import create_new_bibliography
-from .count_citations import count_citations
\ No newline at end of file
+import sys
+import types
+import importlib
+
+# the submodules are only imported when one of their names is used (e.g., pybtex is not imported for detex and count_words)
+_submodules = {
+    'texhelpers': ['load_file_as_list', 'iter_file_lines', 'preprocess_lines', 'LineMap', 'load_preprocessed', 'strip_comment_environment',
+                   'strip_comments_in_tex', 'strip_tc_ignore', 'get_citations_in_tex', 'find_bib_files', 'read_bib_file', 'remove_fields_from_bibliography'],
+    'detex': ['get_tex_string_from_file', 'apply_regexps', 'detex_rules', 'detex_remove_header', 'detex_remove_header_rules',
+              'detex_remove_comments', 'detex_remove_comments_rules', 'detex_reduce', 'detex_reduce_rules', 'detex_highlight',
+              'detex_highlight_rules', 'detex_remove', 'detex_remove_rules', 'detex_replace', 'detex_replace_rules',
+              'DetexEngine', 'get_default_engine', 'detex_backends', 'detex', 'get_backend_fingerprint'],
+    'citations': ['cite_commands', 'multicite_commands', 'Citation', 'CitationScanner', 'find_citations'],
+    'texproject': ['TexProject', 'load_project_as_list'],
+    'detex_cache': ['DetexCache'],
+    'bibindex': ['BibliographyIndex'],
+    'bibscan': ['BibFileIndex'],
+    'count_words': ['count_words', 'count_words_in_list', 'watch_count_words'],
+    'create_new_bibliography': ['create_new_bibliography'],
+    'dedupe': ['BibliographyDuplicates', 'dedupe_bibliography'],
+    'keyindex': ['KeyIndex', 'get_key_index'],
+    'bibstore': ['BibStore'],
+    'archive': ['ProjectArchive', 'get_archive', 'split_archive_path'],
+    'citation_index': ['Occurrence', 'CitationIndex'],
+    'count_citations': ['count_citations', 'count_citations_in_list', 'watch_count_citations'],
+    'history': ['GitFileReader', 'count_words_history', 'write_history'],
+    'document': ['Document'],
+    'batch': ['batch'],
+    'server': ['Server', 'serve'],
+    'detex_stream': ['iter_safe_chunks', 'detex_chunks', 'detex_file_stream'],
+    'detex_parallel': ['detex_parallel'],
+    'tokenizer': ['Token', 'tokenize', 'detex_tokenizer'],
+    'profiling': ['Profiler'],
+}
+_attributes = {name: module for module, names in _submodules.items() for name in names}
+
+__all__ = list(_attributes)
+
+def _bind_loaded() -> None:
+    # bind the names of all loaded submodules, also of the submodules imported by the one just imported
+    for name, module in _attributes.items():
+        loaded = sys.modules.get(__name__ + '.' + module)
+        if loaded is not None and hasattr(loaded, name):
+            globals()[name] = getattr(loaded, name)
+
+def __getattr__(name: str):
+    if name not in _attributes:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    importlib.import_module('.' + _attributes[name], __name__)
+    _bind_loaded()
+    return globals()[name]
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name: str, value) -> None:
+        # the import system sets each imported submodule as attribute of the package, also if it is imported
+        # directly (e.g., import pylatex_tools.count_words). keep the function of the same name instead
+        if isinstance(value, types.ModuleType) and _attributes.get(name) == name and hasattr(value, name):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _Package
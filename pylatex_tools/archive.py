@@ -0,0 +1,166 @@
+# %%
+import io
+import os
+import re
+import threading
+
+from functools import cached_property
+from typing import IO, TYPE_CHECKING, Optional
+
+# zipfile is only imported when an archive is opened
+if TYPE_CHECKING:
+    import zipfile
+
+# \documentclass outside of a comment, e.g., \documentclass[12pt]{article}
+documentclass_regexp = re.compile(r'^[^%]*?\\documentclass\s*(?:\[[^\]]*\])?\s*\{([^{}]*)\}')
+# document classes of files that are included in another document (subfiles) or only compiled on their own (figures)
+included_document_classes = ['subfiles', 'standalone']
+
+class ProjectArchive:
+    """a latex project in a zip archive (e.g., the "Download source" zip of an Overleaf project), read without extracting it
+
+        Only the list of members is read when the archive is opened, a member is read (and decompressed) when it is
+        needed. The members are addressed with paths relative to the archive (e.g., 'chapters/intro.tex'), the files of
+        the project with the path to the archive followed by the path of the member (e.g., 'project.zip/chapters/intro.tex'),
+        so includes and bib files are resolved as in a directory.
+
+    Args:
+        zip_filename (str): path to the zip archive
+    """
+
+    def __init__(self, zip_filename: str):
+        import zipfile
+        self.zip_filename = zip_filename
+        self._zip = zipfile.ZipFile(zip_filename)
+        self.members: dict[str, 'zipfile.ZipInfo'] = {info.filename: info for info in self._zip.infolist() if not info.is_dir()}
+
+    def __contains__(self, member: str) -> bool:
+        return _normalize_member(member) in self.members
+
+    def open_text(self, member: str) -> IO[str]:
+        """opens a member for reading its text lazily (utf-8, universal newlines as open)"""
+        return io.TextIOWrapper(self._zip.open(self._info(member)), encoding='utf8')
+
+    def read_bytes(self, member: str) -> bytes:
+        return self._zip.read(self._info(member))
+
+    def stat(self, member: str) -> tuple[int, int]:
+        """returns the crc and the size of a member, which change with its content (as modification time and size of a file)"""
+        info = self._info(member)
+        return info.CRC, info.file_size
+
+    def _info(self, member: str) -> 'zipfile.ZipInfo':
+        info = self.members.get(_normalize_member(member))
+        if info is None:
+            raise FileNotFoundError('no member %s in the archive %s' % (member, self.zip_filename))
+        return info
+
+    def documentclass(self, member: str, max_chars: int = 65536) -> Optional[str]:
+        """returns the document class of a tex member, None if it has no \\documentclass
+
+            Only the preamble is read: up to \\documentclass, \\begin{document} or max_chars characters.
+        """
+        n_chars = 0
+        with self.open_text(member) as f:
+            for line in f:
+                m = documentclass_regexp.match(line)
+                if m:
+                    return m.group(1).strip()
+                n_chars += len(line)
+                if '\\begin{document}' in line or n_chars > max_chars:
+                    return None
+        return None
+
+    @cached_property
+    def root(self) -> str:
+        """member of the root document: the tex file with \\documentclass, if there are several, a document class other than
+        subfiles and standalone, then main.tex, then the file closest to the top of the archive is preferred"""
+        candidates = []
+        for member in self.members:
+            if not member.lower().endswith('.tex'):
+                continue
+            documentclass = self.documentclass(member)
+            if documentclass is not None:
+                candidates.append((documentclass in included_document_classes, os.path.basename(member) != 'main.tex', member.count('/'), member))
+        if not candidates:
+            raise ValueError('no .tex file with \\documentclass in %s' % self.zip_filename)
+        return min(candidates)[3]
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __repr__(self) -> str:
+        return 'ProjectArchive(%r, %d members)' % (self.zip_filename, len(self.members))
+
+def _normalize_member(member: str) -> str:
+    # member names use / and have no leading ./ (e.g., from os.path.normpath on windows)
+    return os.path.normpath(member).replace('\\', '/').lstrip('/') if member else member
+
+def split_archive_path(filename: str) -> Optional[tuple[str, str]]:
+    """splits a path into the path to a zip archive and the path of the member, None if the path is not in a zip archive
+
+        e.g., 'project.zip/chapters/intro.tex' -> ('project.zip', 'chapters/intro.tex'), 'project.zip' -> ('project.zip', '')
+    """
+    lower = filename.lower()
+    end = lower.find('.zip') + 4
+    while end >= 4:
+        if (end == len(filename) or filename[end] in '/\\') and os.path.isfile(filename[:end]):
+            return filename[:end], _normalize_member(filename[end + 1:])
+        end = lower.find('.zip', end) + 4
+    return None
+
+_archives: dict[str, tuple[tuple[int, int], ProjectArchive]] = {}
+_archives_lock = threading.Lock()
+
+def get_archive(zip_filename: str) -> ProjectArchive:
+    """returns the (cached) ProjectArchive of a zip archive, the archive is opened again when it changed"""
+    path = os.path.abspath(zip_filename)
+    st = os.stat(path)
+    with _archives_lock:
+        cached = _archives.get(path)
+        if cached is None or cached[0] != (st.st_mtime_ns, st.st_size):
+            cached = ((st.st_mtime_ns, st.st_size), ProjectArchive(zip_filename))
+            _archives[path] = cached
+        return cached[1]
+
+def resolve_path(filename: str) -> str:
+    """returns the path to the root document (see ProjectArchive.root) for a zip archive, filename itself otherwise"""
+    split = split_archive_path(filename)
+    if split is None or split[1]:
+        return filename
+    return os.path.join(split[0], get_archive(split[0]).root)
+
+def open_text(filename: str) -> IO[str]:
+    """opens a text file (or a file in a zip archive, see split_archive_path, the root document for the archive itself) for reading"""
+    split = split_archive_path(filename)
+    if split is None:
+        return open(filename, 'r', encoding="utf8")
+    archive = get_archive(split[0])
+    return archive.open_text(split[1] or archive.root)
+
+def open_binary(filename: str) -> IO[bytes]:
+    """opens a file (or a file in a zip archive) for reading bytes"""
+    split = split_archive_path(filename)
+    if split is None:
+        return open(filename, 'rb')
+    return io.BytesIO(get_archive(split[0]).read_bytes(split[1]))
+
+def is_file(filename: str) -> bool:
+    """os.path.isfile, also for files in zip archives"""
+    split = split_archive_path(filename)
+    if split is None:
+        return os.path.isfile(filename)
+    return bool(split[1]) and split[1] in get_archive(split[0])
+
+def file_state(filename: str) -> tuple[int, int]:
+    """returns modification time (crc for a file in a zip archive) and size, which change with the content of the file"""
+    split = split_archive_path(filename)
+    if split is None:
+        st = os.stat(filename)
+        return st.st_mtime_ns, st.st_size
+    return get_archive(split[0]).stat(split[1])
+
+def watched_file(filename: str) -> str:
+    """returns the file whose changes are watched for filename: the zip archive for a file in an archive"""
+    split = split_archive_path(filename)
+    return split[0] if split is not None else filename
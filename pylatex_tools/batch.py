@@ -0,0 +1,219 @@
+# %%
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import argparse
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+if __name__ == '__main__' and not __package__:
+    # run as a script (e.g., python pylatex_tools/count_words.py), the package has to be importable
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pylatex_tools.detex import detex
+from pylatex_tools.texhelpers import load_preprocessed, read_bib_file
+from pylatex_tools.count_words import get_headings_in_list, get_sections_in_list, count_words_in_sections, cumulate_counts
+from pylatex_tools.count_citations import count_citations_in_list
+from pylatex_tools.bibindex import BibliographyIndex
+from pylatex_tools.keyindex import get_key_index
+
+if TYPE_CHECKING:
+    from pybtex.database import BibliographyData # type: ignore
+
+batch_operations = ['count_words', 'count_citations', 'detex']
+
+def expand_filenames(patterns: list[str]) -> list[str]:
+    """expands glob patterns (e.g., docs/**/*.tex) to a sorted list of files, each file is returned only once
+
+    Args:
+        patterns (list): file names or glob patterns
+
+    Returns:
+        list: file names
+    """
+    filenames: dict[str, None] = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for f in matches:
+            filenames[f] = None
+    return list(filenames)
+
+def _count_words(filename: str, ignore_via_tc_ignore: bool, follow_includes: bool, single_pass: bool) -> dict[str, Any]:
+    lines, line_map = load_preprocessed(filename, ignore_via_tc_ignore, follow_includes)
+    heading_name, heading_level, level, linenum = get_headings_in_list(lines)
+    counts = count_words_in_sections(get_sections_in_list(lines, linenum), single_pass)
+    counts_cum = cumulate_counts(counts, level)
+    return {'words': sum(counts),
+            'words_in_sections': sum([x for i, x in enumerate(counts_cum) if heading_level[i] == 'section']),
+            'headings': [{'level': h, 'name': heading_name[i], 'count': counts[i], 'count_cum': counts_cum[i],
+                          'file': line_map[linenum[i]][0], 'line': line_map[linenum[i]][1]} for i, h in enumerate(heading_level)]}
+
+def _count_citations(filename: str, ignore_via_tc_ignore: bool, follow_includes: bool, single_pass: bool) -> dict[str, Any]:
+    result = count_citations_in_list(load_preprocessed(filename, ignore_via_tc_ignore, follow_includes)[0])
+    return {k: result[k] for k in ['citations', 'unique_citations', 'counts']}
+
+def _detex(filename: str, ignore_via_tc_ignore: bool, follow_includes: bool, single_pass: bool) -> dict[str, Any]:
+    lines, _ = load_preprocessed(filename, ignore_via_tc_ignore, follow_includes, strip_comments=False)
+    detex_string = detex(''.join(lines))
+    return {'words': len(detex_string.split()), 'characters': len(detex_string)}
+
+_workers = {'count_words': _count_words, 'count_citations': _count_citations, 'detex': _detex}
+
+def process_file(operation: str, filename: str, ignore_via_tc_ignore: bool = False, follow_includes: bool = False, single_pass: bool = False) -> dict[str, Any]:
+    """runs an operation on a single file and returns its result, errors are returned instead of raised
+
+    Args:
+        operation (str): one of batch_operations
+        filename (str): path to the latex file
+
+    Returns:
+        dict: result with the keys 'filename', 'status' ('ok' or 'error') and the results of the operation or 'error'
+    """
+    start = time.perf_counter()
+    try:
+        result = {'filename': filename, 'status': 'ok'}
+        result.update(_workers[operation](filename, ignore_via_tc_ignore, follow_includes, single_pass))
+    except Exception as e:
+        result = {'filename': filename, 'status': 'error', 'error': '%s: %s' % (type(e).__name__, e), 'traceback': traceback.format_exc()}
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+def _add_bibliography_info(result: dict[str, Any], bib_dict: 'BibliographyData', bib_keys: set[str], matches: Optional[set[str]]) -> None:
+    # filters the counts by the pattern matches and adds the keys that are not in the bibliography with the closest keys of the bibliography
+    # bib_keys and matches are lower case, keys are case insensitive (as in pybtex)
+    if matches is not None:
+        result['counts'] = {k: n for k, n in result['counts'].items() if k.lower() in matches}
+        result['citations'] = sum(result['counts'].values())
+        result['unique_citations'] = len(result['counts'])
+    result['missing_in_bibliography'] = [k for k in result['counts'] if k.lower() not in bib_keys]
+    if result['missing_in_bibliography']:
+        # the index of the keys is built once, for the first file with a missing key
+        result['suggestions'] = get_key_index(bib_dict).suggest_all(result['missing_in_bibliography'])
+
+def batch(operation: str,
+          filenames: list[str],
+          jobs: Optional[int] = None,
+          bibliography: Optional[Union[str, list[str]]] = None,
+          pattern_match_in_bibliography: Optional[list[str]] = None,
+          ignore_via_tc_ignore: bool = False,
+          follow_includes: bool = False,
+          single_pass: bool = False,
+          output_file: Optional[str] = None,
+          use_cache: bool = True) -> list[dict[str, Any]]:
+    """runs an operation on many tex documents in parallel and collects the results in one report
+
+        The files are distributed over a pool of worker processes. An error in one file (e.g., a file that cannot
+        be read or parsed) is recorded in its result and does not stop the other files. For count_citations, the
+        bibliography is parsed only once (in the main process) and the citation keys of all files are checked against it.
+
+    Args:
+        operation (str): 'count_words', 'count_citations' or 'detex'
+        filenames (list): paths to the latex files or glob patterns (e.g., 'docs/**/*.tex')
+        jobs (int, optional): number of worker processes, 1 runs all files in the main process. Defaults to the number of cpus.
+        bibliography (str or list, optional): for count_citations: path to the bibliography (bibtex file), or paths to several bib files that are merged
+            (the first file that defines a key is used, see BibStore). Defaults to None.
+        pattern_match_in_bibliography (list, optional): for count_citations: only count the references whose authors or title match one of the patterns. Defaults to None.
+        ignore_via_tc_ignore (bool, optional): whether to ignore lines between "%TC:ignore" and "%TC:endignore". Defaults to False.
+        follow_includes (bool, optional): whether to follow \\input, \\include, \\subfile and \\import commands. Defaults to False.
+        single_pass (bool, optional): for count_words: whether to detex each document at once instead of each section separately. Defaults to False.
+        output_file (str, optional): path to the report, written as json if it ends with .json, otherwise as csv. Defaults to None.
+        use_cache (bool, optional): whether to use the cache of parsed bib files. Defaults to True.
+
+    Returns:
+        list: one result dict per file (see process_file), in the order of the files
+    """
+    if operation not in _workers:
+        raise ValueError('operation %s not supported in batch mode (supported: %s)' % (operation, ', '.join(batch_operations)))
+    filenames = expand_filenames(filenames)
+    start = time.perf_counter()
+
+    bib_keys: set[str] = set()
+    matches = None
+    if operation == 'count_citations' and bibliography:
+        if isinstance(bibliography, str) or len(bibliography) == 1:
+            bib_dict = read_bib_file(bibliography if isinstance(bibliography, str) else bibliography[0], use_cache)
+        else:
+            # the keys of all documents are checked, so all used definitions are parsed
+            from pylatex_tools.bibstore import BibStore, print_conflicts
+            store = BibStore(bibliography, use_cache)
+            bib_dict = store.get_bibliography()
+            print_conflicts(store.conflicts())
+            store.close()
+        bib_keys = {k.lower() for k in bib_dict.entries.keys()}
+        if pattern_match_in_bibliography:
+            matches = {k.lower() for k in BibliographyIndex(bib_dict).match(bib_dict.entries.keys(), pattern_match_in_bibliography)}
+
+    results: dict[str, dict[str, Any]] = {}
+    def collect(result: dict[str, Any]) -> None:
+        if result['status'] == 'ok' and operation == 'count_citations' and bibliography:
+            _add_bibliography_info(result, bib_dict, bib_keys, matches)
+        results[result['filename']] = result
+        print('[%d/%d] %s: %s' % (len(results), len(filenames), result['filename'], result['status'] if result['status'] == 'ok' else result['error']))
+
+    options = (ignore_via_tc_ignore, follow_includes, single_pass)
+    if jobs == 1 or len(filenames) <= 1:
+        for filename in filenames:
+            collect(process_file(operation, filename, *options))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(process_file, operation, filename, *options): filename for filename in filenames}
+            for future in as_completed(futures):
+                try:
+                    collect(future.result())
+                except Exception as e:
+                    # the worker process died (e.g., out of memory)
+                    collect({'filename': futures[future], 'status': 'error', 'error': '%s: %s' % (type(e).__name__, e), 'seconds': 0})
+
+    ordered = [results[f] for f in filenames]
+    n_errors = len([r for r in ordered if r['status'] != 'ok'])
+    print('\nprocessed %d files in %.2f s, %d errors' % (len(ordered), time.perf_counter() - start, n_errors))
+    if output_file:
+        write_report(output_file, ordered)
+        print('report written to %s' % output_file)
+    return ordered
+
+def write_report(filename: str, results: list[dict[str, Any]]) -> None:
+    """writes the results of a batch run to a json file (if filename ends with .json) or to a csv file with one row per document
+
+    Args:
+        filename (str): path to the report
+        results (list): results of batch
+    """
+    if filename.lower().endswith('.json'):
+        with open(filename, 'w', encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != 'traceback'} for r in results], f, indent=2, ensure_ascii=False)
+        return
+    columns: list[str] = ['filename', 'status']
+    for r in results:
+        for k, v in r.items():
+            if k not in columns and k != 'traceback' and not isinstance(v, (list, dict)):
+                columns.append(k)
+    if any('missing_in_bibliography' in r for r in results):
+        columns.append('missing_in_bibliography')
+    if any('suggestions' in r for r in results):
+        columns.append('suggestions')
+    with open(filename, 'w', encoding="utf-8", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for r in results:
+            writer.writerow([' '.join(r[c]) if isinstance(r.get(c), list) else
+                             '; '.join('%s: %s' % (k, ' '.join(v)) for k, v in r[c].items()) if isinstance(r.get(c), dict) else r.get(c, '') for c in columns])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "runs an operation on many tex documents in parallel and writes one report",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('operation', type = str, choices = batch_operations)
+    parser.add_argument('tex_filenames', type = str, nargs = '+', help = 'paths to the latex files or glob patterns (e.g., "docs/**/*.tex")')
+    parser.add_argument('-j', '--jobs', type = int, default = None, help = 'number of worker processes. Default: number of cpus.')
+    parser.add_argument('-b', '--bibliography', type = str, default = None, help = 'path to the bibliography (bibtex file)')
+    parser.add_argument('-i', '--ignore_via_tc_ignore', type = bool, default = False, help='whether to ignore lines between "%TC:ignore" and "%TC:endignore".')
+    parser.add_argument('-f', '--follow_includes', type = bool, default = False, help = 'whether to follow \\input, \\include, \\subfile and \\import commands. Default False.')
+    parser.add_argument('-o', '--out_filename', type = str, default = None, help = 'path to the report (.csv or .json)')
+    args = parser.parse_args()
+
+    batch(args.operation, args.tex_filenames, jobs=args.jobs, bibliography=args.bibliography, ignore_via_tc_ignore=args.ignore_via_tc_ignore, follow_includes=args.follow_includes, output_file=args.out_filename)
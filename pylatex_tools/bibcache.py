@@ -0,0 +1,132 @@
+# %%
+import gc
+import os
+import time
+import pickle
+import hashlib
+
+from typing import Optional
+
+from pybtex.database import parse_file, parse_string # type: ignore
+from pybtex.database import BibliographyData # type: ignore
+
+from pylatex_tools.profiling import profiled
+from pylatex_tools.archive import file_state, open_binary, open_text, split_archive_path
+
+# increase when the format of the cache files changes
+CACHE_VERSION = 1
+
+def _user_cache_dir() -> str:
+    # loading a pickle can run code, so the cache is kept per user instead of in the project directory (a checked
+    # out repository or an unpacked zip archive could bring its own cache files)
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pylatex-tools')
+
+# directory of the cached bib files, e.g., ~/.cache/pylatex-tools
+BIB_CACHE_DIR = _user_cache_dir()
+
+def _file_hash(filename: str) -> str:
+    h = hashlib.sha1()
+    with open_binary(filename) as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _cache_filename(bib_filename: str, cache_dir: str) -> str:
+    path_hash = hashlib.sha1(os.path.abspath(bib_filename).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'bib-%s.pickle' % path_hash)
+
+@profiled('bib')
+def parse_bib_file(bib_filename: str) -> BibliographyData:
+    """parses a bib file with pybtex (also from a zip archive, see split_archive_path)"""
+    if split_archive_path(bib_filename) is not None:
+        with open_text(bib_filename) as f:
+            return parse_string(f.read(), 'bibtex')
+    return parse_file(bib_filename)
+
+@profiled('bib')
+def load_cached_bibliography(bib_filename: str, cache_dir: str = BIB_CACHE_DIR) -> Optional[BibliographyData]:
+    """returns the cached parse of a bib file, None if there is no valid cache
+
+        The cache is valid if size and modification time of the bib file are unchanged. If only the modification time
+        changed (e.g., the file was touched or copied), the content hash is compared and the cache is updated. For a
+        bib file in a zip archive, the crc of the member is used as modification time.
+
+    Args:
+        bib_filename (str): path to the bib file
+        cache_dir (str, optional): directory of the cache. Defaults to BIB_CACHE_DIR (~/.cache/pylatex-tools).
+
+    Returns:
+        pybtex.database.BibliographyData: bibliography object
+    """
+    cache_filename = _cache_filename(bib_filename, cache_dir)
+    # the garbage collector would repeatedly scan the many new objects while unpickling, which makes loading several times slower
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(cache_filename, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION:
+        return None
+    mtime_ns, size = file_state(bib_filename)
+    if cached['size'] != size:
+        return None
+    if cached['mtime_ns'] != mtime_ns:
+        if cached['sha1'] != _file_hash(bib_filename):
+            return None
+        cached['mtime_ns'] = mtime_ns
+        try:
+            _write(cache_filename, cached)
+        except OSError:
+            pass
+    return cached['bib_data']
+
+@profiled('bib')
+def store_cached_bibliography(bib_filename: str, bib_data: BibliographyData, cache_dir: str = BIB_CACHE_DIR) -> None:
+    """stores the parse of a bib file in the cache (see load_cached_bibliography)"""
+    mtime_ns, size = file_state(bib_filename)
+    cached = {'version': CACHE_VERSION, 'path': os.path.abspath(bib_filename), 'size': size, 'mtime_ns': mtime_ns,
+              'sha1': _file_hash(bib_filename), 'bib_data': bib_data}
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        _write(_cache_filename(bib_filename, cache_dir), cached)
+    except OSError as e:
+        print('could not write the bib cache (%s)' % e)
+
+def _write(cache_filename: str, cached: dict) -> None:
+    # write to a temporary file first, so that concurrent readers never see a partial file
+    tmp_filename = '%s.%d.tmp' % (cache_filename, os.getpid())
+    with open(tmp_filename, 'wb') as f:
+        pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filename, cache_filename)
+
+def read_bib_file_cached(bib_filename: str, cache_dir: str = BIB_CACHE_DIR, verbose: bool = True) -> BibliographyData:
+    """reads a bib file from the cache, or parses it and stores it in the cache
+
+    Args:
+        bib_filename (str): path to bib file
+        cache_dir (str, optional): directory of the cache. Defaults to BIB_CACHE_DIR (~/.cache/pylatex-tools).
+        verbose (bool, optional): whether to print the time it took to load the bib file. Defaults to True.
+
+    Returns:
+        pybtex.database.BibliographyData: bibiliography object
+    """
+    start = time.perf_counter()
+    bib_data = load_cached_bibliography(bib_filename, cache_dir)
+    if bib_data is not None:
+        if verbose:
+            print('loaded the bib file from the cache in %.3f s' % (time.perf_counter() - start))
+        return bib_data
+    bib_data = parse_bib_file(bib_filename)
+    if verbose:
+        print('parsed the bib file in %.3f s' % (time.perf_counter() - start))
+    store_cached_bibliography(bib_filename, bib_data, cache_dir)
+    return bib_data
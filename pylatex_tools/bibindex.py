@@ -0,0 +1,110 @@
+# %%
+import re
+
+from typing import TYPE_CHECKING, Iterable, Optional, Union
+
+if TYPE_CHECKING:
+    from pybtex.database import BibliographyData # type: ignore
+
+class BibliographyIndex:
+    """search index over a bibliography, built once per bibliography
+
+        For each entry, the title (without curly brackets), the author names (as printed by pybtex, e.g.,
+        "Laemmli, Ulrich K"), the last and first names of the authors, the year and the keywords are stored,
+        under the lower case key (citation keys are case insensitive, as in bibtex).
+
+    Args:
+        bib_dict (pybtex.database.BibliographyData): bibliography object
+    """
+
+    def __init__(self, bib_dict: 'BibliographyData'):
+        self.titles: dict[str, str] = {}
+        self.authors: dict[str, list[str]] = {}
+        self.last_names: dict[str, list[str]] = {}
+        self.first_names: dict[str, list[str]] = {}
+        self.years: dict[str, str] = {}
+        self.keywords: dict[str, list[str]] = {}
+        for key, entry in bib_dict.entries.items():
+            key = key.lower()
+            if 'title' in entry.fields:
+                self.titles[key] = entry.fields['title'].replace('{', '').replace('}', '')
+            if 'year' in entry.fields:
+                self.years[key] = entry.fields['year']
+            if 'keywords' in entry.fields:
+                self.keywords[key] = [k.strip() for k in re.split('[,;]', entry.fields['keywords']) if k.strip()]
+            persons = entry.persons.get('author')
+            if persons:
+                self.authors[key] = [x.__str__() for x in persons]
+                self.last_names[key] = [' '.join(x.last_names) for x in persons]
+                self.first_names[key] = [' '.join(x.first_names + x.middle_names) for x in persons]
+
+    def __contains__(self, key: str) -> bool:
+        key = key.lower()
+        return key in self.titles or key in self.authors or key in self.years
+
+    def match(self, keys: Iterable[str], patterns: list[str]) -> set[str]:
+        """returns the keys whose title contains one of the patterns or whose authors match one of the patterns
+
+            The title is searched for the patterns as (case sensitive) substrings, the author names are searched
+            with the patterns as (case insensitive) regular expressions. All patterns are combined, so each title
+            and author name is searched only once. Each key is checked only once.
+
+        Args:
+            keys (iterable): citation keys
+            patterns (list): patterns
+
+        Returns:
+            set: matching keys (as given)
+        """
+        title_regexp = re.compile('|'.join(re.escape(p) for p in patterns))
+        author_regexp = _combine_regexps(patterns, re.IGNORECASE)
+        matches = set()
+        for key in set(keys):
+            title = self.titles.get(key.lower())
+            if title is not None and title_regexp.search(title):
+                matches.add(key)
+            elif author_regexp is not None and any(author_regexp.search(a) for a in self.authors.get(key.lower(), [])):
+                matches.add(key)
+        return matches
+
+def _combine_regexps(patterns: list[str], flags: int = 0) -> Optional[Union[re.Pattern, '_AnyRegexp']]:
+    """combines regular expressions into a single one that matches if any of them matches
+
+        Patterns that are no valid regular expressions are skipped (with a warning). If the patterns cannot
+        be combined (e.g., because of groups that are referenced by number), they are searched one after another.
+
+    Returns:
+        re.Pattern: combined regular expression, None if there are no valid patterns
+    """
+    valid = []
+    for p in patterns:
+        try:
+            compiled = re.compile(p, flags)
+            valid.append(p)
+        except re.error as e:
+            print('skipping invalid pattern "%s" (%s)' % (p, e))
+            continue
+        if compiled.groups and len(valid) > 1:
+            # back references would refer to the groups of other patterns
+            return _AnyRegexp([re.compile(p, flags) for p in patterns if _is_valid(p, flags)])
+    if not valid:
+        return None
+    try:
+        return re.compile('|'.join('(?:%s)' % p for p in valid), flags)
+    except re.error:
+        # e.g., duplicate group names or global flags, fall back to testing one pattern after another
+        return _AnyRegexp([re.compile(p, flags) for p in valid])
+
+def _is_valid(pattern: str, flags: int) -> bool:
+    try:
+        re.compile(pattern, flags)
+        return True
+    except re.error:
+        return False
+
+class _AnyRegexp:
+    def __init__(self, regexps: list[re.Pattern]):
+        self.regexps = regexps
+
+    def search(self, text: str) -> bool:
+        return any(r.search(text) for r in self.regexps)
@@ -0,0 +1,103 @@
+# %%
+import re
+import mmap
+
+from typing import Optional, Union
+
+from pybtex.database import parse_string # type: ignore
+from pybtex.database import BibliographyData # type: ignore
+
+from pylatex_tools.archive import get_archive, split_archive_path
+
+# start of an entry at the beginning of a line, e.g., "@article{key," or "@string{"
+entry_start_regexp = re.compile(rb'^[ \t]*@[ \t]*([A-Za-z]+)[ \t]*[{(][ \t\r\n]*([^,\s{}()=]*)', re.MULTILINE)
+
+class BibFileIndex:
+    """index of the entries of a bib file by their byte offset, built without parsing the entries
+
+        The bib file is memory mapped (a bib file in a zip archive is read into memory) and scanned once for the starts of the entries. An entry is assumed to
+        end before the start of the next entry, its exact end (the matching closing bracket) is only
+        determined when the entry is extracted. @string and @preamble blocks are kept, as entries may use them.
+
+    Args:
+        bib_filename (str): path to the bib file
+    """
+
+    def __init__(self, bib_filename: str):
+        self.bib_filename = bib_filename
+        self.entries: dict[str, tuple[int, int]] = {}
+        # keys as written in the bib file, in the order of the file
+        self.keys: list[str] = []
+        self.macros: list[tuple[int, int]] = []
+        split = split_archive_path(bib_filename)
+        if split is not None:
+            self._data: Union[mmap.mmap, bytes] = get_archive(split[0]).read_bytes(split[1])
+        else:
+            with open(bib_filename, 'rb') as f:
+                try:
+                    self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except ValueError:
+                    # empty file
+                    self._data = b''
+        starts = [(m.start(), m.group(1).lower(), m.group(2)) for m in entry_start_regexp.finditer(self._data)]
+        for i, (start, entry_type, key) in enumerate(starts):
+            end = starts[i+1][0] if i + 1 < len(starts) else len(self._data)
+            if entry_type in (b'string', b'preamble'):
+                self.macros.append((start, end - start))
+            elif entry_type != b'comment':
+                # keys are case insensitive (as in pybtex), the first definition is used
+                name = key.decode('utf-8')
+                if name.lower() not in self.entries:
+                    self.entries[name.lower()] = (start, end - start)
+                    self.keys.append(name)
+
+    def __contains__(self, key: str) -> bool:
+        return key.lower() in self.entries
+
+    def _text(self, offset: int, length: int) -> str:
+        raw = self._data[offset:offset + length]
+        return raw[:_entry_end(raw)].decode('utf-8')
+
+    def get_entry_text(self, key: str) -> Optional[str]:
+        """returns the bibtex source of an entry, None if the key is not in the bib file"""
+        if key.lower() not in self.entries:
+            return None
+        return self._text(*self.entries[key.lower()])
+
+    def get_bibliography(self, keys: list[str]) -> BibliographyData:
+        """parses only the entries with the given keys (and the @string and @preamble blocks)
+
+        Args:
+            keys (list): citation keys, keys that are not in the bib file are ignored
+
+        Returns:
+            pybtex.database.BibliographyData: bibliography object with these entries
+        """
+        texts = [self._text(*m) for m in self.macros]
+        texts += [self.get_entry_text(k) or '' for k in dict.fromkeys(keys)]
+        return parse_string('\n'.join(texts), 'bibtex')
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+def _entry_end(raw: bytes) -> int:
+    # position after the bracket that closes the entry, len(raw) if it is not found
+    opening = raw.find(b'{')
+    parenthesis = raw.find(b'(')
+    if opening < 0 or 0 <= parenthesis < opening:
+        opening, open_char, close_char = parenthesis, b'(', b')'
+    else:
+        open_char, close_char = b'{', b'}'
+    if opening < 0:
+        return len(raw)
+    depth = 0
+    for m in re.finditer(b'[{}]' if open_char == b'{' else b'[{}()]', raw[opening:]):
+        c = m.group()
+        if c == open_char or (open_char == b'(' and c == b'{'):
+            depth += 1
+        else:
+            depth -= 1
+        if depth == 0:
+            return opening + m.end()
+    return len(raw)
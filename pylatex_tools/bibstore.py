@@ -0,0 +1,154 @@
+# %%
+import os
+import time
+
+from functools import cached_property
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from pybtex.database import BibliographyData, Entry # type: ignore
+
+from pylatex_tools.bibscan import BibFileIndex
+from pylatex_tools.keyindex import KeyIndex
+from pylatex_tools.texhelpers import read_bib_file
+
+class BibStore:
+    """merged index of the keys of several bib files, the first file that defines a key takes precedence
+
+        The bib files are scanned concurrently for the positions of their entries (see BibFileIndex), without
+        parsing them. A file is only parsed when it holds the used definition of one of the requested keys, so a
+        file whose keys are not cited (or are all defined in an earlier file) is never parsed. The files that
+        have to be parsed are parsed concurrently in worker processes. A key that is defined in several files
+        with different entries is a conflict (see conflicts), the entry of the first file is used, as by biber
+        with several bibliography resources.
+
+    Args:
+        bib_filenames (list): paths to the bib files, in the order of precedence
+        use_cache (bool, optional): whether to use the cache of parsed bib files when a whole file is parsed. Defaults to True.
+        verbose (bool, optional): whether to print progress messages. Defaults to True.
+        jobs (int, optional): number of worker processes that parse the files, 1 parses all files in the main process. Defaults to None (one per file, at most the number of cpus).
+    """
+
+    def __init__(self, bib_filenames: list[str], use_cache: bool = True, verbose: bool = True, jobs: Optional[int] = None):
+        self.bib_filenames = list(bib_filenames)
+        self.use_cache = use_cache
+        self.verbose = verbose
+        self.jobs = jobs
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(len(self.bib_filenames), os.cpu_count() or 1))) as executor:
+            self._indexes = list(executor.map(BibFileIndex, self.bib_filenames))
+        # lower case key -> index of the file with the used definition and the key as written there, keys in the order of precedence
+        self._sources: dict[str, tuple[int, str]] = {}
+        self.keys: list[str] = []
+        # lower case key -> indexes of all files that define it, only for keys defined in several files
+        self._defined_in: dict[str, list[int]] = {}
+        # lower case key -> parsed entry, each entry is parsed only once
+        self._parsed: dict[str, Entry] = {}
+        for i, index in enumerate(self._indexes):
+            for key in index.keys:
+                lower = key.lower()
+                if lower in self._sources:
+                    self._defined_in.setdefault(lower, [self._sources[lower][0]]).append(i)
+                else:
+                    self._sources[lower] = (i, key)
+                    self.keys.append(key)
+        if verbose:
+            print('indexed %d keys in %d bib files in %.3f s' % (len(self.keys), len(self.bib_filenames), time.perf_counter() - start))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key.lower() in self._sources
+
+    def source(self, key: str) -> Optional[str]:
+        """returns the bib file whose definition of the key is used, None if no file defines it"""
+        source = self._sources.get(key.lower())
+        return self.bib_filenames[source[0]] if source is not None else None
+
+    @cached_property
+    def key_index(self) -> KeyIndex:
+        """index of the keys of all files to suggest the closest keys for missing keys (see KeyIndex)"""
+        return KeyIndex(self.keys)
+
+    def conflicts(self, keys: Optional[list[str]] = None) -> dict[str, list[str]]:
+        """returns the keys that are defined with different entries in several files
+
+        Args:
+            keys (list, optional): only check these keys (e.g., the cited keys). Defaults to None (all keys).
+
+        Returns:
+            dict: key -> bib files that define it (the first one is used), in the order of the keys
+        """
+        lowers = self._defined_in if keys is None else [k.lower() for k in dict.fromkeys(keys)]
+        conflicts = {}
+        for lower in lowers:
+            files = self._defined_in.get(lower)
+            if files is None:
+                continue
+            # the same entry copied to several files (up to white space) is not a conflict
+            if len({_normalize_entry(self._indexes[i].get_entry_text(lower) or '') for i in files}) > 1:
+                conflicts[self._sources[lower][1]] = [self.bib_filenames[i] for i in files]
+        return conflicts
+
+    def get_bibliography(self, keys: Optional[list[str]] = None, fast_subset: bool = False) -> BibliographyData:
+        """parses the used definitions of the keys, only the files that hold one of them (not parsed before) are parsed
+
+        Args:
+            keys (list, optional): citation keys, keys that are not in any of the files are ignored. Defaults to None (all keys).
+            fast_subset (bool, optional): whether to only parse the requested entries of each file instead of the whole file (see BibFileIndex). Defaults to False.
+
+        Returns:
+            pybtex.database.BibliographyData: bibliography object with the entries of the keys, in the order of the keys
+        """
+        keys = self.keys if keys is None else list(dict.fromkeys(keys))
+        by_file: dict[int, list[str]] = {}
+        for key in keys:
+            source = self._sources.get(key.lower())
+            if source is not None and key.lower() not in self._parsed:
+                by_file.setdefault(source[0], []).append(key)
+        start = time.perf_counter()
+        files = sorted(by_file)
+        jobs = min(len(files), self.jobs or os.cpu_count() or 1)
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                parts = list(executor.map(_load_entries, [self.bib_filenames[i] for i in files], [by_file[i] for i in files],
+                                          [self.use_cache] * len(files), [fast_subset] * len(files)))
+        else:
+            parts = [self._indexes[i].get_bibliography(by_file[i]) if fast_subset else
+                     _load_entries(self.bib_filenames[i], by_file[i], self.use_cache, fast_subset) for i in files]
+        for part in parts:
+            for key, entry in part.entries.items():
+                self._parsed[key.lower()] = entry
+        if self.verbose and files:
+            print('parsed %d of %d bib files in %.3f s' % (len(files), len(self.bib_filenames), time.perf_counter() - start))
+        parsed = [self._parsed.get(key.lower()) for key in keys]
+        return BibliographyData(entries=[(entry.key, entry) for entry in parsed if entry is not None])
+
+    def close(self) -> None:
+        for index in self._indexes:
+            index.close()
+
+    def __repr__(self) -> str:
+        return 'BibStore(%d keys in %d files, %d defined in several files)' % (len(self.keys), len(self.bib_filenames), len(self._defined_in))
+
+def _normalize_entry(text: str) -> str:
+    # entry type and key are case insensitive
+    head, _, body = ' '.join(text.split()).partition(',')
+    return head.lower() + ',' + body
+
+def _load_entries(bib_filename: str, keys: list[str], use_cache: bool, fast_subset: bool) -> BibliographyData:
+    # runs in a worker process, only the requested entries are sent back
+    if fast_subset:
+        index = BibFileIndex(bib_filename)
+        bib_dict = index.get_bibliography(keys)
+        index.close()
+        return bib_dict
+    bib_dict = read_bib_file(bib_filename, use_cache, verbose=False)
+    # the keys as written in the bib file, the entries may be shared with other bibliography objects
+    return BibliographyData(entries=[(bib_dict.entries[key].key, bib_dict.entries[key]) for key in keys if key in bib_dict.entries])
+
+def print_conflicts(conflicts: dict[str, list[str]]) -> None:
+    """prints the keys that are defined with different entries in several bib files (see BibStore.conflicts)"""
+    for key, files in conflicts.items():
+        print('key "%s" is defined with different entries in %s, the entry of %s is used' % (key, ', '.join(files), files[0]))
@@ -0,0 +1,157 @@
+# %%
+import csv
+import json
+import bisect
+
+from typing import Any, Optional
+
+from pylatex_tools.citations import Citation, find_citations
+from pylatex_tools.texhelpers import LineMap
+from pylatex_tools.count_words import sectioning_commands_dict, get_headings_in_list, get_sections_in_list, count_words_in_sections, cumulate_counts
+from pylatex_tools.detex_cache import DetexCache
+
+class Occurrence:
+    """a single citation of a key
+
+    Args:
+        key (str): citation key
+        filename (str): file of the citation ('' if the lines do not come from a file)
+        line (int): line number in that file (starting at 1)
+        heading (int): index of the heading the citation is under (see CitationIndex.headings), -1 before the first heading
+        command (str): cite command (e.g., 'parencite')
+    """
+
+    def __init__(self, key: str, filename: str, line: int, heading: int, command: str):
+        self.key = key
+        self.filename = filename
+        self.line = line
+        self.heading = heading
+        self.command = command
+
+    def __repr__(self) -> str:
+        return 'Occurrence(%r, %r, line=%d, heading=%d, command=%r)' % (self.key, self.filename, self.line, self.heading, self.command)
+
+class CitationIndex:
+    """inverted index of the citations in a tex document: citation key -> occurrences (file, line, section path)
+
+        Built in a single pass over the citations (see find_citations), the headings are found with the same
+        detection as in count_words (has_struct_el). Queries such as where a key is cited, citations per section and
+        citations per 1000 words are answered from the index.
+
+    Args:
+        lines (list): tex lines without comments (e.g., from load_preprocessed)
+        line_map (LineMap, optional): source file and line of each line (see load_preprocessed). Defaults to None (line numbers in lines).
+        citations (list, optional): citations in lines (see find_citations) if they were found already. Defaults to None.
+        outline (tuple, optional): result of get_headings_in_list(lines) if the headings were found already. Defaults to None.
+
+    Attributes:
+        occurrences (dict): citation key -> list of Occurrence objects, in the order of their first citation
+        headings (list): (level, name, path) of each heading, path is a tuple of the names of the enclosing headings and the heading
+    """
+
+    def __init__(self, lines: list[str], line_map: Optional[LineMap] = None, citations: Optional[list[Citation]] = None,
+                 outline: Optional[tuple[list[str], list[str], list[int], list[int]]] = None):
+        self._lines = lines
+        heading_name, heading_level, self._level, self._linenum = outline or get_headings_in_list(lines)
+        self.headings: list[tuple[str, str, tuple[str, ...]]] = []
+        stack: list[tuple[int, str]] = []
+        for name, h, level in zip(heading_name, heading_level, self._level):
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, name))
+            self.headings.append((h, name, tuple(n for _, n in stack)))
+
+        starts = []
+        offset = 0
+        for line in lines:
+            starts.append(offset)
+            offset += len(line)
+        self.occurrences: dict[str, list[Occurrence]] = {}
+        for citation in find_citations(lines) if citations is None else citations:
+            i = bisect.bisect_right(starts, citation.offset) - 1
+            filename, linenum = line_map[i] if line_map is not None else ('', i + 1)
+            heading = bisect.bisect_right(self._linenum, i, 0, len(self.headings)) - 1
+            self.occurrences.setdefault(citation.key, []).append(Occurrence(citation.key, filename, linenum, heading, citation.command))
+
+    def __len__(self) -> int:
+        return sum(len(o) for o in self.occurrences.values())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.occurrences
+
+    def where(self, key: str) -> list[Occurrence]:
+        """returns the occurrences of a key (empty if it is not cited)"""
+        return self.occurrences.get(key, [])
+
+    def counts(self) -> dict[str, int]:
+        """returns key -> number of citations, ordered by the number of citations (then by the first citation)"""
+        return dict(sorted(((key, len(o)) for key, o in self.occurrences.items()), key=lambda x: x[1], reverse=True))
+
+    def section_path(self, heading: int) -> tuple[str, ...]:
+        """returns the names of the enclosing headings and the heading, () before the first heading"""
+        return self.headings[heading][2] if heading >= 0 else ()
+
+    def citations_per_section(self) -> list[int]:
+        """returns the number of citations from each heading to the next heading"""
+        counts = [0] * len(self.headings)
+        for occurrences in self.occurrences.values():
+            for o in occurrences:
+                if o.heading >= 0:
+                    counts[o.heading] += 1
+        return counts
+
+    def sections(self, word_counts: Optional[list[int]] = None, cache: Optional[DetexCache] = None) -> list[dict[str, Any]]:
+        """returns the citations and words of each heading
+
+        Args:
+            word_counts (list, optional): words from each heading to the next heading (e.g., from count_words_in_list). Defaults to None (the sections are detexed).
+            cache (DetexCache, optional): cache of detexed sections, used if the sections are detexed. Defaults to None.
+
+        Returns:
+            list: one dict per heading with level, name, path, citations and words (up to the next heading), citations_cum
+                and words_cum (the heading with all its subparts) and density (citations per 1000 words of the subpart)
+        """
+        if word_counts is None:
+            word_counts = count_words_in_sections(get_sections_in_list(self._lines, self._linenum), cache=cache)
+        citations = self.citations_per_section()
+        citations_cum = cumulate_counts(citations, self._level)
+        words_cum = cumulate_counts(word_counts, self._level)
+        return [{'level': h, 'name': name, 'path': list(path), 'citations': citations[i], 'words': word_counts[i],
+                 'citations_cum': citations_cum[i], 'words_cum': words_cum[i],
+                 'density': round(1000 * citations_cum[i] / words_cum[i], 2) if words_cum[i] else 0.0}
+                for i, (h, name, path) in enumerate(self.headings)]
+
+    def to_rows(self) -> list[dict[str, Any]]:
+        """returns one dict per citation (key, file, line, section, command) in the order of the keys"""
+        return [{'key': o.key, 'file': o.filename, 'line': o.line, 'section': ' > '.join(self.section_path(o.heading)), 'command': o.command}
+                for occurrences in self.occurrences.values() for o in occurrences]
+
+    def write(self, filename: str, sections: Optional[list[dict[str, Any]]] = None) -> None:
+        """writes the index to a json file (if filename ends with .json) or to a csv file with one row per citation
+
+        Args:
+            filename (str): path to the output file
+            sections (list, optional): result of sections(), only written to json files. Defaults to None.
+        """
+        if filename.lower().endswith('.json'):
+            data: dict[str, Any] = {'citations': self.to_rows()}
+            if sections is not None:
+                data['sections'] = sections
+            with open(filename, 'w', encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            return
+        with open(filename, 'w', encoding="utf-8", newline='') as f:
+            writer = csv.DictWriter(f, ['key', 'file', 'line', 'section', 'command'])
+            writer.writeheader()
+            writer.writerows(self.to_rows())
+
+    def __repr__(self) -> str:
+        return 'CitationIndex(%d citations of %d keys under %d headings)' % (len(self), len(self.occurrences), len(self.headings))
+
+def print_sections(sections: list[dict[str, Any]]) -> None:
+    """prints the citations, words and citations per 1000 words of each heading (see CitationIndex.sections)"""
+    sep = '  '
+    print('\n' + '-' * 50)
+    print('\ncitations  words  per 1000 words -- heading (with all subparts)\n')
+    for s in sections:
+        print('%9d %6d %15.1f -- %s%s' % (s['citations_cum'], s['words_cum'], s['density'], sep * sectioning_commands_dict[s['level']], s['name']))
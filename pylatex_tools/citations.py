@@ -0,0 +1,113 @@
+# %%
+import re
+import bisect
+
+from typing import Union
+
+# natbib and biblatex cite commands taking a single (comma separated) list of keys
+cite_commands = ['cite', 'citep', 'citet', 'citealp', 'citealt', 'citenum', 'citeauthor', 'citeyear', 'citeyearpar', 'citetitle', 'citeurl', 'citedate',
+                 'Cite', 'Citep', 'Citet', 'Citealp', 'Citealt', 'Citeauthor',
+                 'autocite', 'parencite', 'textcite', 'footcite', 'footcitetext', 'smartcite', 'supercite', 'fullcite', 'footfullcite',
+                 'Autocite', 'Parencite', 'Textcite', 'Footcite', 'Smartcite',
+                 'nocite']
+# biblatex multicite commands, e.g., \cites[see][5]{key1}[10]{key2}
+multicite_commands = ['cites', 'parencites', 'textcites', 'footcites', 'autocites', 'smartcites', 'supercites',
+                      'Cites', 'Parencites', 'Textcites', 'Footcites', 'Autocites', 'Smartcites']
+
+class Citation:
+    """a single citation key in a tex document
+
+    Args:
+        key (str): citation key
+        offset (int): character offset of the key in the document
+        line (int): line number of the key (starting at 1)
+        command (str): cite command (e.g., 'parencite')
+    """
+
+    def __init__(self, key: str, offset: int, line: int, command: str):
+        self.key = key
+        self.offset = offset
+        self.line = line
+        self.command = command
+
+    def __repr__(self) -> str:
+        return 'Citation(%r, offset=%d, line=%d, command=%r)' % (self.key, self.offset, self.line, self.command)
+
+def _alternation(commands: list[str]) -> str:
+    # longest names first, a command name must not be followed by further letters (e.g., \cite vs. \citep)
+    return '(?:' + '|'.join(re.escape(c) for c in sorted(commands, key=len, reverse=True)) + ')(?![a-zA-Z])'
+
+class CitationScanner:
+    """finds all citations in a tex document in a single pass
+
+        All cite commands are combined into one regular expression, which is compiled once. Starred forms
+        (e.g., \\citep*), optional arguments (e.g., \\cite[p.~5]{key}) and multicite commands are supported,
+        keys can span several lines. Comments are skipped.
+
+    Args:
+        commands (list, optional): cite commands taking a single list of keys. Defaults to cite_commands.
+        multi_commands (list, optional): multicite commands. Defaults to multicite_commands.
+    """
+
+    def __init__(self, commands: list[str] = cite_commands, multi_commands: list[str] = multicite_commands):
+        optional = r'(?:\s*\[[^\[\]]*\])'
+        # a % preceded by an even number of backslashes starts a comment
+        parts = [r'(?P<comment>(?<!\\)(?:\\\\)*%[^\n]*)']
+        if commands:
+            parts.append(r'\\(?P<cmd>' + _alternation(commands) + r')\*?' + optional + r'{0,2}\s*\{(?P<keys>[^{}]*)\}')
+        if multi_commands:
+            parts.append(r'\\(?P<multi>' + _alternation(multi_commands) + r')\*?(?:\s*\([^()]*\)){0,2}(?P<args>(?:' + optional + r'{0,2}\s*\{[^{}]*\})+)')
+        self.regexp = re.compile('|'.join(parts))
+        self.keys_regexp = re.compile(r'\{([^{}]*)\}')
+
+    def scan(self, tex: Union[str, list[str]]) -> list[Citation]:
+        """returns all citations in a tex document
+
+        Args:
+            tex (str or list): tex document as a string or as a list of lines
+
+        Returns:
+            list: list of Citation objects in the order of their occurence
+        """
+        text = tex if isinstance(tex, str) else ''.join(tex)
+        line_starts = [0] + [m.end() for m in re.finditer('\n', text)]
+        citations = []
+        for m in self.regexp.finditer(text):
+            if m.group('comment') is not None:
+                continue
+            if m.group('cmd') is not None:
+                command = m.group('cmd')
+                key_lists = [(m.group('keys'), m.start('keys'))]
+            else:
+                command = m.group('multi')
+                key_lists = [(k.group(1), m.start('args') + k.start(1)) for k in self.keys_regexp.finditer(m.group('args'))]
+            for keys, offset in key_lists:
+                for k in re.finditer(r'[^,\s]+', keys):
+                    if k.group() == '*':
+                        # \nocite{*}
+                        continue
+                    start = offset + k.start()
+                    citations.append(Citation(k.group(), start, bisect.bisect_right(line_starts, start), command))
+        return citations
+
+_scanners: dict[tuple[tuple[str, ...], tuple[str, ...]], CitationScanner] = {}
+
+def get_citation_scanner(commands: list[str] = cite_commands, multi_commands: list[str] = multicite_commands) -> CitationScanner:
+    """returns a (cached) CitationScanner for a set of cite commands"""
+    key = (tuple(commands), tuple(multi_commands))
+    if key not in _scanners:
+        _scanners[key] = CitationScanner(commands, multi_commands)
+    return _scanners[key]
+
+def find_citations(tex: Union[str, list[str]], commands: list[str] = cite_commands, multi_commands: list[str] = multicite_commands) -> list[Citation]:
+    """returns all citations (key, offset, line and command) in a tex document
+
+    Args:
+        tex (str or list): tex document as a string or as a list of lines
+        commands (list, optional): cite commands taking a single list of keys. Defaults to cite_commands.
+        multi_commands (list, optional): multicite commands. Defaults to multicite_commands.
+
+    Returns:
+        list: list of Citation objects in the order of their occurence
+    """
+    return get_citation_scanner(commands, multi_commands).scan(tex)
@@ -1,109 +1,184 @@
 # %%
 import os
 import sys
+import time
 import argparse
-import re
-from typing import Optional, Union
+from collections import Counter
+from typing import TYPE_CHECKING, Any, Optional, Union
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+if __name__ == '__main__' and not __package__:
+    # run as a script (e.g., python pylatex_tools/count_words.py), the package has to be importable
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
-from pylatex_tools.texhelpers import strip_comments_in_tex, get_citations_in_tex, load_file_as_list, strip_tc_ignore, read_bib_file
+from pylatex_tools.texhelpers import get_citations_in_tex
+from pylatex_tools.texproject import TexProject
+from pylatex_tools.citations import Citation
+from pylatex_tools.bibindex import BibliographyIndex
+from pylatex_tools.keyindex import KeyIndex, get_key_index, format_suggestions
+from pylatex_tools.detex_cache import DetexCache
 
-def count_citations(filename: str, 
-            citation_keys: Optional[str] = None, 
-            pattern_match_in_bibliography: Optional[str] = None, 
-            bibliography: Optional[str] = None, 
-            ignore_via_tc_ignore: bool = False) -> None:
-    # load lines from tex file
-    lines = load_file_as_list(filename)
-    if ignore_via_tc_ignore:
-        lines = strip_tc_ignore(lines)
-    lines = strip_comments_in_tex(lines)
+if TYPE_CHECKING:
+    from pybtex.database import BibliographyData # type: ignore
+
+def count_citations_in_list(lines: list[str],
+            citation_keys: Optional[list[str]] = None,
+            pattern_match_in_bibliography: Optional[list[str]] = None,
+            bib_dict: Optional['BibliographyData'] = None,
+            bib_index: Optional[BibliographyIndex] = None,
+            citations: Optional[list[Citation]] = None,
+            key_index: Optional[KeyIndex] = None) -> dict[str, Any]:
+    """counts how often each citation key is used in a list of tex lines (comments have to be stripped already)
 
+    Args:
+        lines (list): list of tex lines
+        citation_keys (list, optional): only count the keys that contain one of these strings. Defaults to None.
+        pattern_match_in_bibliography (list, optional): only count the references whose title or authors match one of the patterns. Defaults to None.
+        bib_dict (pybtex.database.BibliographyData, optional): bibliography object, required for pattern_match_in_bibliography. Defaults to None.
+        bib_index (BibliographyIndex, optional): index of bib_dict, built from bib_dict if not given. Defaults to None.
+        citations (list, optional): citations in lines (see find_citations) if they were found already. Defaults to None.
+        key_index (KeyIndex, optional): index of the keys of bib_dict for the suggestions, see get_key_index. Defaults to None (cached per bib_dict).
+
+    Returns:
+        dict: 
+            citations (int): number of citations
+            unique_citations (int): number of cited keys
+            counts (dict): key -> number of occurences, ordered by the number of occurences
+            occurences (dict): number of occurences -> number of references with that many occurences
+            references (dict): key -> authors, year and title of the reference (only if bib_dict is given)
+            missing (list): cited keys that are not in the bibliography (only if bib_dict is given)
+            suggestions (dict): missing key -> closest keys of the bibliography, closest first (only if bib_dict is given, see KeyIndex.suggest)
+    """
     # get citation keys from tex file
-    cites = get_citations_in_tex(lines, unique_set=False)
+    cites = get_citations_in_tex(lines, unique_set=False) if citations is None else [c.key for c in citations]
     
     # if citation_keys was specified as argument, filter for these
     if citation_keys:
         cites = [c for c in cites if any([c.find(ck)>=0 for ck in citation_keys])]
-    
-    if bibliography:
-        bib_dict = read_bib_file(bibliography)
 
     # if pattern_match_in_bibliography was specified, filter for matches
     if pattern_match_in_bibliography:
-        #load bibliography
-        cites_ = []
-        for c in cites:
-            
-            title_match = False
-            try:
-                title = bib_dict.entries[c].fields['title'].replace('{', '').replace('}', '')
-                title_match = any([title.find(p)>=0 for p in pattern_match_in_bibliography])
-            except:
-                pass
-
-            authors_match = False
-            try:
-                authors = [x.__str__() for x in bib_dict.entries[c].persons['author']]
-                for a in authors:
-                    for p in pattern_match_in_bibliography:
-                        authors_match = authors_match or re.search(p, a, re.IGNORECASE) # type: ignore
-            except:
-                pass
-
-            if any([title_match, authors_match]):
-                cites_.append(c)
-        cites = cites_
-
-    # count occurences per key
-    unique_cites = list(set(cites))
-    counts = [cites.count(c) for c in unique_cites]
-
-    # print keys with the number of their occurences, ordered by their occurences
-    order = sorted(range(len(counts)), reverse = True, key=lambda k: counts[k])
-    if bibliography:
+        # search each unique key only once in the index of the bibliography
+        if bib_index is None:
+            bib_index = BibliographyIndex(bib_dict)
+        matches = bib_index.match(cites, pattern_match_in_bibliography)
+        cites = [c for c in cites if c in matches]
+
+    # count occurences per key in a single pass, keys ordered by their occurences (then by their first occurence)
+    key_counts = Counter(cites)
+    result: dict[str, Any] = {'citations': len(cites), 'unique_citations': len(key_counts), 'counts': dict(key_counts.most_common())}
+
+    # tabulate the number of occurences
+    tab: dict[int, int] = {}
+    for c in key_counts.values():
+        if c in tab.keys():
+            tab[c] += 1
+        else:
+            tab[c] = 1
+    result['occurences'] = {c: tab[c] for c in sorted(tab.keys(), reverse=True)}
+
+    if bib_dict is not None:
+        references = {}
+        for key in result['counts']:
+            if key in bib_dict.entries:
+                entry = bib_dict.entries[key]
+                references[key] = {'authors': [x.__str__() for x in entry.persons.get('author', [])], 
+                                   'year': entry.fields.get('year', ''), 'title': entry.fields.get('title', '')}
+        result['references'] = references
+        result['missing'] = [key for key in result['counts'] if key not in bib_dict.entries]
+        result['suggestions'] = {}
+        if result['missing']:
+            # the index is only built if a key is missing
+            result['suggestions'] = (key_index or get_key_index(bib_dict)).suggest_all(result['missing'])
+    return result
+
+def print_citation_counts(result: dict[str, Any], bib_dict: Optional['BibliographyData'] = None) -> None:
+    """prints the result of count_citations_in_list"""
+    counts = result['counts']
+    if bib_dict is not None:
         print('\n' + '-' * 50)
         print('\ncitation_key: # occurences -- reference\n')        
-        for o in order:
-            authors: Union[str, list[str]] = ''
-            try:
-                authors = [x.__str__() for x in bib_dict.entries[unique_cites[o]].persons['author']]
-            except:
-                pass
-            year = bib_dict.entries[unique_cites[o]].fields['year']
-            title = bib_dict.entries[unique_cites[o]].fields['title']
-            print(f"{unique_cites[o]}: {counts[o]} -- {' '.join(authors)} ({year}) {title}")
+        for key, count in counts.items():
+            if key not in bib_dict.entries:
+                print(f"{key}: {count} -- not in the bibliography{format_suggestions(result.get('suggestions', {}).get(key, []))}")
+                continue
+            entry = bib_dict.entries[key]
+            authors = [x.__str__() for x in entry.persons.get('author', [])]
+            year = entry.fields.get('year', '')
+            title = entry.fields.get('title', '')
+            print(f"{key}: {count} -- {' '.join(authors)} ({year}) {title}")
     else:
         print('\n' + '-' * 50)
         print('\ncitation_key: # occurences\n')        
-        for o in order:
-            print(f"{unique_cites[o]}: {counts[o]}")
+        for key, count in counts.items():
+            print(f"{key}: {count}")
         
-    print(f"\nA total of {len(cites)} citations found, {len(unique_cites)} unique.")
+    print(f"\nA total of {result['citations']} citations found, {result['unique_citations']} unique.")
     print('\n' + '-' * 50)
-    # tabulate the number of occurences
-    tab: dict[int, int] = {}
-    for c in counts:
-        if c in tab.keys():
-            tab[c] += 1
-        else:
-            tab[c] = 1
     print('\n# occurences:# references')
-    for c in sorted(tab.keys(), reverse=True):
-        print(f"{c}:{tab[c]}")
+    for c, n in result['occurences'].items():
+        print(f"{c}:{n}")
     print('\n' + '-' * 50)
 
+def count_citations(filename: str, 
+            citation_keys: Optional[list[str]] = None, 
+            pattern_match_in_bibliography: Optional[list[str]] = None, 
+            bibliography: Optional[Union[str, list[str]]] = None, 
+            ignore_via_tc_ignore: bool = False,
+            follow_includes: bool = False,
+            use_cache: bool = True,
+            verbose: bool = True,
+            per_section: bool = False,
+            index_filename: Optional[str] = None,
+            cache: Optional[DetexCache] = None) -> dict[str, Any]:
+    """counts how often each citation key is used in a tex document (see count_citations_in_list), prints the counts if verbose is True
+       if per_section is True, the citations, words and citations per 1000 words of each heading are added as 'sections' (see CitationIndex.sections),
+       the sections are detexed for the word count (only those not in the cache, if a DetexCache is given)
+       if index_filename is given, every citation with its file, line and section is written to that csv or json file (see CitationIndex.write)
+       bibliography can be a list of bib files, the first file that defines a key is used and keys defined with different entries are added as 'conflicts' (see BibStore)
+       see Document.count_citations to share the loaded document with other operations
+    """
+    # document imports this module
+    from pylatex_tools.document import Document
+
+    return Document(filename, ignore_via_tc_ignore, follow_includes).count_citations(citation_keys, pattern_match_in_bibliography, bibliography, use_cache,
+                                                                                      verbose, per_section, index_filename, cache)
+
+def watch_count_citations(filename: str, 
+            citation_keys: Optional[list[str]] = None, 
+            pattern_match_in_bibliography: Optional[list[str]] = None, 
+            bibliography: Optional[Union[str, list[str]]] = None, 
+            ignore_via_tc_ignore: bool = False,
+            follow_includes: bool = False,
+            use_cache: bool = True) -> None:
+    # counts the citations like count_citations and counts again whenever the tex file, an included file or the bibliography is saved
+    def get_filenames() -> list[str]:
+        filenames = list(TexProject(filename).files) if follow_includes else [filename]
+        if bibliography:
+            filenames += [bibliography] if isinstance(bibliography, str) else bibliography
+        return filenames
+
+    def run():
+        start = time.perf_counter()
+        count_citations(filename, citation_keys, pattern_match_in_bibliography, bibliography, ignore_via_tc_ignore, follow_includes, use_cache)
+        print('\nupdated in %.0f ms' % (1000 * (time.perf_counter() - start)))
+
+    from pylatex_tools.watch import watch
+    watch(get_filenames, run)
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description= "extracts citation keys and displays how often you used that citation",
             formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('tex_filename', type=str, help='path to the latex file')   
     parser.add_argument('-c', '--citation_keys', nargs='*', default=[], help='if citation keys are provided - only these are searched for (also searches for partial matches of citation keys with the argument')
     parser.add_argument('-p', '--pattern_match_in_bibliography', nargs='*', default=[], help='performs pattern matching in author names and title of the references - requires argument --bibliography to be specified')
-    parser.add_argument('-b', '--bibliography', type=str, default = None, help='path to the bibliography (bibtex file)')
+    parser.add_argument('-b', '--bibliography', type=str, nargs='+', default = None, help='path to the bibliography (bibtex file), several bib files are merged (the first file that defines a key is used)')
     parser.add_argument('-i', '--ignore_via_tc_ignore', type=bool, default=False, help='wethere to ignore lines between "%TC:ignore" and "%TC:endignore".')    
+    parser.add_argument('-f', '--follow_includes', type=bool, default=False, help='whether to follow \\input, \\include, \\subfile and \\import commands.')
+    parser.add_argument('-s', '--per_section', type=bool, default=False, help='whether to print the citations and citations per 1000 words of each heading.')
+    parser.add_argument('-o', '--index_filename', type=str, default=None, help='path to a .csv or .json file for every citation with its file, line and section.')
     #parser.add_argument('-w', '--write_csv_output', type=bool, default=False, help='whether to write the word count to csv file. Default True.')
     args = parser.parse_args()
 
-    count_citations(args.tex_filename, args.citation_keys, args.pattern_match_in_bibliography, args.bibliography, args.ignore_via_tc_ignore)
+    count_citations(args.tex_filename, args.citation_keys, args.pattern_match_in_bibliography, args.bibliography, args.ignore_via_tc_ignore, args.follow_includes,
+                    per_section=args.per_section, index_filename=args.index_filename)
 # %%
@@ -2,17 +2,25 @@
 import os
 import sys
 import re
+import time
 import argparse
 
 from typing import Optional
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+if __name__ == '__main__' and not __package__:
+    # run as a script (e.g., python pylatex_tools/count_words.py), the package has to be importable
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
-from pylatex_tools.detex import detex
-from pylatex_tools.texhelpers import strip_comments_in_tex, load_file_as_list, strip_tc_ignore
+from pylatex_tools.detex import detex, get_default_engine, get_backend_fingerprint
+from pylatex_tools.texhelpers import iter_file_lines, preprocess_lines
+from pylatex_tools.texproject import TexProject
+from pylatex_tools.detex_cache import DetexCache, MemoryDetexCache
 
 sectioning_commands = ['part', 'chapter', 'section', 'subsection', 'subsubsection', 'paragraph', 'subparagraph']
 sectioning_commands_dict = {x: i for i, x in enumerate(sectioning_commands)}
+heading_regexps = {h: re.compile(r'''(?<!\\)%.+|(\\(?:no)?''' + h +  r'''[\*]*?\{((?!\*)[^{}]+)\})''') for h in sectioning_commands}
+# matches if any of the sectioning commands is in a string, most lines have none
+any_heading_regexp = re.compile(r'\\(?:' + '|'.join(sectioning_commands) + ')')
 
 def has_struct_el(text: str) -> tuple[Optional[str], Optional[int]]:    
     """checks for the presence of a sectioning command in a string
@@ -23,14 +31,19 @@ def has_struct_el(text: str) -> tuple[Optional[str], Optional[int]]:
     Returns:
         tuple: (sectioning_command, position in str) if present, otherwise (None,None)
     """
+    if any_heading_regexp.search(text) is None:
+        return None, None
     for i, h in enumerate(sectioning_commands):
         p = text.find('\\' + h)
         if p >= 0:
             return h, p    
     return None, None
     
-def count_words_in_list(lines: list[str]) -> tuple[list[str], list[str], list[int], list[int]]:
-    """counts word in a tex doc - structure by the sectioning commands
+# private-use character inserted in front of each heading when the whole document is detexed at once
+SECTION_MARKER = '\ue000'
+
+def get_headings_in_list(lines: list[str]) -> tuple[list[str], list[str], list[int], list[int]]:
+    """finds the sectioning commands in a list of tex lines
 
     Args:
         lines (list): list of tex lines
@@ -39,11 +52,9 @@ def count_words_in_list(lines: list[str]) -> tuple[list[str], list[str], list[in
         tuple (list, list, list, list): 
             heading_name (list): subsectioning heading names
             heading_level (list): which level the corresponding heading is at
-            counts (list): word count in between two subsectioning commands
-            counts_cum (list): cummulative count of all words in a subsection
+            level (list): index of the heading level in sectioning_commands
+            linenum (list): line number of each heading, followed by the number of lines
     """
-    current_level = 0
-    
     heading_name = []
     heading_level = []
     level = [] 
@@ -51,36 +62,187 @@ def count_words_in_list(lines: list[str]) -> tuple[list[str], list[str], list[in
     for i, line in enumerate(lines):
         h, p = has_struct_el(line)
         if h:
-            rx = re.compile(r'''(?<!\\)%.+|(\\(?:no)?''' + h +  r'''[\*]*?\{((?!\*)[^{}]+)\})''')
+            rx = heading_regexps[h]
             ck_str = [m.group(2) for m in rx.finditer(line) if m.group(2)]
             heading_level.append(h)
             heading_name.append(ck_str[0])
             level.append(sectioning_commands_dict[h])
             linenum.append(i)
     linenum.append(len(lines))
+    return heading_name, heading_level, level, linenum
 
-    counts = [0 for x in heading_name]
-    # loop over headings
-    for i, h in enumerate(heading_name):
-        
-        # count number of words in that part (until the next heading)
-        tex_str = ''
-        #print('%s from line %d to %d' % (h, linenum[i], linenum[i+1]))
-        for j in range(linenum[i], linenum[i+1]):
-            tex_str += lines[j]
-        txt = detex(tex_str)
-        cnt = len(txt.split())        
-        counts[i] = cnt
+def get_sections_in_list(lines: list[str], linenum: list[int]) -> list[str]:
+    """returns the tex text from each heading to the next heading
+
+    Args:
+        lines (list): list of tex lines
+        linenum (list): line number of each heading, followed by the number of lines
+
+    Returns:
+        list: list of tex strings, one per heading
+    """
+    return [''.join(lines[linenum[i]:linenum[i+1]]) for i in range(len(linenum) - 1)]
+
+def detex_sections_single_pass(sections: list[str]) -> Optional[list[str]]:
+    """detexes all sections in a single pass
+
+        A marker is placed in front of each section, so that the detexed text can be split into the 
+        sections again. The detex rules do not match across the markers, so the result is the same 
+        as detexing each section separately.
+
+    Args:
+        sections (list): list of tex strings
+
+    Returns:
+        list: detexed sections, None if the sections could not be recovered
+    """
+    text = SECTION_MARKER + SECTION_MARKER.join(sections)
+    if text.count(SECTION_MARKER) != len(sections):
+        # the marker is already used in the document
+        return None
+    detexed = get_default_engine(boundary=SECTION_MARKER).detex(text).split(SECTION_MARKER)
+    if len(detexed) != len(sections) + 1:
+        return None
+    return detexed[1:]
+
+def detex_sections_parallel(sections: list[str], single_pass: bool = False, jobs: Optional[int] = None, backend: str = 'regex') -> list[str]:
+    """detexes the sections in a process pool, the result is the same as detex_sections(sections, single_pass, backend=backend)
+
+        Consecutive sections are grouped to chunks of similar size (a few chunks per process).
+
+    Args:
+        sections (list): list of tex strings
+        single_pass (bool, optional): whether to detex all sections of a chunk at once. Defaults to False.
+        jobs (int, optional): number of worker processes. Defaults to None (number of cpus).
+        backend (str, optional): detex backend, see detex. Defaults to 'regex'.
+
+    Returns:
+        list: detexed sections
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from pylatex_tools.detex_parallel import MIN_CHUNK_SIZE
+
+    jobs = jobs or os.cpu_count() or 1
+    chunk_size = max(MIN_CHUNK_SIZE, sum(len(tex_str) for tex_str in sections) // (4 * jobs))
+    chunks: list[list[str]] = [[]]
+    size = 0
+    for tex_str in sections:
+        if size >= chunk_size:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(tex_str)
+        size += len(tex_str)
+    if jobs == 1 or len(chunks) == 1:
+        return detex_sections(sections, single_pass, backend=backend)
+    with ProcessPoolExecutor(min(jobs, len(chunks))) as executor:
+        return [txt for detexed in executor.map(detex_sections, chunks, [single_pass] * len(chunks), [1] * len(chunks), [backend] * len(chunks))
+                for txt in detexed]
+
+def detex_sections(sections: list[str], single_pass: bool = False, jobs: int = 1, backend: str = 'regex') -> list[str]:
+    """detexes each section
+
+    Args:
+        sections (list): list of tex strings
+        single_pass (bool, optional): whether to detex all sections at once instead of each section separately. Defaults to False.
+        jobs (int, optional): number of worker processes, see detex_sections_parallel. Defaults to 1.
+        backend (str, optional): detex backend, see detex. single_pass is only used with the regex backend. Defaults to 'regex'.
+
+    Returns:
+        list: detexed sections
+    """
+    if jobs != 1 and len(sections) > 1:
+        return detex_sections_parallel(sections, single_pass, jobs, backend)
+    detexed = None
+    if single_pass and sections and backend == 'regex':
+        detexed = detex_sections_single_pass(sections)
+    if detexed is None:
+        detexed = [detex(tex_str, backend) for tex_str in sections]
+    return detexed
+
+def count_words_in_sections(sections: list[str], single_pass: bool = False, cache: Optional[DetexCache] = None, jobs: int = 1, backend: str = 'regex') -> list[int]:
+    """counts the words in each section
+
+    Args:
+        sections (list): list of tex strings
+        single_pass (bool, optional): whether to detex all sections at once instead of each section separately. Defaults to False.
+        cache (DetexCache, optional): cache of detexed sections, only sections that are not in the cache are detexed. Defaults to None.
+        jobs (int, optional): number of worker processes that detex the sections. Defaults to 1.
+        backend (str, optional): detex backend, see detex. Defaults to 'regex'.
+
+    Returns:
+        list: word count of each section
+    """
+    if cache is None:
+        return [len(txt.split()) for txt in detex_sections(sections, single_pass, jobs, backend)]
+
+    fingerprint = get_backend_fingerprint(backend)
+    keys = [cache.key(tex_str, fingerprint) for tex_str in sections]
+    counts: list[int] = [0 for x in sections]
+    missing = []
+    for i, key in enumerate(keys):
+        entry = cache.get(key)
+        if entry is None:
+            missing.append(i)
+        else:
+            counts[i] = entry[1]
+    detexed = detex_sections([sections[i] for i in missing], single_pass, jobs, backend)
+    for i, txt in zip(missing, detexed):
+        counts[i] = len(txt.split())
+        cache.put(keys[i], txt, counts[i])
+    return counts
+
+def cumulate_counts(counts: list[int], level: list[int]) -> list[int]:
+    """adds the counts of all subparts to their higher level headings
+
+    Args:
+        counts (list): word count from each heading to the next heading
+        level (list): index of the heading level in sectioning_commands
+
+    Returns:
+        list: cummulative count of all words in a subpart
+    """
+    counts_cum = counts.copy()
+    # walk backwards, the stack holds the subparts that have not yet been added to a higher level heading
+    stack: list[int] = []
+    for i in range(len(level) - 1, -1, -1):
+        while stack and level[stack[-1]] > level[i]:
+            counts_cum[i] += counts_cum[stack.pop()]
+        stack.append(i)
+    return counts_cum
+
+def count_words_in_list(lines: list[str], single_pass: bool = False, cache: Optional[DetexCache] = None, verbose: bool = True, jobs: int = 1, backend: str = 'regex') -> tuple[list[str], list[str], list[int], list[int]]:
+    """counts word in a tex doc - structure by the sectioning commands
+
+    Args:
+        lines (list): list of tex lines
+        single_pass (bool, optional): whether to detex the whole document at once instead of each section separately. Defaults to False.
+        cache (DetexCache, optional): cache of detexed sections. Defaults to None.
+        jobs (int, optional): number of worker processes that detex the sections (None: number of cpus). Defaults to 1.
+        backend (str, optional): detex backend, 'regex' or 'tokenizer' (see detex). Defaults to 'regex'.
+        verbose (bool, optional): whether to print the word counts. Defaults to True.
+
+    Returns:
+        tuple (list, list, list, list): 
+            heading_name (list): subsectioning heading names
+            heading_level (list): which level the corresponding heading is at
+            counts (list): word count in between two subsectioning commands
+            counts_cum (list): cummulative count of all words in a subsection
+    """
+    heading_name, heading_level, level, linenum = get_headings_in_list(lines)
+
+    # count number of words in each part (until the next heading)
+    counts = count_words_in_sections(get_sections_in_list(lines, linenum), single_pass, cache, jobs, backend)
     
     # now add counts to higher level headings
-    counts_cum = counts.copy()
-    for i, l1 in enumerate(level):
-        for j, l2 in enumerate(level[i+1:]):
-            if l2 <= l1:
-                break
-            else:
-                counts_cum[i] += counts[j+i+1]
+    counts_cum = cumulate_counts(counts, level)
+
+    if verbose:
+        print_word_counts(heading_name, heading_level, counts, counts_cum)
 
+    return heading_name, heading_level, counts, counts_cum
+
+def print_word_counts(heading_name: list[str], heading_level: list[str], counts: list[int], counts_cum: list[int]) -> None:
+    """prints the word counts of count_words_in_list"""
     sep = '  '
     print('\n\n  **word count from heading to next heading (e.g., from section heading to next heading, which could be subsection)**\n')
     for i, h in enumerate(heading_level):
@@ -93,8 +255,6 @@ def count_words_in_list(lines: list[str]) -> tuple[list[str], list[str], list[in
     print('\n')
     print('%d in total words when summed across the section count\n' % sum([x for i,x in enumerate(counts_cum) if heading_level[i]=='section']))
 
-    return heading_name, heading_level, counts, counts_cum
-
 
 def write_to_csv(filename: str, counts: list[int], heading_level: list[str], heading_name: list[str], sep: str = ',') -> None:
     with open(filename, 'w', encoding = "utf-8") as f:
@@ -105,19 +265,23 @@ def write_to_csv(filename: str, counts: list[int], heading_level: list[str], hea
             f.write(line)
             f.write('\n')
 
-def count_words(tex_filename: str, ignore_via_tc_ignore: bool = False, write_csv_output: bool = False, write_tex_output: bool = False) -> None:
+def count_words(tex_filename: str, ignore_via_tc_ignore: bool = False, write_csv_output: bool = False, write_tex_output: bool = False, single_pass: bool = False, follow_includes: bool = False, cache: Optional[DetexCache] = None, verbose: bool = True, jobs: int = 1, backend: str = 'regex') -> tuple[list[str], list[str], list[int], list[int]]:
     """creates a word count for each document level and subpart for a tex document
        removes tex commands, image captions, header, citations, etc. - only counts the text
+       if follow_includes is True, files included via \\input, \\include, \\subfile or \\import are counted as well
+       if a cache (DetexCache) is given, only sections that changed since the last run are detexed
+       the sections are detexed by jobs worker processes (None: number of cpus) with the detex backend ('regex' or 'tokenizer')
+       returns heading_name, heading_level, counts and counts_cum (see count_words_in_list), prints them if verbose is True
+       see Document.count_words to share the loaded document with other operations
     """
-    lines = load_file_as_list(tex_filename)
-    if ignore_via_tc_ignore:
-        lines = strip_tc_ignore(lines)
-    lines = strip_comments_in_tex(lines)
-
-    print(('\n\nword count for file %s' % tex_filename).upper())
+    # document imports this module
+    from pylatex_tools.document import Document
 
-    heading_name, heading_level, counts, counts_cum = count_words_in_list(lines)
+    return Document(tex_filename, ignore_via_tc_ignore, follow_includes).count_words(single_pass, cache, verbose, jobs, backend, write_csv_output, write_tex_output)
 
+def write_word_count_files(tex_filename: str, heading_name: list[str], heading_level: list[str], counts: list[int], counts_cum: list[int],
+                           write_csv_output: bool = False, write_tex_output: bool = False) -> None:
+    """writes the word counts to two csv files (cumulative and till the next heading) and/or a tex table next to the tex file"""
     if write_csv_output:
         output_file = tex_filename.split('.')[0]+'-wordcount.csv'
         write_to_csv(output_file, counts_cum, heading_level, heading_name)
@@ -136,6 +300,71 @@ def count_words(tex_filename: str, ignore_via_tc_ignore: bool = False, write_csv
                 f.write(line)
             f.write('\\end{tabular}\n')
 
+def get_count_dict(heading_name: list[str], heading_level: list[str], counts: list[int]) -> dict[tuple[str, str, int], int]:
+    """returns the counts as a dict that can be compared between two versions of a document
+
+    Args:
+        heading_name (list): subsectioning heading names
+        heading_level (list): which level the corresponding heading is at
+        counts (list): word count of each heading
+
+    Returns:
+        dict: (heading_level, heading_name, occurence of this heading) -> count
+    """
+    count_dict: dict[tuple[str, str, int], int] = {}
+    for i, h in enumerate(heading_level):
+        k = 0
+        while (h, heading_name[i], k) in count_dict:
+            k += 1
+        count_dict[(h, heading_name[i], k)] = counts[i]
+    return count_dict
+
+def print_count_delta(previous: dict[tuple[str, str, int], int], current: dict[tuple[str, str, int], int]) -> None:
+    """prints the headings whose word count changed (see get_count_dict)"""
+    sep = '  '
+    print('  **changes since the last count**\n')
+    n_changes = 0
+    for key in list(current) + [k for k in previous if k not in current]:
+        old, cnt = previous.get(key, 0), current.get(key, 0)
+        if cnt != old:
+            level = sectioning_commands_dict[key[0]]
+            print(sep * level + '%+d' % (cnt - old) + sep * (6-level) + sep * level + key[1] + ' (%d -> %d)' % (old, cnt))
+            n_changes += 1
+    if n_changes == 0:
+        print('    no changes')
+
+def watch_count_words(tex_filename: str, ignore_via_tc_ignore: bool = False, single_pass: bool = False, follow_includes: bool = False, cache: Optional[DetexCache] = None) -> None:
+    """creates a word count like count_words and updates it whenever the tex file (or an included file) is saved
+
+       only the sections whose text changed are detexed again. runs until interrupted (ctrl+c)
+    """
+    if cache is None:
+        cache = MemoryDetexCache()
+    filenames = [tex_filename]
+    previous: dict[tuple[str, str, int], int] = {}
+
+    def run():
+        nonlocal previous
+        start = time.perf_counter()
+        if follow_includes:
+            project = TexProject(tex_filename)
+            filenames[:] = list(project.files)
+            source = project.iter_lines()
+        else:
+            source = iter_file_lines(tex_filename)
+        lines = [line for line, _, _ in preprocess_lines(source, ignore_via_tc_ignore)]
+
+        print(('\n\nword count for file %s' % tex_filename).upper())
+        heading_name, heading_level, counts, counts_cum = count_words_in_list(lines, single_pass=single_pass, cache=cache)
+        current = get_count_dict(heading_name, heading_level, counts_cum)
+        if previous:
+            print_count_delta(previous, current)
+        previous = current
+        print('\nupdated in %.0f ms' % (1000 * (time.perf_counter() - start)))
+
+    from pylatex_tools.watch import watch
+    watch(lambda: filenames, run)
+
 if __name__ == '__main__':
 
 
@@ -145,6 +374,9 @@ if __name__ == '__main__':
     parser.add_argument('-i', '--ignore_via_tc_ignore', type = bool, default = False, help='whether to ignore lines between "%TC:ignore" and "%TC:endignore".')                            
     parser.add_argument('-w', '--write_csv_output', type = bool, default = False, help = 'whether to write the word count to csv file. Default True.')
     parser.add_argument('-t', '--tex_output', type = bool, default = False, help = 'whether to write the word count to a tex file (table). Default False.')
+    parser.add_argument('-f', '--follow_includes', type = bool, default = False, help = 'whether to follow \\input, \\include, \\subfile and \\import commands. Default False.')
+    parser.add_argument('-s', '--single_pass', type = bool, default = False, help = 'whether to detex the whole document at once instead of each section separately (faster for many sections). Default False.')
+    parser.add_argument('--backend', type = str, default = 'regex', choices = ['regex', 'tokenizer'], help = 'detex with the regex rules or with a single pass tokenizer (handles nested arguments). Default regex.')
     args = parser.parse_args()
 
-    count_words(args.tex_filename, ignore_via_tc_ignore=args.ignore_via_tc_ignore, write_csv_output=args.write_csv_output, write_tex_output=args.tex_output)
+    count_words(args.tex_filename, ignore_via_tc_ignore=args.ignore_via_tc_ignore, write_csv_output=args.write_csv_output, write_tex_output=args.tex_output, single_pass=args.single_pass, follow_includes=args.follow_includes, backend=args.backend)
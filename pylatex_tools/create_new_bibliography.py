@@ -3,14 +3,19 @@ import os
 import sys
 import argparse
 
-from typing import Optional
+from typing import Any, Optional, Union
 
-from pybtex.database import BibliographyData # type: ignore
+from pybtex.database import BibliographyData, Entry # type: ignore
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+if __name__ == '__main__' and not __package__:
+    # run as a script (e.g., python pylatex_tools/count_words.py), the package has to be importable
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
-from pylatex_tools.texhelpers import strip_comments_in_tex, get_citations_in_tex, read_bib_file, remove_fields_from_bibliography
+from pylatex_tools.profiling import profiled
+from pylatex_tools.keyindex import format_suggestions
+from pylatex_tools.archive import open_text
 
+@profiled('load')
 def load_file(filename: str) -> list[str]:
     """ reads a text file and returns a list of the lines in the file
 
@@ -20,7 +25,7 @@ def load_file(filename: str) -> list[str]:
     Returns:
         list: list of lines
     """
-    textfile = open(filename, 'r', encoding="utf8")
+    textfile = open_text(filename)
     lines = []
     for line in textfile:
         lines.append(line)
@@ -31,47 +36,104 @@ def write_output(string: str, output_file: str = 'out.bib'):
     with open(output_file, 'w', encoding="utf-8") as f:
         f.write(string)
 
-def create_new_bib_str(cite_keys: list[str], bib_dict: BibliographyData) -> str:
+def create_new_bib_str(cite_keys: list[str], bib_dict: BibliographyData, suggestions: Optional[dict[str, list[str]]] = None) -> str:
     """ creates a new bibtex bibliography from a list of cite_keys as a string
 
     Args:
         cite_keys (list): list of citations keys
         bib_dict (pybtex.database.BibliographyData): bibliography object
-        output_file (string, optional): path to the output file to which should be written. Defaults to 'out.bib'.
+        suggestions (dict, optional): missing key -> similar keys of the bibliography, printed with the missing keys (see KeyIndex.suggest_all). Defaults to None.
     
     Returns:
         bib file as a string
     """
 
-    bib_str = ''
+    bib_strs = []
     for ck in cite_keys:
         if ck in bib_dict.entries:
-            bib_str += bib_dict.entries[ck].to_string('bibtex')
+            bib_strs.append(bib_dict.entries[ck].to_string('bibtex'))
         else:
-            print('could not find key "%s"' % ck)
-    return bib_str
+            print('could not find key "%s"%s' % (ck, format_suggestions((suggestions or {}).get(ck, []))))
+    return ''.join(bib_strs)
+
+def write_new_bib_file(cite_keys: list[str], bib_dict: BibliographyData, output_file: str = 'out.bib', remove_fields: list[str] = [], verbose: bool = True,
+                       aliases: Optional[dict[str, list[str]]] = None, suggestions: Optional[dict[str, list[str]]] = None) -> int:
+    """ writes a new bibtex bibliography from a list of cite_keys, entry by entry
 
-def create_new_bibliography(tex_filename: str, bib_filename: str, 
-                            output_file: str, remove_fields: list[str] = ['file', 'abstract', 'note']) -> None:
+    Args:
+        cite_keys (list): list of citations keys
+        bib_dict (pybtex.database.BibliographyData): bibliography object (not changed)
+        output_file (string, optional): path to the output file to which should be written. Defaults to 'out.bib'.
+        remove_fields (list, optional): names of fields that are not written (e.g., ['file', 'abstract']). Defaults to [].
+        verbose (bool, optional): whether to print the keys that are not in the bibliography. Defaults to True.
+        aliases (dict, optional): key -> other keys of the same work, written to the ids field (biblatex resolves citations of these keys). Defaults to None.
+        suggestions (dict, optional): missing key -> similar keys of the bibliography, printed with the missing keys (see KeyIndex.suggest_all). Defaults to None.
+    
+    Returns:
+        int: number of written entries
+    """
+    n_written = 0
+    # field names are case insensitive (as in pybtex), e.g., Abstract is removed with 'abstract'
+    remove = {rm.lower() for rm in remove_fields}
+    with open(output_file, 'w', encoding="utf-8") as f:
+        for ck in cite_keys:
+            if ck in bib_dict.entries:
+                entry = bib_dict.entries[ck]
+                ids = aliases.get(ck) if aliases else None
+                if ids:
+                    ids = list(dict.fromkeys([i.strip() for i in entry.fields.get('ids', '').split(',') if i.strip()] + ids))
+                if ids or any(rm in entry.fields for rm in remove_fields):
+                    # write a copy, bib_dict may be shared (e.g., in server mode)
+                    copy = Entry(entry.type, fields=[(k, v) for k, v in entry.fields.items() if k.lower() not in remove and not (ids and k.lower() == 'ids')],
+                                 persons=entry.persons)
+                    copy.key = entry.key
+                    entry = copy
+                if ids:
+                    f.write(_add_ids_field(entry.to_string('bibtex'), ids))
+                else:
+                    f.write(entry.to_string('bibtex'))
+                n_written += 1
+            elif verbose:
+                print('could not find key "%s"%s' % (ck, format_suggestions((suggestions or {}).get(ck, []))))
+    return n_written
+
+def _add_ids_field(bib_str: str, ids: list[str]) -> str:
+    # pybtex would escape the keys (e.g., _ as \_), so the field is appended to the written entry
+    body = bib_str.rstrip()[:-1].rstrip()
+    return '%s%s\n    ids = {%s}\n}\n' % (body, '' if body.endswith(',') else ',', ', '.join(ids))
+
+def create_new_bibliography(tex_filename: str, bib_filename: Optional[Union[str, list[str]]], 
+                            output_file: str, remove_fields: list[str] = ['file', 'abstract', 'note'],
+                            follow_includes: bool = False, use_cache: bool = True, fast_subset: bool = False,
+                            bib_dict: Optional[BibliographyData] = None, verbose: bool = True, dedupe: bool = False) -> dict[str, Any]:
     """ creates a new bibliography (bibtex) which contains only those bib entries that have been cited in the tex file
 
     Args:
-        bib_filename (str): path to the original bibliography (bibtex file)
-        tex_filename (str): path to the tex document in which citations occur
+        bib_filename (str or list): path to the original bibliography (bibtex file), or paths to several bib files that are merged. The first file that
+            defines a key is used, only the files with the used definitions of the cited keys are parsed (see BibStore). None: the bib files
+            of the tex document (\\bibliography and \\addbibresource, see Document.bib_files).
+        tex_filename (str): path to the tex document in which citations occur, can be in a zip archive (e.g., project.zip, see ProjectArchive)
         output_file (str): path to the to-be created bibliography (bibtex file)
         remove_fields (list, optional): a list of fields that should not be included in the new bibliography. Defaults to ['file', 'abstract', 'note'].
-    """
-    bib_dict = read_bib_file(bib_filename)
-    
-    bib_dict = remove_fields_from_bibliography(bib_dict, remove_fields)
+        follow_includes (bool, optional): whether to also search the files included via \\input, \\include, \\subfile or \\import. Defaults to False.
+        use_cache (bool, optional): whether to use the cache of parsed bib files. Defaults to True.
+        fast_subset (bool, optional): whether to only parse the cited entries (found via a BibFileIndex) instead of the whole bibliography. 
+            Faster for large bibliographies. Defaults to False.
+        bib_dict (pybtex.database.BibliographyData, optional): already parsed bibliography, bib_filename is not read if given. Defaults to None.
+        verbose (bool, optional): whether to print progress messages. Defaults to True.
+        dedupe (bool, optional): whether to write cited entries that describe the same work (see BibliographyDuplicates) only once, under the
+            key that is cited first. The other keys are written to its ids field. Defaults to False.
 
-    tex_lines = load_file(tex_filename)
-    stripped_lines = strip_comments_in_tex(tex_lines)
-    cite_keys = get_citations_in_tex(stripped_lines)
+    Returns:
+        dict: citations (number of cited keys), written (number of written entries), missing (cited keys that are not in the bibliography),
+            suggestions (missing key -> closest keys of the bibliography), output_file, with dedupe, rewritten (key -> key that replaces it)
+            and, with several bib files, conflicts (key -> bib files that define it with different entries, the first one is used)
+    """
+    # see Document.create_new_bibliography to share the loaded document with other operations
+    from pylatex_tools.document import Document
 
-    bib_str = create_new_bib_str(cite_keys, bib_dict)
-    print('found %d citations in the file %s\nwriting new bibtex file to %s' % (len(cite_keys), tex_filename, output_file))
-    write_output(bib_str, output_file='out.bib')
+    return Document(tex_filename, follow_includes=follow_includes).create_new_bibliography(bib_filename, output_file, remove_fields, use_cache, fast_subset,
+                                                                                           bib_dict, verbose, dedupe)
 
 # %%
 if __name__ == "__main__":
@@ -82,9 +144,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description= "this function writes a new bib file from the citation keys found in a tex file\nit function might come handy if you have a large bibtex file and you want to\ncreate a new bibtex file that only contains the citations in a specific document",
                 formatter_class=argparse.RawDescriptionHelpFormatter)
     parser.add_argument('tex_filename', type=str, default = 'main.tex', help='path to the latex file')
-    parser.add_argument('bib_filename', type=str, default = 'references.bib', help='path to the bibtex library (bib file)')
+    parser.add_argument('bib_filename', type=str, nargs='+', default = 'references.bib', help='path to the bibtex library (bib file), several bib files are merged (the first file that defines a key is used)')
     parser.add_argument('-o', '--out_filename', type=str, default = 'out.bib', help='path to the new output filename to which the new bibtex library should be written')
     parser.add_argument('-r', '--remove_fields', nargs='*', default=[], help='bibliography fields that should not be included in the newly written bib file (default: file)')
+    parser.add_argument('-f', '--follow_includes', type=bool, default=False, help='whether to follow \\input, \\include, \\subfile and \\import commands')
+    parser.add_argument('-x', '--fast_subset', type=bool, default=False, help='only parse the cited entries of the bibtex library (faster for large libraries)')
+    parser.add_argument('-d', '--dedupe', type=bool, default=False, help='write cited entries that describe the same work only once')
 
     args = parser.parse_args()
 
@@ -102,8 +167,8 @@ if __name__ == "__main__":
         print('the following fields will be removed from the new bibliography: %s' % ', '.join(remove_fields))
         
     print('input tex document: %s' % tex_filename)
-    print('input bibtex database: %s' % bib_filename)
-    create_new_bibliography(tex_filename,bib_filename, output_file, remove_fields)
+    print('input bibtex database: %s' % ', '.join(bib_filename))
+    create_new_bibliography(tex_filename,bib_filename, output_file, remove_fields, args.follow_includes, fast_subset=args.fast_subset, dedupe=args.dedupe)
 
 
 
@@ -0,0 +1,287 @@
+# %%
+import os
+import re
+import sys
+import csv
+import json
+import argparse
+import unicodedata
+
+from difflib import SequenceMatcher
+from typing import TYPE_CHECKING, Any, Optional
+
+if __name__ == '__main__' and not __package__:
+    # run as a script (e.g., python pylatex_tools/dedupe.py), the package has to be importable
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pylatex_tools.texhelpers import read_bib_file
+from pylatex_tools.profiling import profiled
+
+if TYPE_CHECKING:
+    from pybtex.database import BibliographyData, Entry # type: ignore
+
+doi_prefix_regexp = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+doi_in_url_regexp = re.compile(r'doi\.org/(10\.\S+)', re.IGNORECASE)
+latex_command_regexp = re.compile(r'\\(?:[a-zA-Z]+\s*|[^a-zA-Z\s])')
+non_alphanumeric_regexp = re.compile(r'[^0-9a-z]+')
+year_regexp = re.compile(r'\d{4}')
+
+def normalize_doi(doi: str) -> str:
+    """lower case doi without resolver prefix, e.g., 'https://doi.org/10.1038/227680A0' -> '10.1038/227680a0'"""
+    return doi_prefix_regexp.sub('', doi.strip()).strip().lower()
+
+def normalize_text(text: str) -> str:
+    """lower case ascii words separated by single spaces, without latex commands, curly brackets, accents and punctuation
+
+        e.g., 'The {DNA} of Schr{\\"o}dinger\\textquoteright s cat' -> 'the dna of schrodingers cat'
+    """
+    # accents (e.g., {\"o}) become the letter, other commands (e.g., \emph) are removed
+    text = latex_command_regexp.sub('', text).replace('{', '').replace('}', '')
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return non_alphanumeric_regexp.sub(' ', text).strip()
+
+class BibRecord:
+    """normalized fields of a bib entry that are compared to find duplicates
+
+    Args:
+        key (str): citation key
+        doi (str): normalized doi ('' if the entry has none)
+        title (str): normalized title ('' if the entry has none)
+        author (str): normalized last name of the first author (or editor)
+        year (str): year ('' if the entry has none)
+    """
+
+    def __init__(self, key: str, doi: str, title: str, author: str, year: str):
+        self.key = key
+        self.doi = doi
+        self.title = title
+        self.author = author
+        self.year = year
+
+    @classmethod
+    def from_entry(cls, key: str, entry: 'Entry') -> 'BibRecord':
+        fields = entry.fields
+        doi = fields.get('doi', '')
+        if not doi:
+            m = doi_in_url_regexp.search(fields.get('url', ''))
+            doi = m.group(1) if m else ''
+        year = year_regexp.search(fields.get('year', '') or fields.get('date', ''))
+        persons = entry.persons.get('author') or entry.persons.get('editor')
+        author = normalize_text(' '.join(persons[0].last_names)) if persons else ''
+        return cls(key, normalize_doi(doi), normalize_text(fields.get('title', '')), author, year.group() if year else '')
+
+    def __repr__(self) -> str:
+        return 'BibRecord(%r, doi=%r, title=%r, author=%r, year=%r)' % (self.key, self.doi, self.title, self.author, self.year)
+
+class BibliographyDuplicates:
+    """clusters of bib entries that describe the same work under different keys
+
+        No entry is compared with all others. Entries with the same doi, and entries with the same normalized title,
+        year and first author, are found via hash tables (blocking). Titles that differ slightly (e.g., typos or a
+        missing word) are found by sorting the entries twice (by title and by first author, year and title) and
+        comparing each entry only with the next window entries (sorted neighbourhood). The time grows with
+        n log n instead of n², e.g., a library with 50000 entries is checked in seconds.
+
+        Entries with different dois are never merged. Two entries without the same doi have to agree in year and
+        first author (if both have them) to be merged because of their titles.
+
+    Args:
+        bib_dict (pybtex.database.BibliographyData): bibliography object
+        window (int, optional): number of following entries each entry is compared with in the sorted orders. Defaults to 5.
+        threshold (float, optional): minimum similarity of two titles (0 to 1, see difflib.SequenceMatcher.ratio). Defaults to 0.9.
+        keys (list, optional): only the entries with these keys are compared (e.g., the cited keys). Defaults to None (all entries).
+
+    Attributes:
+        clusters (list): one dict per cluster with keys (in the order of the bib file, the first key is the canonical key)
+            and reasons (doi, title or similar title)
+        canonical (dict): key -> canonical key of its cluster, for the keys of all clusters
+    """
+
+    def __init__(self, bib_dict: 'BibliographyData', window: int = 5, threshold: float = 0.9, keys: Optional[list[str]] = None):
+        self.window = window
+        self.threshold = threshold
+        if keys is None:
+            self.records = [BibRecord.from_entry(key, entry) for key, entry in bib_dict.entries.items()]
+        else:
+            self.records = [BibRecord.from_entry(key, bib_dict.entries[key]) for key in dict.fromkeys(keys) if key in bib_dict.entries]
+        self._parent = list(range(len(self.records)))
+        # dois of the cluster of each root, entries with different dois are not merged
+        self._dois = [{r.doi} if r.doi else set() for r in self.records]
+        self._reasons: dict[int, set[str]] = {}
+
+        self._block(lambda r: r.doi, 'doi')
+        self._block(lambda r: (r.title, r.year, r.author) if r.title else '', 'title')
+        self._sorted_neighbourhood(lambda i: self.records[i].title)
+        self._sorted_neighbourhood(lambda i: (self.records[i].author, self.records[i].year, self.records[i].title))
+
+        members: dict[int, list[int]] = {}
+        for i in range(len(self.records)):
+            members.setdefault(self._find(i), []).append(i)
+        self.clusters: list[dict[str, Any]] = []
+        self.canonical: dict[str, str] = {}
+        for root, indices in members.items():
+            if len(indices) < 2:
+                continue
+            keys = [self.records[i].key for i in indices]
+            self.clusters.append({'keys': keys, 'reasons': sorted(self._reasons[root])})
+            for key in keys:
+                self.canonical[key] = keys[0]
+
+    def _find(self, i: int) -> int:
+        while self._parent[i] != i:
+            self._parent[i] = self._parent[self._parent[i]]
+            i = self._parent[i]
+        return i
+
+    def _union(self, i: int, j: int, reason: str) -> bool:
+        a, b = self._find(i), self._find(j)
+        if a == b:
+            return True
+        if self._dois[a] and self._dois[b] and self._dois[a] != self._dois[b]:
+            return False
+        # the root is the entry that comes first in the bib file
+        a, b = min(a, b), max(a, b)
+        self._parent[b] = a
+        self._dois[a] |= self._dois[b]
+        self._reasons[a] = self._reasons.get(a, set()) | self._reasons.pop(b, set()) | {reason}
+        return True
+
+    def _block(self, block_key, reason: str) -> None:
+        first: dict[Any, int] = {}
+        for i, record in enumerate(self.records):
+            key = block_key(record)
+            if not key:
+                continue
+            if key in first:
+                self._union(first[key], i, reason)
+            else:
+                first[key] = i
+
+    def _similar(self, r: BibRecord, s: BibRecord, matcher: Optional[SequenceMatcher] = None) -> bool:
+        """whether the titles of two entries (with the same year and first author, if they have them) are similar
+
+            matcher is a SequenceMatcher whose second sequence is the title of s, it is reused for the neighbours of s.
+        """
+        if not r.title or not s.title:
+            return False
+        if (r.year and s.year and r.year != s.year) or (r.author and s.author and r.author != s.author):
+            return False
+        if r.doi and s.doi:
+            # different dois, the same doi is found by blocking
+            return False
+        if 2 * min(len(r.title), len(s.title)) < self.threshold * (len(r.title) + len(s.title)):
+            # upper bound of the ratio (see SequenceMatcher.real_quick_ratio)
+            return False
+        if matcher is None:
+            matcher = SequenceMatcher(None, s.title, s.title, autojunk=False)
+        matcher.set_seq1(r.title)
+        # quick_ratio is an upper bound of ratio that is faster to compute
+        return matcher.quick_ratio() >= self.threshold and matcher.ratio() >= self.threshold
+
+    def _sorted_neighbourhood(self, sort_key) -> None:
+        order = sorted(range(len(self.records)), key=sort_key)
+        # the second sequence of a SequenceMatcher is indexed, so it is set once per entry
+        matcher = SequenceMatcher(None, autojunk=False)
+        for n, i in enumerate(order):
+            matcher.set_seq2(self.records[i].title)
+            for j in order[n + 1:n + 1 + self.window]:
+                if self._find(i) != self._find(j) and self._similar(self.records[j], self.records[i], matcher):
+                    self._union(i, j, 'similar title')
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def canonical_key(self, key: str) -> str:
+        """returns the canonical key of the cluster of a key (the key itself if it has no duplicates)"""
+        return self.canonical.get(key, key)
+
+    def rewrite(self, keys: list[str]) -> tuple[list[str], dict[str, str]]:
+        """replaces keys of the same cluster by the first of them in keys, e.g., the cited keys of a document
+
+        Args:
+            keys (list): citation keys
+
+        Returns:
+            tuple (list, dict): keys without duplicates (in the order of keys) and the rewritten keys (key -> key that replaces it)
+        """
+        first: dict[str, str] = {}
+        rewritten: dict[str, str] = {}
+        for key in keys:
+            cluster = self.canonical.get(key)
+            if cluster is None:
+                continue
+            first.setdefault(cluster, key)
+            if first[cluster] != key:
+                rewritten[key] = first[cluster]
+        return list(dict.fromkeys(k for k in keys if k not in rewritten)), rewritten
+
+    def to_rows(self) -> list[dict[str, Any]]:
+        """returns one dict per key of a cluster (cluster number, key, canonical key, reasons, doi, year, first author and title)"""
+        records = {r.key: r for r in self.records}
+        return [{'cluster': n + 1, 'key': key, 'canonical': cluster['keys'][0], 'reasons': ', '.join(cluster['reasons']),
+                 'doi': records[key].doi, 'year': records[key].year, 'author': records[key].author, 'title': records[key].title}
+                for n, cluster in enumerate(self.clusters) for key in cluster['keys']]
+
+    def write(self, filename: str) -> None:
+        """writes the clusters to a json file (if filename ends with .json) or to a csv file with one row per key of a cluster (see to_rows)"""
+        if filename.lower().endswith('.json'):
+            with open(filename, 'w', encoding="utf-8") as f:
+                json.dump({'entries': len(self.records), 'clusters': self.clusters, 'keys': self.to_rows()}, f, indent=2, ensure_ascii=False)
+            return
+        with open(filename, 'w', encoding="utf-8", newline='') as f:
+            writer = csv.DictWriter(f, ['cluster', 'key', 'canonical', 'reasons', 'doi', 'year', 'author', 'title'])
+            writer.writeheader()
+            writer.writerows(self.to_rows())
+
+    def __repr__(self) -> str:
+        return 'BibliographyDuplicates(%d clusters with %d keys in %d entries)' % (len(self.clusters), len(self.canonical), len(self.records))
+
+def print_duplicates(duplicates: BibliographyDuplicates) -> None:
+    """prints the keys of each cluster of duplicates with the reasons and the title of the canonical entry"""
+    records = {r.key: r for r in duplicates.records}
+    print('\n' + '-' * 50)
+    print('\n%d entries, %d clusters of duplicates (%d keys that can be replaced by the first key of their cluster)\n'
+          % (len(duplicates.records), len(duplicates.clusters), len(duplicates.canonical) - len(duplicates.clusters)))
+    for cluster in duplicates.clusters:
+        first = records[cluster['keys'][0]]
+        print('%s -- %s (%s)' % (', '.join(cluster['keys']), first.title[:60], ', '.join(cluster['reasons'])))
+
+@profiled('dedupe')
+def dedupe_bibliography(bib_filename: str, output_file: Optional[str] = None, window: int = 5, threshold: float = 0.9, use_cache: bool = True,
+                        bib_dict: Optional['BibliographyData'] = None, verbose: bool = True) -> BibliographyDuplicates:
+    """finds the entries of a bibliography that describe the same work under different keys (see BibliographyDuplicates)
+
+    Args:
+        bib_filename (str): path to the bibliography (bibtex file)
+        output_file (str, optional): path to a .csv or .json file to which the clusters are written. Defaults to None.
+        window (int, optional): number of following entries each entry is compared with in the sorted orders. Defaults to 5.
+        threshold (float, optional): minimum similarity of two titles (0 to 1). Defaults to 0.9.
+        use_cache (bool, optional): whether to use the cache of parsed bib files. Defaults to True.
+        bib_dict (pybtex.database.BibliographyData, optional): already parsed bibliography, bib_filename is not read if given. Defaults to None.
+        verbose (bool, optional): whether to print the clusters. Defaults to True.
+
+    Returns:
+        BibliographyDuplicates: clusters of duplicates
+    """
+    if bib_dict is None:
+        bib_dict = read_bib_file(bib_filename, use_cache, verbose)
+    duplicates = BibliographyDuplicates(bib_dict, window, threshold)
+    if verbose:
+        print_duplicates(duplicates)
+    if output_file:
+        duplicates.write(output_file)
+        if verbose:
+            print('duplicates written to %s' % output_file)
+    return duplicates
+
+# %%
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "finds entries of a bib file that describe the same work under different keys",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('bib_filename', type = str, help = 'path to the bibtex library (bib file)')
+    parser.add_argument('-o', '--out_filename', type = str, default = None, help = 'path to the report of the clusters (.csv or .json)')
+    parser.add_argument('--window', type = int, default = 5, help = 'number of neighbouring entries each entry is compared with. Default 5.')
+    parser.add_argument('--threshold', type = float, default = 0.9, help = 'minimum similarity of two titles (0 to 1). Default 0.9.')
+    args = parser.parse_args()
+
+    dedupe_bibliography(args.bib_filename, args.out_filename, args.window, args.threshold)
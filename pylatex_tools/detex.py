@@ -1,10 +1,19 @@
 # %%    
+import time
 import argparse
+import functools
+import hashlib
 import regex # type: ignore
 
+from typing import Optional
+
+from pylatex_tools.profiling import get_profiler, profiled
+from pylatex_tools.archive import open_text
+
+@profiled('load')
 def get_tex_string_from_file(filename: str) -> str:
-    # just opens the file and returns the content as a string
-    textfile = open(filename, 'r', encoding="utf8")
+    # just opens the file and returns the content as a string (also from a zip archive, see split_archive_path)
+    textfile = open_text(filename)
     filetext = textfile.read()
     textfile.close()
     return filetext
@@ -13,35 +22,54 @@ def get_tex_string_from_file(filename: str) -> str:
 
 def apply_regexps(text: str, list_reg_exp: list[dict]) -> str:
     """ Applies successively many regexps to a text"""
+    profiler = get_profiler()
     # apply all the rules in the ruleset
     for element in list_reg_exp:
         left = element['left']
         right = element['right']
-        r = regex.compile(left)
-        text = r.sub(right,text)
+        r = _compile(left)
+        if profiler is None:
+            text = r.sub(right, text, element.get('count', 0))
+        else:
+            start, size_in = time.perf_counter(), len(text)
+            text, n = r.subn(right, text, element.get('count', 0))
+            profiler.record('detex rule', 'apply_regexps: ' + left, time.perf_counter() - start, n, size_in, len(text))
     return text
 
-def detex_remove_header(text: str) -> str:
+@functools.lru_cache(maxsize=None)
+def _compile(left: str):
+    return regex.compile(left)
+
+def detex_remove_header_rules() -> list[dict]:
     # remove all the contents of the header, ie everything before the first occurence of "\begin{document}"
-    text = regex.sub(r"(?s).*?(\\begin\{document\})", "", text, 1)
+    return [{'left':r"(?s).*?(\\begin\{document\})", 'right':"", 'count':1}]
+
+def detex_remove_header(text: str) -> str:
+    text = apply_regexps(text, detex_remove_header_rules())
     return text
 
-def detex_remove_comments(text: str) -> str:
+def detex_remove_comments_rules() -> list[dict]:
     # remove comments
     regexps=[]
     regexps.append({r'left':r'([^\\])%.*', 'right':r'\1'})
-    text= apply_regexps(text, regexps)    
+    return regexps
+
+def detex_remove_comments(text: str) -> str:
+    text= apply_regexps(text, detex_remove_comments_rules())    
     return text
 
-def detex_reduce(text: str, to_reduce: list[str] = [r'\\emph', r'\\textbf', r'\\textit', r'\\text', r'\\IEEEauthorblockA', r'\\IEEEauthorblockN', r'\\author', r'\\caption',r'\\author',r'\\thanks']) -> str:
+def detex_reduce_rules(to_reduce: list[str] = [r'\\emph', r'\\textbf', r'\\textit', r'\\text', r'\\IEEEauthorblockA', r'\\IEEEauthorblockN', r'\\author', r'\\caption',r'\\author',r'\\thanks']) -> list[dict]:
     # replace some LaTeX commands by the contents inside the curly brackets
     regexps=[]
     for tag in to_reduce:
         regexps.append({'left':tag+r'\{([^\}\{]*)\}', 'right':r'\1'})
-    text = apply_regexps(text, regexps)
+    return regexps
+
+def detex_reduce(text: str, to_reduce: list[str] = [r'\\emph', r'\\textbf', r'\\textit', r'\\text', r'\\IEEEauthorblockA', r'\\IEEEauthorblockN', r'\\author', r'\\caption',r'\\author',r'\\thanks']) -> str:
+    text = apply_regexps(text, detex_reduce_rules(to_reduce))
     return text
 
-def detex_highlight(text: str) -> str:
+def detex_highlight_rules() -> list[dict]:
     # replace some LaTeX commands by the contents inside curly brackets and highlight these contents
     regexps = []
     to_highlight = [r'\\part[\*]*', r'\\chapter[\*]*', r'\\section[\*]*', r'\\subsection[\*]*', r'\\subsubsection[\*]*', r'\\paragraph[\*]*'];
@@ -52,10 +80,13 @@ def detex_highlight(text: str) -> str:
     to_highlight = [r'\\title',r'\\author',r'\\thanks',r'\\cite', r'\\ref'];
     for tag in to_highlight:
       regexps.append({'left':tag+r'\{([^\}\{]*)\}','right':r'[\1]'})
-    text = apply_regexps(text, regexps)
+    return regexps
+
+def detex_highlight(text: str) -> str:
+    text = apply_regexps(text, detex_highlight_rules())
     return text
 
-def detex_remove(text: str) -> str:
+def detex_remove_rules() -> list[dict]:
     # remove LaTeX tags
     # - remove completely some LaTeX commands that take arguments
     to_remove = [r'\\maketitle',r'\\footnote', r'\\centering', r'\\IEEEpeerreviewmaketitle', r'\\includegraphics', 
@@ -68,10 +99,13 @@ def detex_remove(text: str) -> str:
     for tag in to_remove:
       regexps.append({'left':tag+r'(\[[^\]]*\])*(\{[^\}\{]*\})*', 'right':r' '})
       #regexps.append({'left':tag+r'\{[^\}\{]*\}\[[^\]\[]*\]', 'right':r' '})
-    text = apply_regexps(text, regexps)
+    return regexps
+
+def detex_remove(text: str) -> str:
+    text = apply_regexps(text, detex_remove_rules())
     return text
 
-def detex_replace(text: str) -> str:
+def detex_replace_rules() -> list[dict]:
     # - replace some LaTeX commands by the contents inside curly rackets
     # replace some symbols by their ascii equivalent
     # - common symbols
@@ -116,27 +150,291 @@ def detex_replace(text: str) -> str:
     regexps.append({'left':r'[ \t]*\n','right':r'\n'})
     # remove consecutive blank lines
     regexps.append({'left':r'([ \t]*\n){3,}','right':r'\n'})
-    # apply all those regexps
-    text = apply_regexps(text, regexps)
+    return regexps
+
+def detex_replace(text: str) -> str:
+    text = apply_regexps(text, detex_replace_rules())
     # return the modified text
     return text    
 
-def detex(text: str) -> str:
+def detex_rules() -> list[tuple[str, list[dict]]]:
+    """returns the rule set used by detex, grouped by stage and in the order in which the stages are applied
+
+    Returns:
+        list: list of (stage name, list of rules) tuples
+    """
+    return [('remove_header', detex_remove_header_rules()),
+            ('remove_comments', detex_remove_comments_rules()),
+            ('reduce', detex_reduce_rules()),
+            ('highlight', detex_highlight_rules()),
+            ('remove', detex_remove_rules()),
+            ('replace', detex_replace_rules())]
+
+_METACHARACTERS = set('.^$*+?{}[]|()')
+_QUANTIFIERS = set('*+?{')
+
+def _parse_literal(left: str) -> tuple[str, bool]:
+    """returns the literal prefix of a regular expression and whether the whole expression is a literal
+
+    Args:
+        left (str): regular expression
+
+    Returns:
+        tuple (str, bool): prefix that every match has to start with, True if the expression only matches this prefix
+    """
+    if '|' in regex.sub(r'\\.', '', left):
+        # alternations can match without the prefix
+        return '', False
+    literal = ''
+    i = 0
+    while i < len(left):
+        c = left[i]
+        if c == '\\':
+            if i + 1 >= len(left) or left[i+1].isalnum():
+                # character classes (\d, \w, ...), back references, etc.
+                return literal, False
+            c = left[i+1]
+            step = 2
+        elif c in _METACHARACTERS:
+            if c in _QUANTIFIERS:
+                # the last character is optional or repeated
+                literal = literal[:-1]
+            return literal, False
+        else:
+            step = 1
+        if i + step < len(left) and left[i+step] in _QUANTIFIERS:
+            return literal, False
+        literal += c
+        i += step
+    return literal, True
+
+class _CompiledRule:
+    """a single precompiled rule, skipped if its literal prefix does not occur in the text"""
+
+    def __init__(self, rule: dict, boundary: Optional[str] = None):
+        self.rules = [rule]
+        self.pattern = _compile(rule['left'])
+        self.repl = rule['right']
+        self.count = rule.get('count', 0)
+        self.prefix, _ = _parse_literal(rule['left'])
+        self.boundary = boundary
+        self.name = rule['left']
+
+    def apply(self, text: str) -> str:
+        if self.prefix and self.prefix not in text:
+            return text
+        if self.count and self.boundary:
+            # the number of substitutions is limited for each part of the text
+            return self.boundary.join(self.pattern.sub(self.repl, part, self.count) for part in text.split(self.boundary))
+        return self.pattern.sub(self.repl, text, self.count)
+
+    def apply_counted(self, text: str) -> tuple[str, int]:
+        # same as apply, also returns the number of substitutions
+        if self.prefix and self.prefix not in text:
+            return text, 0
+        if self.count and self.boundary:
+            parts = [self.pattern.subn(self.repl, part, self.count) for part in text.split(self.boundary)]
+            return self.boundary.join(p for p, _ in parts), sum(n for _, n in parts)
+        return self.pattern.subn(self.repl, text, self.count)
+
+class _FusedRule:
+    """several literal rules applied in a single pass via an alternation pattern and a dispatch table"""
+
+    def __init__(self, rules: list[dict], literals: list[str], replacements: list[str]):
+        self.rules = rules
+        self.table = dict(zip(literals, replacements))
+        self.pattern = regex.compile('|'.join(regex.escape(l) for l in literals))
+        self.name = 'fused: ' + ' | '.join(literals)
+
+    def apply(self, text: str) -> str:
+        return self.pattern.sub(lambda m: self.table[m.group()], text)
+
+    def apply_counted(self, text: str) -> tuple[str, int]:
+        # same as apply, also returns the number of substitutions
+        return self.pattern.subn(lambda m: self.table[m.group()], text)
+
+def _overlaps(a: str, b: str) -> bool:
+    # True if occurrences of the literals a and b can overlap in a text
+    if a in b or b in a:
+        return True
+    for k in range(1, min(len(a), len(b))):
+        if a[-k:] == b[:k] or b[-k:] == a[:k]:
+            return True
+    return False
+
+def _compile_rules(rules: list[dict], boundary: Optional[str] = None) -> list:
+    """compiles a list of rules, fusing consecutive literal rules whenever this does not change the result
+
+        Fusing a literal rule into a group of preceding literal rules is safe if its occurrences cannot overlap
+        with those of the group, and if no replacement of the group can create a new match of the rule.
+
+    Args:
+        rules (list): list of rules (dicts with keys 'left', 'right' and optionally 'count')
+        boundary (str, optional): boundary character, see DetexEngine. Defaults to None.
+
+    Returns:
+        list: list of compiled rules with an apply(text) method
+    """
+    compiled: list = []
+    group: list[tuple[dict, str, str]] = []
+
+    def flush():
+        if len(group) == 1:
+            compiled.append(_CompiledRule(group[0][0], boundary))
+        elif group:
+            compiled.append(_FusedRule(*(list(x) for x in zip(*group))))
+        group.clear()
+
+    for rule in rules:
+        literal, is_literal = _parse_literal(rule['left'])
+        if not is_literal or not literal or rule.get('count', 0) != 0:
+            flush()
+            compiled.append(_CompiledRule(rule, boundary))
+            continue
+        replacement = _compile(rule['left']).sub(rule['right'], literal)
+        if not replacement or any(_overlaps(literal, l) or set(r) & set(literal) for _, l, r in group):
+            flush()
+        group.append((rule, literal, replacement))
+        if not replacement:
+            flush()
+    flush()
+    return compiled
+
+def _bound_pattern(left: str, boundary: str) -> str:
+    """rewrites a regular expression such that its matches cannot extend over the boundary character
+
+        "^" also matches right after the boundary and "." as well as negated character classes 
+        do not match the boundary. 
+
+    Args:
+        left (str): regular expression
+        boundary (str): boundary character
+
+    Returns:
+        str: rewritten regular expression
+    """
+    dotall = left.startswith('(?s)')
+    out = ''
+    i = 0
+    in_class = False
+    while i < len(left):
+        c = left[i]
+        if c == '\\':
+            out += left[i:i+2]
+            i += 2
+            continue
+        if in_class:
+            if c == ']' and not left[i-1] in '[^':
+                in_class = False
+                if negated:
+                    out += boundary
+        elif c == '[':
+            in_class = True
+            negated = left[i+1:i+2] == '^'
+        elif c == '.':
+            c = '[^%s]' % boundary if dotall else '[^\n%s]' % boundary
+        elif c == '^':
+            c = '(?:^|(?<=%s))' % boundary
+        out += c
+        i += 1
+    return out
+
+class DetexEngine:
+    """precompiled detex rule set
+
+        The rules of all detex stages are compiled once on construction. Consecutive literal rules
+        (e.g., \\ldots -> ...) are fused into a single pass and rules whose literal prefix does not 
+        occur in the text are skipped. The result is identical to applying the rules one by one.
+
+    Args:
+        extra_rules (list, optional): additional rules (dicts with keys 'left' and 'right') that are applied after the default rules. Defaults to [].
+        boundary (str, optional): character that separates independent parts of the text (e.g., sections). No rule matches across 
+            or removes it, so detexing the joined parts gives the same result as detexing each part separately. Defaults to None.
+    """
+
+    def __init__(self, extra_rules: list[dict] = [], boundary: Optional[str] = None):
+        self.stages = detex_rules()
+        if extra_rules:
+            self.stages.append(('extra', list(extra_rules)))
+        if boundary:
+            self.stages = [(name, [dict(rule, left=_bound_pattern(rule['left'], boundary)) for rule in rules]) for name, rules in self.stages]
+        self.compiled_stages = [(name, _compile_rules(rules, boundary)) for name, rules in self.stages]
+        # identifies the rule set, e.g., for caching detexed texts
+        self.fingerprint = hashlib.sha1(repr(self.stages).encode('utf-8')).hexdigest()
+
+    def detex(self, text: str) -> str:
+        """removes all tex commands from a tex document and creates a text-only version of the document
+
+        Args:
+            text (string): input latex string
+
+        Returns:
+            string: text-only version of the input
+        """
+        profiler = get_profiler()
+        if profiler is not None:
+            return self._detex_profiled(text, profiler)
+        for _, compiled_rules in self.compiled_stages:
+            for rule in compiled_rules:
+                text = rule.apply(text)
+        return text
+
+    def _detex_profiled(self, text: str, profiler) -> str:
+        # same as detex, records the time, substitutions and sizes of each rule and stage
+        total_start, total_size = time.perf_counter(), len(text)
+        for stage, compiled_rules in self.compiled_stages:
+            stage_start, stage_size, stage_substitutions = time.perf_counter(), len(text), 0
+            for rule in compiled_rules:
+                start, size_in = time.perf_counter(), len(text)
+                text, n = rule.apply_counted(text)
+                profiler.record('detex rule', '%s: %s' % (stage, rule.name), time.perf_counter() - start, n, size_in, len(text))
+                stage_substitutions += n
+            profiler.record('detex stage', stage, time.perf_counter() - stage_start, stage_substitutions, stage_size, len(text))
+        profiler.record('detex', 'detex', time.perf_counter() - total_start, 0, total_size, len(text))
+        return text
+
+_default_engines: dict[Optional[str], DetexEngine] = {}
+
+def get_default_engine(boundary: Optional[str] = None) -> DetexEngine:
+    """returns the (lazily compiled) engine with the default rule set used by detex
+
+    Args:
+        boundary (str, optional): boundary character, see DetexEngine. Defaults to None.
+
+    Returns:
+        DetexEngine: the engine
+    """
+    if boundary not in _default_engines:
+        _default_engines[boundary] = DetexEngine(boundary=boundary)
+    return _default_engines[boundary]
+
+# detex backends: the regex rules of detex_rules or a single pass tokenizer (see tokenizer.py)
+detex_backends = ['regex', 'tokenizer']
+
+def detex(text: str, backend: str = 'regex') -> str:
     """removes all tex commands from a tex document and creates a text-only version of the document
 
     Args:
         text (string): input latex string
+        backend (str, optional): 'regex' (the rules of detex_rules) or 'tokenizer' (single pass, also handles nested
+            arguments, see detex_tokenizer). Defaults to 'regex'.
 
     Returns:
         string: text-only version of the input
     """
-    text = detex_remove_header(text)
-    text = detex_remove_comments(text)
-    text = detex_reduce(text)
-    text = detex_highlight(text)
-    text = detex_remove(text)
-    text = detex_replace(text)
-    return text
+    if backend == 'tokenizer':
+        from pylatex_tools.tokenizer import detex_tokenizer
+        return detex_tokenizer(text)
+    if backend != 'regex':
+        raise ValueError('unknown detex backend %r (supported: %s)' % (backend, ', '.join(detex_backends)))
+    return get_default_engine().detex(text)
+
+def get_backend_fingerprint(backend: str = 'regex') -> str:
+    """identifies the rules of a detex backend, e.g., for caching detexed texts"""
+    if backend == 'tokenizer':
+        from pylatex_tools.tokenizer import fingerprint
+        return fingerprint()
+    return get_default_engine().fingerprint
 
 if __name__ == "__main__":
     """removes all tex commands from a tex document and creates a text-only version of the document
@@ -145,11 +443,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="removes all tex commands from a tex document and creates a text-only version of the document")
     parser.add_argument('tex_filename', type=str, help='path to the latex file')   
     parser.add_argument('-o', '--out_filename', type=str, default = None, help='specify a path to an output file in case you want to write the output')
+    parser.add_argument('--backend', type=str, default='regex', choices=detex_backends, help='regex rules or single pass tokenizer (handles nested arguments). Default regex.')
     args = parser.parse_args()    
     
     tex_string = get_tex_string_from_file(args.tex_filename)
 
-    detex_string = detex(tex_string)
+    detex_string = detex(tex_string, args.backend)
     detex_string = detex_string.replace('\\', '').replace('\\','')
     if args.out_filename is not None:
         with open(args.out_filename, 'w', encoding="utf8") as f:
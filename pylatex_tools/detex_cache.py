@@ -0,0 +1,142 @@
+# %%
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_CACHE_DIR = '.pylatex-tools-cache'
+
+class DetexCache:
+    """on-disk cache of detexed texts and their word counts
+
+        Entries are keyed by a hash of the raw tex text and of the detex rule set (see DetexEngine.fingerprint),
+        so changing the text or the rules never returns a stale entry. The entries are stored in a sqlite database
+        in cache_dir. When the cache grows beyond max_size, the least recently used entries are evicted.
+
+    Args:
+        cache_dir (str, optional): directory of the cache. Defaults to '.pylatex-tools-cache'.
+        max_size (int, optional): maximum size of the cached texts in bytes. Defaults to 64 MB.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_size: int = 64 * 1024 * 1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(cache_dir, 'detex.sqlite'), check_same_thread=False)
+        self._connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, text TEXT, count INTEGER, size INTEGER, last_access REAL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+
+    @staticmethod
+    def key(text: str, fingerprint: str) -> str:
+        """returns the cache key of a tex text
+
+        Args:
+            text (str): raw tex text
+            fingerprint (str): fingerprint of the detex rule set
+
+        Returns:
+            str: cache key
+        """
+        return hashlib.sha1((fingerprint + '\0' + text).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[tuple[str, int]]:
+        """returns the detexed text and its word count for a key, None if the key is not in the cache"""
+        with self._lock:
+            row = self._connection.execute('SELECT text, count FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            return row[0], row[1]
+
+    def put(self, key: str, text: str, count: int) -> None:
+        """stores the detexed text and its word count for a key"""
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', (key, text, count, len(text.encode('utf-8')), time.time()))
+
+    def size(self) -> int:
+        """returns the size of the cached texts in bytes"""
+        with self._lock:
+            return self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def evict(self) -> int:
+        """removes the least recently used entries until the cache is smaller than max_size
+
+        Returns:
+            int: number of removed entries
+        """
+        with self._lock:
+            total = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            removed = []
+            if total > self.max_size:
+                for key, size in self._connection.execute('SELECT key, size FROM entries ORDER BY last_access'):
+                    if total <= self.max_size:
+                        break
+                    removed.append((key,))
+                    total -= size
+                self._connection.executemany('DELETE FROM entries WHERE key = ?', removed)
+            return len(removed)
+
+    def close(self) -> None:
+        """evicts entries if necessary and writes the cache to disk"""
+        self.evict()
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+    def stats(self) -> str:
+        """returns a short report of the cache hits and misses"""
+        total = self.hits + self.misses
+        return 'cache %s: %d hits, %d misses (%.0f%% hit rate)' % (self.cache_dir, self.hits, self.misses, 100 * self.hits / total if total else 0)
+
+class MemoryDetexCache:
+    """in-memory cache of detexed texts and their word counts with the same interface as DetexCache
+
+        Used when the process is kept alive (e.g., in watch mode). When more than max_entries are stored, 
+        the least recently used entries are evicted.
+
+    Args:
+        max_entries (int, optional): maximum number of entries. Defaults to 100000.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.cache_dir = 'in memory'
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    key = staticmethod(DetexCache.key)
+
+    def get(self, key: str) -> Optional[tuple[str, int]]:
+        """returns the detexed text and its word count for a key, None if the key is not in the cache"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, text: str, count: int) -> None:
+        """stores the detexed text and its word count for a key"""
+        with self._lock:
+            self._entries[key] = (text, count)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def close(self) -> None:
+        pass
+
+    stats = DetexCache.stats
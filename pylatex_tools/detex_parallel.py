@@ -0,0 +1,68 @@
+# %%
+import os
+
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from pylatex_tools.detex import detex, get_default_engine
+from pylatex_tools.detex_stream import ChunkDetexer, split_safe, detex_chunks
+from pylatex_tools.profiling import profiled
+
+# smaller chunks are not worth sending to another process
+MIN_CHUNK_SIZE = 64 * 1024
+
+_detexer: Optional[ChunkDetexer] = None
+
+def _detex_part(chunk: str, first: bool) -> Optional[str]:
+    # runs in the worker processes
+    global _detexer
+    if _detexer is None:
+        _detexer = ChunkDetexer()
+    return _detexer.detex_part(chunk, first)
+
+def split_document(text: str, n_chunks: int, min_chunk_size: int = MIN_CHUNK_SIZE) -> list[str]:
+    """removes the header and splits a tex document into about n_chunks chunks at safe boundaries (see split_safe)
+
+    Args:
+        text (str): tex document
+        n_chunks (int): number of chunks wanted
+        min_chunk_size (int, optional): minimum number of characters of a chunk. Defaults to 64 kB.
+
+    Returns:
+        list: chunks
+    """
+    for name, rules in get_default_engine().compiled_stages:
+        if name == 'remove_header':
+            for rule in rules:
+                text = rule.apply(text)
+    chunk_size = max(min_chunk_size, len(text) // max(1, n_chunks))
+    return split_safe(text, chunk_size)
+
+@profiled('detex')
+def detex_parallel(text: str, jobs: Optional[int] = None, min_chunk_size: int = MIN_CHUNK_SIZE) -> str:
+    """detexes a tex document on several cores, the result is the same as detex(text)
+
+        The document (without header) is split at blank lines where no detex rule can match across (see
+        split_safe), the chunks are detexed in a process pool and joined again.
+
+    Args:
+        text (str): tex document
+        jobs (int, optional): number of worker processes. Defaults to None (number of cpus).
+        min_chunk_size (int, optional): minimum number of characters of a chunk. Defaults to 64 kB.
+
+    Returns:
+        str: text-only version of the document
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        return detex(text)
+    # a few chunks per process even out chunks that take longer
+    chunks = split_document(text, 4 * jobs, min_chunk_size)
+    if len(chunks) == 1:
+        return detex(text)
+    with ProcessPoolExecutor(min(jobs, len(chunks))) as executor:
+        parts = list(executor.map(_detex_part, chunks, [i == 0 for i in range(len(chunks))]))
+    if parts[0] is None:
+        # the rule anchored at the start of the document could match beyond the first chunk
+        return ''.join(detex_chunks(chunks))
+    return ChunkDetexer().join_rule.apply(''.join(parts))
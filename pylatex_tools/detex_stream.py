@@ -0,0 +1,272 @@
+# %%
+import regex # type: ignore
+
+from typing import Iterable, Iterator, Optional
+
+from pylatex_tools.detex import DetexEngine, get_default_engine
+from pylatex_tools.archive import open_text
+from pylatex_tools.texhelpers import iter_file_lines, preprocess_lines
+
+# number of characters after which a chunk is split off at the next safe boundary
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DOCUMENT_START = '\\begin{document}'
+
+_delimiters = regex.compile(r'[{}\[\]$]')
+_comment = regex.compile(r'(?<!\\)%.*')
+_comment_after_start = regex.compile(r'(?<=[^\\])%.*')
+_trailing_whitespace = regex.compile(r'[ \t\n]*\Z')
+
+class BoundaryTracker:
+    """tracks whether the text read so far ends at a safe boundary
+
+        Several detex rules match across lines: groups in curly brackets (e.g., \\emph{...}), optional arguments in
+        square brackets and inline math between two $. A blank line is a safe boundary if every curly and square bracket
+        before it is closed and the number of $ before it is even, so no rule can match across it.
+    """
+
+    def __init__(self):
+        self.braces = 0
+        self.brackets = 0
+        self.dollars = 0
+        self.start = True
+
+    def update(self, text: str) -> None:
+        """adds the next part of the text"""
+        start, self.start = self.start, False
+        if _delimiters.search(text) is None:
+            return
+        if '%' in text:
+            # a % at the start of the document is not removed
+            text = (_comment_after_start if start else _comment).sub('', text)
+        for c in _delimiters.findall(text):
+            if c == '{':
+                self.braces += 1
+            elif c == '}':
+                # a closing bracket without an opening bracket cannot be part of a match either
+                self.braces = max(0, self.braces - 1)
+            elif c == '[':
+                self.brackets += 1
+            elif c == ']':
+                self.brackets = max(0, self.brackets - 1)
+            else:
+                self.dollars += 1
+
+    def is_safe(self) -> bool:
+        return self.braces == 0 and self.brackets == 0 and self.dollars % 2 == 0
+
+def iter_safe_chunks(lines: Iterable[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """joins lines to chunks of at least chunk_size characters that are split at safe boundaries
+
+        A chunk ends right before a blank line at which the text can be split (see BoundaryTracker), so the next
+        chunk starts with the blank line. If there is no safe boundary, a chunk can be larger than chunk_size.
+
+    Args:
+        lines (iterable): lines of a tex document (with line endings)
+        chunk_size (int, optional): minimum number of characters of a chunk. Defaults to 1 MB.
+
+    Returns:
+        iterator: chunks, which joined give the lines
+    """
+    tracker = BoundaryTracker()
+    buffer: list[str] = []
+    size = 0
+    for line in lines:
+        if line == '\n' and size >= chunk_size and buffer[-1].endswith('\n') and tracker.is_safe():
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+        buffer.append(line)
+        size += len(line)
+        tracker.update(line)
+    if buffer:
+        yield ''.join(buffer)
+
+def split_safe(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list[str]:
+    """splits a text into chunks of at least chunk_size characters at safe boundaries, same as iter_safe_chunks for a text in memory
+
+    Args:
+        text (str): tex document (without header)
+        chunk_size (int, optional): minimum number of characters of a chunk. Defaults to 1 MB.
+
+    Returns:
+        list: chunks, which joined give the text
+    """
+    tracker = BoundaryTracker()
+    chunks = []
+    start = scanned = 0
+    while True:
+        # a chunk ends with the first newline of a blank line
+        i = text.find('\n\n', max(scanned, start + chunk_size - 1))
+        if i < 0:
+            break
+        tracker.update(text[scanned:i + 1])
+        scanned = i + 1
+        if tracker.is_safe():
+            chunks.append(text[start:scanned])
+            start = scanned
+    chunks.append(text[start:])
+    return chunks
+
+class ChunkDetexer:
+    """detexes a document chunk by chunk with the same result as detexing the whole document at once
+
+        The chunks have to be split at safe boundaries (see iter_safe_chunks) and the header has to be removed already
+        (see iter_document_lines). Two rules depend on the preceding chunks, so the chunks have to be passed in order:
+        the rule anchored at the start of the document (^([^\{]*)\}) removes the last closing bracket before the first
+        opening bracket, so the chunks are collected until one contains an opening bracket. Consecutive blank lines are
+        removed when the detexed chunks are joined.
+
+    Args:
+        engine (DetexEngine, optional): engine without extra rules and without boundary. Defaults to the default engine.
+    """
+
+    def __init__(self, engine: Optional[DetexEngine] = None):
+        engine = engine or get_default_engine()
+        self.rules = [rule for name, rules in engine.compiled_stages if name != 'remove_header' for rule in rules]
+        # the last rule removes consecutive blank lines, which can extend over the end of a chunk
+        self.join_rule = self.rules.pop()
+        self.anchored = next((i for i, rule in enumerate(self.rules) if rule.name.startswith('^')), None)
+        self.resolved = self.anchored is None
+        self.collected: list[str] = []
+        self.carry = ''
+
+    def _apply(self, text: str, start: int = 0, stop: Optional[int] = None) -> str:
+        for rule in self.rules[start:stop]:
+            text = rule.apply(text)
+        return text
+
+    def detex_part(self, text: str, first: bool = False) -> Optional[str]:
+        """detexes a chunk independently of the other chunks, consecutive blank lines are not removed (see join_rule)
+
+        Args:
+            text (str): chunk
+            first (bool, optional): whether this is the first chunk, only there the anchored rule is applied. Defaults to False.
+
+        Returns:
+            str: detexed text, None if this is the first chunk and the anchored rule could match beyond it
+        """
+        if self.anchored is None:
+            return self._apply(text)
+        text = self._apply(text, 0, self.anchored)
+        if not first:
+            return self._apply(text, self.anchored + 1)
+        if '{' not in text:
+            return None
+        return self._apply(text, self.anchored)
+
+    def detex_chunk(self, text: str, last: bool = False) -> str:
+        """detexes the next chunk
+
+        Args:
+            text (str): chunk
+            last (bool, optional): whether this is the last chunk. Defaults to False.
+
+        Returns:
+            str: detexed text. The trailing blank lines (and the chunks before the first opening bracket) are held
+                back until the next chunk.
+        """
+        if self.resolved:
+            text = self.detex_part(text)
+        else:
+            self.collected.append(self._apply(text, 0, self.anchored))
+            if '{' not in self.collected[-1] and not last:
+                return ''
+            text = self._apply(''.join(self.collected), self.anchored)
+            self.collected = []
+            self.resolved = True
+        text = self.carry + text
+        if last:
+            self.carry = ''
+        else:
+            split = _trailing_whitespace.search(text).start()
+            text, self.carry = text[:split], text[split:]
+        return self.join_rule.apply(text)
+
+def detex_chunks(chunks: Iterable[str], engine: Optional[DetexEngine] = None) -> Iterator[str]:
+    """detexes chunks of a document (without header) that were split at safe boundaries, see ChunkDetexer
+
+    Args:
+        chunks (iterable): chunks, e.g., from iter_safe_chunks
+        engine (DetexEngine, optional): engine without extra rules and without boundary. Defaults to the default engine.
+
+    Returns:
+        iterator: detexed text of each chunk
+    """
+    detexer = ChunkDetexer(engine)
+    previous = None
+    for chunk in chunks:
+        if previous is not None:
+            yield detexer.detex_chunk(previous)
+        previous = chunk
+    yield detexer.detex_chunk(previous or '', last=True)
+
+def _find_document_start(filename: str, block_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    # number of characters up to the end of the first \begin{document}, 0 if there is none
+    with open_text(filename) as f:
+        position = 0
+        tail = ''
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return 0
+            text = tail + block
+            i = text.find(DOCUMENT_START)
+            if i >= 0:
+                return position - len(tail) + i + len(DOCUMENT_START)
+            tail = text[-(len(DOCUMENT_START) - 1):]
+            position += len(block)
+
+def _iter_preprocessed_lines(filename: str, ignore_via_tc_ignore: bool, follow_includes: bool) -> Iterator[str]:
+    # the lines of Document.tex_string, read lazily
+    if follow_includes:
+        # texproject is only needed to follow includes
+        from pylatex_tools.texproject import TexProject
+        source: Iterable[tuple[str, str, int]] = TexProject(filename).iter_lines()
+    else:
+        source = iter_file_lines(filename)
+    return (line for line, _, _ in preprocess_lines(source, ignore_via_tc_ignore, False, False))
+
+def iter_document_lines(filename: str, block_size: int = DEFAULT_CHUNK_SIZE, ignore_via_tc_ignore: bool = False,
+                        follow_includes: bool = False) -> Iterator[str]:
+    """reads the lines of a tex file after the header (everything up to \\begin{document}) without loading the whole file
+
+        With ignore_via_tc_ignore or follow_includes, the lines are read twice (to find \\begin{document} and to read
+        the lines after it), with the lines between %TC:ignore and %TC:endignore removed or the included files inserted.
+    """
+    if ignore_via_tc_ignore or follow_includes:
+        start = next((i for i, line in enumerate(_iter_preprocessed_lines(filename, ignore_via_tc_ignore, follow_includes))
+                      if DOCUMENT_START in line), None)
+        for i, line in enumerate(_iter_preprocessed_lines(filename, ignore_via_tc_ignore, follow_includes)):
+            if start is None or i > start:
+                yield line
+            elif i == start:
+                rest = line[line.index(DOCUMENT_START) + len(DOCUMENT_START):]
+                if rest:
+                    yield rest
+        return
+    skip = _find_document_start(filename, block_size)
+    with open_text(filename) as f:
+        while skip > 0:
+            skip -= len(f.read(min(skip, block_size)))
+        first = f.readline()
+        if first:
+            yield first
+        for line in f:
+            yield line
+
+def detex_file_stream(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE, ignore_via_tc_ignore: bool = False,
+                      follow_includes: bool = False) -> Iterator[str]:
+    """detexes a tex file chunk by chunk, the memory needed depends on the chunk size rather than on the size of the file
+
+        The detexed chunks joined are the same as Document(filename, ignore_via_tc_ignore, follow_includes).detexed().
+
+    Args:
+        filename (str): path to the tex file
+        chunk_size (int, optional): minimum number of characters of a chunk. Defaults to 1 MB.
+        ignore_via_tc_ignore (bool, optional): whether to ignore lines between "%TC:ignore" and "%TC:endignore". Defaults to False.
+        follow_includes (bool, optional): whether to insert the files included via \\input, \\include, \\subfile or \\import. Defaults to False.
+
+    Returns:
+        iterator: detexed text, chunk by chunk
+    """
+    return detex_chunks(iter_safe_chunks(iter_document_lines(filename, chunk_size, ignore_via_tc_ignore, follow_includes), chunk_size))
@@ -0,0 +1,288 @@
+# %%
+from functools import cached_property
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
+
+from pylatex_tools.texhelpers import LineMap, iter_file_lines, preprocess_lines, read_bib_file, find_bib_files
+from pylatex_tools.archive import split_archive_path
+from pylatex_tools.citations import Citation, find_citations
+from pylatex_tools.detex import detex, get_backend_fingerprint
+from pylatex_tools.detex_cache import DetexCache
+from pylatex_tools.keyindex import KeyIndex, get_key_index
+from pylatex_tools.profiling import profiled
+
+# the modules of the operations are only imported when an operation needs them (e.g., not for detex)
+if TYPE_CHECKING:
+    from pybtex.database import BibliographyData # type: ignore
+    from pylatex_tools.citation_index import CitationIndex
+    from pylatex_tools.bibstore import BibStore
+
+class Document:
+    """a tex document whose derived artifacts are computed lazily, each at most once, and shared between operations
+
+        The lines of the document are read once. The cleaned lines (without comments), the outline (headings), the
+        sections, the citations, the detexed text, the word counts and the parsed bibliographies are computed when
+        they are first needed, so running count_words, count_citations and create_new_bibliography on the same
+        Document reads, strips and scans the document only once.
+
+    Args:
+        filename (str): path to the tex file, can be in a zip archive (e.g., project.zip/main.tex, or project.zip for its root document, see ProjectArchive)
+        ignore_via_tc_ignore (bool, optional): whether to ignore lines between "%TC:ignore" and "%TC:endignore". Defaults to False.
+        follow_includes (bool, optional): whether to insert the files included via \\input, \\include, \\subfile or \\import. Defaults to False.
+        check_path (callable, optional): called with the path of each included file, raises to reject it (see TexProject). Defaults to None.
+    """
+
+    def __init__(self, filename: str, ignore_via_tc_ignore: bool = False, follow_includes: bool = False, check_path: Optional[Callable[[str], Any]] = None):
+        self.filename = filename
+        self.ignore_via_tc_ignore = ignore_via_tc_ignore
+        self.follow_includes = follow_includes
+        self.check_path = check_path
+        self._detexed: dict[str, str] = {}
+        self._word_counts: dict[str, list[int]] = {}
+        self._bibliographies: dict[str, 'BibliographyData'] = {}
+        self._bib_stores: dict[tuple[str, ...], 'BibStore'] = {}
+
+    @cached_property
+    @profiled('load', 'Document.source')
+    def source(self) -> list[tuple[str, str, int]]:
+        """lines of the document (with the included files) as tuples (line, filename, line number)"""
+        if self.follow_includes:
+            from pylatex_tools.texproject import TexProject
+            return list(TexProject(self.filename, check_path=self.check_path).iter_lines())
+        return list(iter_file_lines(self.filename))
+
+    @cached_property
+    def tex_string(self) -> str:
+        """text of the document with comments (the lines between %TC:ignore and %TC:endignore are removed if ignore_via_tc_ignore)"""
+        return ''.join(line for line, _, _ in preprocess_lines(self.source, self.ignore_via_tc_ignore, False, False))
+
+    @cached_property
+    @profiled('preprocess', 'Document.lines')
+    def _preprocessed(self) -> tuple[list[str], LineMap]:
+        lines = []
+        line_map = LineMap()
+        for line, filename, linenum in preprocess_lines(self.source, self.ignore_via_tc_ignore):
+            lines.append(line)
+            line_map.append(filename, linenum, len(line))
+        return lines, line_map
+
+    @property
+    def lines(self) -> list[str]:
+        """lines without comments and comment environments, see load_preprocessed"""
+        return self._preprocessed[0]
+
+    @property
+    def line_map(self) -> LineMap:
+        """filename and line number of each of the lines"""
+        return self._preprocessed[1]
+
+    @cached_property
+    def outline(self) -> tuple[list[str], list[str], list[int], list[int]]:
+        """heading_name, heading_level, level and linenum of the headings, see get_headings_in_list"""
+        from pylatex_tools.count_words import get_headings_in_list
+        return get_headings_in_list(self.lines)
+
+    @cached_property
+    def sections(self) -> list[str]:
+        """tex text from each heading to the next heading"""
+        from pylatex_tools.count_words import get_sections_in_list
+        return get_sections_in_list(self.lines, self.outline[3])
+
+    @cached_property
+    @profiled('citations', 'Document.citations')
+    def citations(self) -> list[Citation]:
+        """all citations in the order of their occurence, see find_citations"""
+        return find_citations(self.lines)
+
+    @cached_property
+    def cite_keys(self) -> list[str]:
+        """cited keys, each only once in the order of their first citation"""
+        return list(dict.fromkeys(c.key for c in self.citations))
+
+    @cached_property
+    def bib_files(self) -> list[str]:
+        """bib files of the document (\\bibliography and \\addbibresource), see find_bib_files"""
+        return find_bib_files(self.lines, self.filename)
+
+    @cached_property
+    def citation_index(self) -> 'CitationIndex':
+        """occurrences of each citation key with their file, line and section"""
+        from pylatex_tools.citation_index import CitationIndex
+        return CitationIndex(self.lines, self.line_map, self.citations, self.outline)
+
+    def detexed(self, backend: str = 'regex', cache: Optional[DetexCache] = None, jobs: int = 1) -> str:
+        """returns the text-only version of the document (see detex)
+
+        Args:
+            backend (str, optional): detex backend, 'regex' or 'tokenizer'. Defaults to 'regex'.
+            cache (DetexCache, optional): cache of detexed texts. Defaults to None.
+            jobs (int, optional): number of worker processes (regex backend only, see detex_parallel). Defaults to 1.
+
+        Returns:
+            str: detexed text
+        """
+        if backend in self._detexed:
+            return self._detexed[backend]
+        entry = None
+        if cache is not None:
+            key = cache.key(self.tex_string, get_backend_fingerprint(backend))
+            entry = cache.get(key)
+        if entry is not None:
+            detex_string = entry[0]
+        else:
+            if jobs > 1 and backend == 'regex':
+                from pylatex_tools.detex_parallel import detex_parallel
+                detex_string = detex_parallel(self.tex_string, jobs)
+            else:
+                detex_string = detex(self.tex_string, backend)
+            if cache is not None:
+                cache.put(key, detex_string, len(detex_string.split()))
+        self._detexed[backend] = detex_string
+        return detex_string
+
+    def word_counts(self, single_pass: bool = False, cache: Optional[DetexCache] = None, jobs: int = 1, backend: str = 'regex') -> list[int]:
+        """returns the number of words from each heading to the next heading, see count_words_in_sections"""
+        if backend not in self._word_counts:
+            from pylatex_tools.count_words import count_words_in_sections
+            self._word_counts[backend] = count_words_in_sections(self.sections, single_pass, cache, jobs, backend)
+        return self._word_counts[backend]
+
+    def bibliography(self, bib_filename: str, use_cache: bool = True, verbose: bool = True) -> 'BibliographyData':
+        """returns the parsed bibliography, each bib file is read only once (see read_bib_file)"""
+        if bib_filename not in self._bibliographies:
+            self._bibliographies[bib_filename] = read_bib_file(bib_filename, use_cache, verbose)
+        return self._bibliographies[bib_filename]
+
+    def bib_store(self, bib_filenames: list[str], use_cache: bool = True, verbose: bool = True) -> 'BibStore':
+        """returns the merged key index of several bib files, each combination of bib files is scanned only once (see BibStore)"""
+        if tuple(bib_filenames) not in self._bib_stores:
+            from pylatex_tools.bibstore import BibStore
+            self._bib_stores[tuple(bib_filenames)] = BibStore(bib_filenames, use_cache, verbose)
+        return self._bib_stores[tuple(bib_filenames)]
+
+    def count_words(self, single_pass: bool = False, cache: Optional[DetexCache] = None, verbose: bool = True, jobs: int = 1, backend: str = 'regex',
+                    write_csv_output: bool = False, write_tex_output: bool = False) -> tuple[list[str], list[str], list[int], list[int]]:
+        """creates a word count for each document level and subpart, see count_words
+
+        Returns:
+            tuple (list, list, list, list): heading_name, heading_level, counts and counts_cum (see count_words_in_list)
+        """
+        from pylatex_tools.count_words import cumulate_counts, print_word_counts, write_word_count_files
+
+        if verbose:
+            print(('\n\nword count for file %s' % self.filename).upper())
+        heading_name, heading_level, level, _ = self.outline
+        counts = self.word_counts(single_pass, cache, jobs, backend)
+        counts_cum = cumulate_counts(counts, level)
+        if verbose:
+            print_word_counts(heading_name, heading_level, counts, counts_cum)
+        write_word_count_files(self.filename, heading_name, heading_level, counts, counts_cum, write_csv_output, write_tex_output)
+        return heading_name, heading_level, counts, counts_cum
+
+    def count_citations(self, citation_keys: Optional[list[str]] = None, pattern_match_in_bibliography: Optional[list[str]] = None,
+                        bibliography: Optional[Union[str, list[str]]] = None, use_cache: bool = True, verbose: bool = True, per_section: bool = False,
+                        index_filename: Optional[str] = None, cache: Optional[DetexCache] = None) -> dict[str, Any]:
+        """counts how often each citation key is used, see count_citations
+
+        Returns:
+            dict: result of count_citations_in_list (and sections if per_section is True, conflicts if several bib files are given)
+        """
+        from pylatex_tools.count_citations import count_citations_in_list, print_citation_counts
+        from pylatex_tools.citation_index import print_sections
+
+        if bibliography is None and split_archive_path(self.filename) is not None:
+            # the bib files of a project in a zip archive are read from the archive
+            bibliography = self.bib_files
+        bib_filenames = [bibliography] if isinstance(bibliography, str) else list(bibliography or [])
+        bib_dict, key_index, conflicts = None, None, None
+        if len(bib_filenames) > 1:
+            # only the files with the used definitions of the cited keys are parsed
+            store = self.bib_store(bib_filenames, use_cache, verbose)
+            bib_dict = store.get_bibliography(self.cite_keys)
+            if any(ck not in store for ck in self.cite_keys):
+                key_index = store.key_index
+            conflicts = store.conflicts(self.cite_keys)
+        elif bib_filenames:
+            bib_dict = self.bibliography(bib_filenames[0], use_cache, verbose)
+        result = count_citations_in_list(self.lines, citation_keys, pattern_match_in_bibliography, bib_dict, citations=self.citations, key_index=key_index)
+        if conflicts is not None:
+            result['conflicts'] = conflicts
+        if verbose:
+            print_citation_counts(result, bib_dict)
+            if conflicts:
+                from pylatex_tools.bibstore import print_conflicts
+                print_conflicts(conflicts)
+
+        if per_section or index_filename:
+            index = self.citation_index
+            sections = index.sections(self.word_counts(cache=cache)) if per_section else None
+            if sections is not None:
+                result['sections'] = sections
+                if verbose:
+                    print_sections(sections)
+            if index_filename:
+                index.write(index_filename, sections)
+                if verbose:
+                    print('citation index written to %s' % index_filename)
+        return result
+
+    def create_new_bibliography(self, bib_filename: Optional[Union[str, list[str]]], output_file: str, remove_fields: list[str] = ['file', 'abstract', 'note'],
+                                use_cache: bool = True, fast_subset: bool = False, bib_dict: Optional['BibliographyData'] = None,
+                                verbose: bool = True, dedupe: bool = False) -> dict[str, Any]:
+        """writes a bibliography with only the cited entries, see create_new_bibliography (bib_filename None: the bib files of the document, see bib_files)
+
+        Returns:
+            dict: citations (number of cited keys), written (number of written entries), missing (cited keys that are not in the bibliography),
+                suggestions (missing key -> closest keys of the bibliography), output_file, with dedupe, rewritten (key -> key that replaces it)
+                and, with several bib files, conflicts (key -> bib files that define it with different entries, the first one is used)
+        """
+        # pybtex is only imported when a bibliography is written
+        from pylatex_tools.create_new_bibliography import write_new_bib_file
+        from pylatex_tools.bibscan import BibFileIndex
+
+        cite_keys = self.cite_keys
+        bib_filenames = [bib_filename] if isinstance(bib_filename, str) else list(bib_filename or self.bib_files)
+        if not bib_filenames and bib_dict is None:
+            raise ValueError('no bib file given and no \\bibliography or \\addbibresource found in %s' % self.filename)
+        key_index = None
+        conflicts = None
+        if bib_dict is not None:
+            pass
+        elif len(bib_filenames) > 1:
+            store = self.bib_store(bib_filenames, use_cache, verbose)
+            bib_dict = store.get_bibliography(cite_keys, fast_subset)
+            if any(ck not in store for ck in cite_keys):
+                key_index = store.key_index
+            conflicts = store.conflicts(cite_keys)
+        elif bib_filenames[0] in self._bibliographies or not fast_subset:
+            bib_dict = self.bibliography(bib_filenames[0], use_cache, verbose)
+        else:
+            index = BibFileIndex(bib_filenames[0])
+            bib_dict = index.get_bibliography(cite_keys)
+            if any(ck not in bib_dict.entries for ck in cite_keys):
+                # the parsed subset only contains the cited keys, the suggestions come from all keys of the bib file
+                key_index = KeyIndex(index.keys)
+            index.close()
+
+        if verbose:
+            print('found %d citations in the file %s\nwriting new bibtex file to %s' % (len(cite_keys), self.filename, output_file))
+        result: dict[str, Any] = {'citations': len(cite_keys), 'missing': [ck for ck in cite_keys if ck not in bib_dict.entries], 'output_file': output_file}
+        result['suggestions'] = (key_index or get_key_index(bib_dict)).suggest_all(result['missing']) if result['missing'] else {}
+        if conflicts is not None:
+            result['conflicts'] = conflicts
+            if verbose and conflicts:
+                from pylatex_tools.bibstore import print_conflicts
+                print_conflicts(conflicts)
+        aliases: dict[str, list[str]] = {}
+        if dedupe:
+            # only the cited entries are compared, so a subset parsed with fast_subset is enough
+            from pylatex_tools.dedupe import BibliographyDuplicates
+            cite_keys, result['rewritten'] = BibliographyDuplicates(bib_dict, keys=cite_keys).rewrite(cite_keys)
+            for key, replacement in result['rewritten'].items():
+                aliases.setdefault(replacement, []).append(key)
+                if verbose:
+                    print('"%s" describes the same work as "%s", only "%s" is written (with "%s" in its ids field)' % (key, replacement, replacement, key))
+        result['written'] = write_new_bib_file(cite_keys, bib_dict, output_file, remove_fields, verbose, aliases, result['suggestions'])
+        return result
+
+    def __repr__(self) -> str:
+        return 'Document(%r, ignore_via_tc_ignore=%r, follow_includes=%r)' % (self.filename, self.ignore_via_tc_ignore, self.follow_includes)
@@ -0,0 +1,192 @@
+# %%
+import io
+import os
+import sys
+import csv
+import json
+import argparse
+import subprocess
+
+from typing import Any, Optional
+
+if __name__ == '__main__' and not __package__:
+    # run as a script (e.g., python pylatex_tools/history.py), the package has to be importable
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pylatex_tools.texhelpers import preprocess_lines
+from pylatex_tools.count_words import get_headings_in_list, get_sections_in_list, count_words_in_sections, cumulate_counts, get_count_dict
+from pylatex_tools.detex_cache import DetexCache, MemoryDetexCache
+from pylatex_tools.profiling import profiled
+
+class GitFileReader:
+    """reads files of any revision of a git repository through a single `git cat-file --batch` process
+
+        Nothing is checked out, the working tree is not touched. Use it in a with block (or call close) to end the
+        git process.
+
+    Args:
+        directory (str, optional): directory inside the git repository, paths are relative to it. Defaults to '.'.
+    """
+
+    def __init__(self, directory: str = '.'):
+        self.directory = directory
+        self._process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=directory or '.', stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, revision: str, path: str) -> Optional[tuple[str, bytes]]:
+        """returns the object id and the content of a file in a revision
+
+        Args:
+            revision (str): commit hash, branch, tag, etc.
+            path (str): path of the file relative to the directory
+
+        Returns:
+            tuple (str, bytes): object id and content, None if the file does not exist in the revision
+        """
+        self._process.stdin.write(('%s:./%s\n' % (revision, path.replace(os.sep, '/'))).encode('utf-8'))
+        self._process.stdin.flush()
+        header = self._process.stdout.readline().decode('utf-8').split()
+        if len(header) < 3 or header[-1] in ('missing', 'ambiguous'):
+            return None
+        object_id, kind, size = header[-3:]
+        content = self._process.stdout.read(int(size))
+        # the content is followed by a line break
+        self._process.stdout.read(1)
+        if kind != 'blob':
+            return None
+        return object_id, content
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait()
+
+    def __enter__(self) -> 'GitFileReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return 'GitFileReader(%r)' % self.directory
+
+def list_revisions(rev_range: str, path: str, directory: str = '.') -> list[tuple[str, str, str]]:
+    """returns the commits in rev_range that changed a file, oldest first
+
+    Args:
+        rev_range (str): revisions as understood by git log, e.g., 'main', 'v1.0..HEAD' or 'HEAD~50..'
+        path (str): path of the file relative to the directory
+        directory (str, optional): directory inside the git repository. Defaults to '.'.
+
+    Returns:
+        list: tuples (commit hash, commit date in ISO format, subject)
+    """
+    output = subprocess.run(['git', 'log', '--reverse', '--format=%H%x00%cI%x00%s', rev_range, '--', path], cwd=directory or '.',
+                            stdout=subprocess.PIPE, check=True).stdout.decode('utf-8')
+    return [tuple(line.split('\0', 2)) for line in output.splitlines() if line] # type: ignore
+
+def heading_label(key: tuple[str, str, int]) -> str:
+    """column name of a heading (see get_count_dict), e.g., 'section: Introduction'"""
+    level, name, k = key
+    return '%s: %s' % (level, name) if k == 0 else '%s: %s (%d)' % (level, name, k + 1)
+
+@profiled('history')
+def count_words_history(tex_filename: str, rev_range: str = 'HEAD', ignore_via_tc_ignore: bool = False, cache: Optional[DetexCache] = None,
+                        backend: str = 'regex', verbose: bool = True) -> list[dict[str, Any]]:
+    """counts the words of each section of a tex file in every commit of rev_range that changed the file
+
+        The file of each commit is read through a single `git cat-file --batch` process (see GitFileReader), without
+        checking out the commits. The cache is keyed by the text of each section, so only sections that changed since
+        an earlier commit are detexed: the time grows with the number of changed sections rather than with the number of
+        commits. Files included via \\input, etc. are not followed.
+
+    Args:
+        tex_filename (str): path to the tex file inside a git repository
+        rev_range (str, optional): revisions as understood by git log (e.g., 'v1.0..HEAD'). Defaults to 'HEAD' (the whole history).
+        ignore_via_tc_ignore (bool, optional): whether to ignore lines between "%TC:ignore" and "%TC:endignore". Defaults to False.
+        cache (DetexCache, optional): cache of detexed sections. Defaults to None (an in-memory cache).
+        backend (str, optional): detex backend, see detex. Defaults to 'regex'.
+        verbose (bool, optional): whether to print the timeline. Defaults to True.
+
+    Returns:
+        list: one dict per commit (oldest first) with commit, date, subject, words, delta (to the previous commit),
+            sections (heading label -> words in the subpart, see heading_label) and changes (heading label -> delta)
+    """
+    if cache is None:
+        cache = MemoryDetexCache()
+    directory, path = os.path.split(tex_filename)
+    revisions = list_revisions(rev_range, path, directory)
+    history: list[dict[str, Any]] = []
+    # counts of files that are the same in several commits (e.g., after a revert)
+    by_object: dict[str, tuple[int, dict[str, int]]] = {}
+    previous: dict[str, int] = {}
+    previous_words = 0
+    misses = cache.misses
+    with GitFileReader(directory) as reader:
+        for commit, date, subject in revisions:
+            blob = reader.read(commit, path)
+            if blob is None:
+                # the file was deleted in this commit
+                words, sections = 0, {}
+            elif blob[0] in by_object:
+                words, sections = by_object[blob[0]]
+            else:
+                # line breaks are translated as when the file is read with open
+                source = ((line, path, i) for i, line in enumerate(io.StringIO(blob[1].decode('utf-8'), newline=None), 1))
+                lines = [line for line, _, _ in preprocess_lines(source, ignore_via_tc_ignore)]
+                heading_name, heading_level, level, linenum = get_headings_in_list(lines)
+                counts = count_words_in_sections(get_sections_in_list(lines, linenum), cache=cache, backend=backend)
+                count_dict = get_count_dict(heading_name, heading_level, cumulate_counts(counts, level))
+                words, sections = sum(counts), {heading_label(key): count for key, count in count_dict.items()}
+                by_object[blob[0]] = (words, sections)
+            changes = {k: sections.get(k, 0) - previous.get(k, 0) for k in list(sections) + [k for k in previous if k not in sections]
+                       if sections.get(k, 0) != previous.get(k, 0)}
+            history.append({'commit': commit, 'date': date, 'subject': subject, 'words': words, 'delta': words - previous_words,
+                            'sections': sections, 'changes': changes})
+            previous, previous_words = sections, words
+
+    if verbose:
+        print_history(history)
+        print('\n%d commits, %d sections detexed' % (len(history), cache.misses - misses))
+    return history
+
+def print_history(history: list[dict[str, Any]]) -> None:
+    """prints the total word count and its change for each commit of count_words_history"""
+    print('\n  **word count history**\n')
+    print('%-10s %-25s %8s %8s  %s' % ('commit', 'date', 'words', 'delta', 'subject'))
+    for h in history:
+        print('%-10s %-25s %8d %+8d  %s' % (h['commit'][:10], h['date'], h['words'], h['delta'], h['subject']))
+
+def write_history(filename: str, history: list[dict[str, Any]]) -> None:
+    """writes the history to a json file (if filename ends with .json) or to a csv file with one row per commit and one column per heading
+
+    Args:
+        filename (str): path to the output file
+        history (list): result of count_words_history
+    """
+    if filename.lower().endswith('.json'):
+        with open(filename, 'w', encoding="utf-8") as f:
+            json.dump(history, f, indent=2, ensure_ascii=False)
+        return
+    headings: dict[str, None] = {}
+    for h in history:
+        headings.update(dict.fromkeys(h['sections']))
+    with open(filename, 'w', encoding="utf-8", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['commit', 'date', 'subject', 'words', 'delta'] + list(headings))
+        for h in history:
+            writer.writerow([h['commit'], h['date'], h['subject'], h['words'], h['delta']] + [h['sections'].get(k, '') for k in headings])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "counts the words of each section of a tex file in every commit that changed it",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tex_filename', type = str, help = 'path to the latex file inside a git repository')
+    parser.add_argument('rev_range', type = str, nargs = '?', default = 'HEAD', help = 'revisions as understood by git log (e.g., v1.0..HEAD). Default HEAD.')
+    parser.add_argument('-i', '--ignore_via_tc_ignore', type = bool, default = False, help='whether to ignore lines between "%TC:ignore" and "%TC:endignore".')
+    parser.add_argument('--backend', type = str, default = 'regex', choices = ['regex', 'tokenizer'], help = 'detex with the regex rules or with a single pass tokenizer (handles nested arguments). Default regex.')
+    parser.add_argument('-o', '--out_filename', type = str, default = None, help = 'path to the timeline (.csv or .json)')
+    args = parser.parse_args()
+
+    history = count_words_history(args.tex_filename, args.rev_range, ignore_via_tc_ignore=args.ignore_via_tc_ignore, backend=args.backend)
+    if args.out_filename:
+        write_history(args.out_filename, history)
+        print('timeline written to %s' % args.out_filename)
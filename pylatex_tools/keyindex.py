@@ -0,0 +1,175 @@
+# %%
+import weakref
+
+from itertools import chain
+from collections import Counter
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    from pybtex.database import BibliographyData # type: ignore
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Levenshtein distance (insertions, deletions and substitutions) of two strings
+
+    Args:
+        a (str): first string
+        b (str): second string
+        max_distance (int, optional): the computation stops as soon as the distance is known to be larger. Defaults to None.
+
+    Returns:
+        int: distance, max_distance + 1 if it is larger than max_distance
+    """
+    # common prefix and suffix do not change the distance
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if len(a) < len(b):
+        a, b = b, a
+    bound = max_distance if max_distance is not None else len(a)
+    if len(a) - len(b) > bound:
+        return bound + 1
+    if not b:
+        return len(a)
+    # only the cells within bound of the diagonal can lead to a distance within bound (Ukkonen's band)
+    outside = bound + 1
+    previous = [j if j <= bound else outside for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        low, high = max(1, i - bound), min(len(b), i + bound)
+        current = [outside] * (len(b) + 1)
+        if low == 1:
+            current[0] = i if i <= bound else outside
+        row_min = current[0]
+        for j in range(low, high + 1):
+            d = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+            current[j] = d
+            if d < row_min:
+                row_min = d
+        if row_min > bound:
+            return outside
+        previous = current
+    return min(previous[-1], outside)
+
+class KeyIndex:
+    """q-gram index of the keys of a bibliography to suggest the closest keys for keys that are not in the bibliography
+
+        Built once per bibliography in a single pass over the keys. A key within edit distance d of the searched key
+        shares at least length + q - 1 - q * d q-grams with it (count filter), so it contains one of the rarest
+        q-grams of the searched key (prefix filter). Only the keys in the lists of the rarer q-grams are counted, and
+        only those with enough shared q-grams are compared with the searched key, instead of all keys. The
+        distance is increased step by step until enough keys are found. Keys are compared in lower case (as bibtex does).
+
+    Args:
+        keys (iterable): citation keys (e.g., bib_dict.entries.keys())
+        q (int, optional): length of the q-grams. Defaults to 3.
+    """
+
+    def __init__(self, keys: Iterable[str], q: int = 3):
+        self.q = q
+        self.keys: list[str] = []
+        self._lower: list[str] = []
+        self._index: dict[str, int] = {}
+        self._postings: dict[str, list[int]] = {}
+        for key in keys:
+            lower = key.lower()
+            if lower in self._index:
+                continue
+            i = len(self.keys)
+            self._index[lower] = i
+            self.keys.append(key)
+            self._lower.append(lower)
+            for gram in self._grams(lower):
+                if gram in self._postings:
+                    self._postings[gram].append(i)
+                else:
+                    self._postings[gram] = [i]
+
+    def _grams(self, lower: str) -> list[str]:
+        # padded q-grams, a repeated q-gram is numbered so that the q-grams of a key are a set
+        padded = '\0' * (self.q - 1) + lower + '\0' * (self.q - 1)
+        grams = [padded[i:i + self.q] for i in range(len(padded) - self.q + 1)]
+        if len(set(grams)) < len(grams):
+            seen: dict[str, int] = {}
+            for i, gram in enumerate(grams):
+                seen[gram] = seen.get(gram, 0) + 1
+                if seen[gram] > 1:
+                    grams[i] = '%s%d' % (gram, seen[gram])
+        return grams
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key.lower() in self._index
+
+    def suggest(self, key: str, k: int = 3, max_distance: Optional[int] = None) -> list[tuple[str, int]]:
+        """returns the closest keys of a key
+
+        Args:
+            key (str): key that is not (or is) in the bibliography
+            k (int, optional): maximum number of suggestions. Defaults to 3.
+            max_distance (int, optional): maximum edit distance of a suggestion. Defaults to None (2, 3 for keys with 24 or more characters).
+
+        Returns:
+            list: tuples (key, edit distance), closest first (then in the order of the bibliography), the key itself is not suggested
+        """
+        lower = key.lower()
+        if max_distance is None:
+            max_distance = 2 if len(lower) < 24 else 3
+        grams = sorted(self._grams(lower), key=lambda g: len(self._postings.get(g, ())))
+        needed = len(lower) + self.q - 1 - self.q * max_distance
+        if needed > 0:
+            # the rarest q-grams have to be counted (prefix filter), the q-grams of more than 5% of the keys only if
+            # they are among them. the more q-grams are counted, the fewer keys pass the count filter
+            rarest = max(len(grams) - needed + 1, len([g for g in grams if len(self._postings.get(g, ())) <= len(self.keys) // 20]))
+            shared = Counter(chain.from_iterable(self._postings.get(g, ()) for g in grams[:rarest]))
+            shared.pop(self._index.get(lower, -1), None)
+        found: dict[int, int] = {}
+        compared: set[int] = set()
+        for distance in range(1, max_distance + 1):
+            if needed > 0:
+                # each of the other q-grams adds at most one shared q-gram
+                minimum = len(lower) + self.q - 1 - self.q * distance - (len(grams) - rarest)
+                candidates = [i for i, n in shared.items() if n >= minimum and i not in compared]
+            else:
+                # too short for the count filter, all keys of a similar length are compared
+                candidates = [i for i, other in enumerate(self._lower) if abs(len(other) - len(lower)) <= distance and i not in compared and other != lower]
+            for i in candidates:
+                compared.add(i)
+                d = edit_distance(lower, self._lower[i], max_distance)
+                if d <= max_distance:
+                    found[i] = d
+            if len([d for d in found.values() if d <= distance]) >= k:
+                break
+        return [(self.keys[i], d) for i, d in sorted(found.items(), key=lambda x: (x[1], x[0]))[:k]]
+
+    def suggest_all(self, keys: Iterable[str], k: int = 3, max_distance: Optional[int] = None) -> dict[str, list[str]]:
+        """returns key -> closest keys (see suggest) for each of the keys that is not in the index"""
+        return {key: [s for s, _ in self.suggest(key, k, max_distance)] for key in dict.fromkeys(keys) if key not in self}
+
+    def __repr__(self) -> str:
+        return 'KeyIndex(%d keys, %d %d-grams)' % (len(self.keys), len(self._postings), self.q)
+
+_key_indexes: dict[int, tuple[weakref.ref, KeyIndex]] = {}
+
+def get_key_index(bib_dict: 'BibliographyData') -> KeyIndex:
+    """returns the (cached) KeyIndex of the keys of a bibliography, built once per bibliography object"""
+    # bibliography objects cannot be hashed, the index is dropped when the bibliography is garbage collected
+    cached = _key_indexes.get(id(bib_dict))
+    if cached is None or cached[0]() is not bib_dict:
+        for key in [k for k, (ref, _) in _key_indexes.items() if ref() is None]:
+            del _key_indexes[key]
+        cached = (weakref.ref(bib_dict), KeyIndex(bib_dict.entries.keys()))
+        _key_indexes[id(bib_dict)] = cached
+    return cached[1]
+
+def format_suggestions(suggestions: list[str]) -> str:
+    """e.g., ' (did you mean "einstein_1935_can"?)', '' if there are no suggestions"""
+    if not suggestions:
+        return ''
+    return ' (did you mean %s?)' % ' or '.join('"%s"' % s for s in suggestions)
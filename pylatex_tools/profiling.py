@@ -0,0 +1,138 @@
+# %%
+import json
+import time
+import functools
+import threading
+import contextlib
+
+from typing import Any, Callable, Iterator, Optional
+
+# the active profiler, None if nothing is profiled (see Profiler.start)
+_profiler: Optional['Profiler'] = None
+
+class Profiler:
+    """collects the time spent in each detex rule and stage and in other steps (file loading, comment stripping, bib parsing)
+
+        While a profiler is active (between start and stop, or in a with block), DetexEngine.detex and apply_regexps
+        record the wall time, the number of substitutions and the size of the text before and after each rule and
+        stage. Functions decorated with profiled record their wall time. Entries with the same category and name are
+        summed up.
+
+        with pl.Profiler() as profiler:
+            pl.count_words('main.tex')
+        print(profiler.report())
+    """
+
+    def __init__(self):
+        self.entries: dict[tuple[str, str], dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, category: str, name: str, seconds: float, substitutions: int = 0, size_in: int = 0, size_out: int = 0) -> None:
+        """adds a measurement
+
+        Args:
+            category (str): e.g., 'detex stage', 'detex rule', 'load', 'preprocess', 'bib'
+            name (str): name of the stage, rule or function
+            seconds (float): wall time
+            substitutions (int, optional): number of substitutions of a rule. Defaults to 0.
+            size_in (int, optional): number of characters before the rule or stage. Defaults to 0.
+            size_out (int, optional): number of characters after the rule or stage. Defaults to 0.
+        """
+        with self._lock:
+            entry = self.entries.get((category, name))
+            if entry is None:
+                entry = self.entries[(category, name)] = {'category': category, 'name': name, 'calls': 0, 'seconds': 0.0,
+                                                          'substitutions': 0, 'size_in': 0, 'size_out': 0}
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['substitutions'] += substitutions
+            entry['size_in'] += size_in
+            entry['size_out'] += size_out
+
+    @contextlib.contextmanager
+    def timer(self, category: str, name: str) -> Iterator[None]:
+        """measures the wall time of a with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, time.perf_counter() - start)
+
+    def ranked(self, category: Optional[str] = None) -> list[dict[str, Any]]:
+        """returns the entries (of a category) sorted by their time, slowest first"""
+        with self._lock:
+            entries = [dict(e) for e in self.entries.values() if category is None or e['category'] == category]
+        return sorted(entries, key=lambda e: e['seconds'], reverse=True)
+
+    def report(self, top: Optional[int] = 20) -> str:
+        """returns a table of the slowest entries of each category
+
+        Args:
+            top (int, optional): maximum number of entries per category. Defaults to 20.
+
+        Returns:
+            str: table
+        """
+        lines = []
+        categories = list(dict.fromkeys(e['category'] for e in self.ranked()))
+        for category in categories:
+            entries = self.ranked(category)
+            total = sum(e['seconds'] for e in entries)
+            lines.append('\n  **%s (%.1f ms in total)**\n' % (category, 1000 * total))
+            lines.append('  %10s %7s %7s %8s %12s %12s  %s' % ('time [ms]', 'share', 'calls', 'subst.', 'size in', 'size out', 'name'))
+            for e in entries[:top]:
+                name = e['name'] if len(e['name']) <= 70 else e['name'][:67] + '...'
+                lines.append('  %10.2f %6.1f%% %7d %8d %12d %12d  %s' % (1000 * e['seconds'], 100 * e['seconds'] / total if total else 0,
+                                                                        e['calls'], e['substitutions'], e['size_in'], e['size_out'], name))
+            if top is not None and len(entries) > top:
+                lines.append('  ... %d more' % (len(entries) - top))
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> str:
+        """returns all entries, sorted by their time, as json"""
+        return json.dumps(self.ranked(), indent=2)
+
+    def start(self) -> 'Profiler':
+        """makes this the active profiler"""
+        global _profiler
+        _profiler = self
+        return self
+
+    def stop(self) -> None:
+        """stops profiling"""
+        global _profiler
+        if _profiler is self:
+            _profiler = None
+
+    def __enter__(self) -> 'Profiler':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+def get_profiler() -> Optional[Profiler]:
+    """returns the active profiler, None if nothing is profiled"""
+    return _profiler
+
+def profiled(category: str, name: Optional[str] = None) -> Callable:
+    """decorator that records the wall time of each call of a function in the active profiler
+
+    Args:
+        category (str): category of the measurement (e.g., 'load')
+        name (str, optional): name of the measurement. Defaults to the name of the function.
+    """
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.record(category, label, time.perf_counter() - start)
+        return wrapper
+    return decorator
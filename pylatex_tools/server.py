@@ -0,0 +1,310 @@
+# %%
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Optional, TextIO, Union
+
+from pybtex.database import BibliographyData # type: ignore
+
+if __name__ == '__main__' and not __package__:
+    # run as a script (e.g., python pylatex_tools/count_words.py), the package has to be importable
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from pylatex_tools.detex import detex, get_default_engine
+from pylatex_tools.texhelpers import iter_file_lines, preprocess_lines, read_bib_file
+from pylatex_tools.texproject import TexProject
+from pylatex_tools.detex_cache import MemoryDetexCache
+from pylatex_tools.bibindex import BibliographyIndex
+from pylatex_tools.count_words import count_words_in_list
+from pylatex_tools.count_citations import count_citations_in_list
+from pylatex_tools.document import Document
+from pylatex_tools.bibstore import BibStore
+from pylatex_tools.archive import file_state
+
+server_operations = ['detex', 'count_words', 'count_citations', 'create_new_bibliography']
+# params that are paths to files, they are confined to the root directory of the server
+path_params = ['filename', 'bibliography', 'output_file']
+
+class Server:
+    """answers requests for detex, count_words, count_citations and create_new_bibliography
+
+        A request is a dict {"id": ..., "operation": ..., "params": {...}}, the response is a dict {"id": ..., "result": {...}}
+        or {"id": ..., "error": "..."}. The tex document is given as "filename" or as "text" (e.g., an unsaved editor buffer),
+        the other params have the same names as the arguments of the library functions. Detexed sections and parsed
+        bibliographies are kept in memory between requests, a bibliography is parsed again when its file changes.
+        "bibliography" can be a list of bib files, which are merged (see BibStore), the keys that are cited and defined
+        with different entries in several of them are returned as "conflicts".
+        If a root directory is given, relative paths in the params are relative to it and paths outside of it are
+        rejected (the files that are read, including the files reached via follow_includes, and the output_file that is written).
+        handle can be called from several threads at once.
+
+    Args:
+        use_cache (bool, optional): whether to use the on-disk cache of parsed bib files when a bibliography is loaded. Defaults to True.
+        root (str, optional): directory that contains all files of the requests. Defaults to None (any path).
+    """
+
+    def __init__(self, use_cache: bool = True, root: Optional[str] = None):
+        self.use_cache = use_cache
+        self.root = os.path.realpath(root) if root is not None else None
+        self.cache = MemoryDetexCache()
+        self._bibliographies: dict[tuple[str, ...], tuple[tuple[tuple[int, int], ...], BibliographyData, Optional[BibliographyIndex], Optional[dict[str, list[str]]]]] = {}
+        self._bib_locks: dict[tuple[str, ...], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._handlers = {'detex': self._detex, 'count_words': self._count_words,
+                          'count_citations': self._count_citations, 'create_new_bibliography': self._create_new_bibliography}
+        # compile the detex rules before the first request
+        get_default_engine()
+
+    def get_bibliography(self, bib_filename: Union[str, list[str]], with_index: bool = False) -> tuple[BibliographyData, Optional[BibliographyIndex]]:
+        """returns the parsed bibliography (and its index), parses the files only if one of them changed since the last request"""
+        paths = tuple(os.path.abspath(f) for f in ([bib_filename] if isinstance(bib_filename, str) else bib_filename))
+        with self._lock:
+            lock = self._bib_locks.setdefault(paths, threading.Lock())
+        with lock:
+            state = tuple(map(file_state, paths))
+            cached = self._bibliographies.get(paths)
+            if cached is None or cached[0] != state:
+                if len(paths) == 1:
+                    cached = (state, read_bib_file(paths[0], self.use_cache, verbose=False), None, None)
+                else:
+                    store = BibStore(list(paths), self.use_cache, verbose=False)
+                    cached = (state, store.get_bibliography(), None, store.conflicts())
+                    store.close()
+            if with_index and cached[2] is None:
+                cached = (cached[0], cached[1], BibliographyIndex(cached[1]), cached[3])
+            self._bibliographies[paths] = cached
+            return cached[1], cached[2]
+
+    def _conflicts(self, bib_filename: Union[str, list[str]], keys: list[str]) -> Optional[dict[str, list[str]]]:
+        # conflicts of the cited keys, None for a single bib file
+        paths = tuple(os.path.abspath(f) for f in ([bib_filename] if isinstance(bib_filename, str) else bib_filename))
+        conflicts = self._bibliographies[paths][3]
+        if conflicts is None:
+            return None
+        cited = {k.lower() for k in keys}
+        return {k: files for k, files in conflicts.items() if k.lower() in cited}
+
+    def _path(self, filename: str) -> str:
+        # resolves a path of a request relative to the root directory, symbolic links and .. must not leave it
+        if self.root is None:
+            return filename
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if os.path.commonpath([os.path.normcase(self.root), os.path.normcase(path)]) != os.path.normcase(self.root):
+            raise PermissionError('%s is outside of the root directory %s' % (filename, self.root))
+        return path
+
+    def _confine(self, params: dict[str, Any]) -> dict[str, Any]:
+        params = dict(params)
+        for name in path_params:
+            value = params.get(name)
+            if isinstance(value, str):
+                params[name] = self._path(value)
+            elif isinstance(value, list):
+                params[name] = [self._path(v) for v in value]
+        return params
+
+    def _lines(self, params: dict[str, Any], strip_comments: bool = True) -> list[str]:
+        if 'text' in params:
+            source = ((line, '', i) for i, line in enumerate(params['text'].splitlines(keepends=True), 1))
+        elif params.get('follow_includes'):
+            source = TexProject(params['filename'], check_path=self._path).iter_lines()
+        else:
+            source = iter_file_lines(params['filename'])
+        return [line for line, _, _ in preprocess_lines(source, params.get('ignore_via_tc_ignore', False), strip_comments, strip_comments)]
+
+    def _detex(self, params: dict[str, Any]) -> dict[str, Any]:
+        tex_string = ''.join(self._lines(params, strip_comments=False))
+        key = self.cache.key(tex_string, get_default_engine().fingerprint)
+        entry = self.cache.get(key)
+        if entry is None:
+            detex_string = detex(tex_string)
+            entry = (detex_string, len(detex_string.split()))
+            self.cache.put(key, *entry)
+        return {'text': entry[0], 'words': entry[1]}
+
+    def _count_words(self, params: dict[str, Any]) -> dict[str, Any]:
+        lines = self._lines(params)
+        heading_name, heading_level, counts, counts_cum = count_words_in_list(lines, single_pass=params.get('single_pass', False), cache=self.cache, verbose=False)
+        return {'headings': [{'level': h, 'name': heading_name[i], 'count': counts[i], 'count_cum': counts_cum[i]} for i, h in enumerate(heading_level)],
+                'words_in_sections': sum([x for i, x in enumerate(counts_cum) if heading_level[i] == 'section'])}
+
+    def _count_citations(self, params: dict[str, Any]) -> dict[str, Any]:
+        lines = self._lines(params)
+        patterns = params.get('pattern_match_in_bibliography')
+        bib_dict, bib_index = None, None
+        if params.get('bibliography'):
+            bib_dict, bib_index = self.get_bibliography(params['bibliography'], with_index=bool(patterns))
+        elif patterns:
+            raise ValueError('bibliography is required for pattern_match_in_bibliography')
+        result = count_citations_in_list(lines, params.get('citation_keys'), patterns, bib_dict, bib_index)
+        if params.get('bibliography'):
+            conflicts = self._conflicts(params['bibliography'], list(result['counts']))
+            if conflicts is not None:
+                result['conflicts'] = conflicts
+        # json object keys have to be strings
+        result['occurences'] = {str(k): v for k, v in result['occurences'].items()}
+        return result
+
+    def _create_new_bibliography(self, params: dict[str, Any]) -> dict[str, Any]:
+        for name in ['filename', 'bibliography', 'output_file']:
+            if name not in params:
+                raise ValueError('create_new_bibliography needs a "%s"' % name)
+        bib_dict, _ = self.get_bibliography(params['bibliography'])
+        document = Document(params['filename'], follow_includes=params.get('follow_includes', False), check_path=self._path)
+        result = document.create_new_bibliography(params['bibliography'], params['output_file'], params.get('remove_fields', []), bib_dict=bib_dict, verbose=False)
+        conflicts = self._conflicts(params['bibliography'], document.cite_keys)
+        if conflicts is not None:
+            result['conflicts'] = conflicts
+        return result
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        """answers a single request, errors are returned in the response
+
+        Args:
+            request (dict): {"id": ..., "operation": ..., "params": {...}}
+
+        Returns:
+            dict: {"id": ..., "result": ..., "seconds": ...} or {"id": ..., "error": ...}
+        """
+        start = time.perf_counter()
+        response: dict[str, Any] = {'id': request.get('id') if isinstance(request, dict) else None}
+        try:
+            operation = request.get('operation')
+            if operation not in self._handlers:
+                raise ValueError('unknown operation %r (supported: %s)' % (operation, ', '.join(server_operations)))
+            params = request.get('params', {})
+            if 'filename' not in params and 'text' not in params:
+                raise ValueError('params need a "filename" or a "text"')
+            response['result'] = self._handlers[operation](self._confine(params))
+        except Exception as e:
+            response['error'] = '%s: %s' % (type(e).__name__, e)
+            traceback.print_exc(file=sys.stderr)
+        response['seconds'] = round(time.perf_counter() - start, 4)
+        return response
+
+def serve_stdio(server: Server, max_workers: int = 4, stdin: TextIO = sys.stdin, stdout: TextIO = sys.stdout) -> None:
+    """reads one json request per line from stdin and writes one json response per line to stdout
+
+        The requests are answered concurrently, so the responses can be in a different order than the requests
+        (use the "id" of the requests to match them). Runs until stdin is closed. Everything else that is printed
+        while the server is running goes to stderr.
+    """
+    write_lock = threading.Lock()
+
+    def answer(line: str) -> None:
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response: dict[str, Any] = {'id': None, 'error': 'invalid json: %s' % e}
+        else:
+            response = server.handle(request)
+        with write_lock:
+            stdout.write(json.dumps(response, ensure_ascii=False) + '\n')
+            stdout.flush()
+
+    real_stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for line in stdin:
+                if line.strip():
+                    executor.submit(answer, line)
+    finally:
+        sys.stdout = real_stdout
+
+class _PooledHTTPServer(HTTPServer):
+    # answers the http requests in a thread pool instead of a new thread per request
+    def __init__(self, address: tuple[str, int], handler: type, server: Server, max_workers: int):
+        super().__init__(address, handler)
+        self.server_obj = server
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Host headers of requests that are answered, other hosts (e.g., a web page via dns rebinding) are rejected
+        port = self.server_address[1]
+        self.allowed_hosts = {'%s:%d' % (name, port) for name in ['localhost', '127.0.0.1', address[0].lower()]}
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.headers.get('Host', '').lower() not in self.server.allowed_hosts:
+            return self._respond({'id': None, 'error': 'host %r is not allowed' % self.headers.get('Host')}, 403)
+        # a web page can only send json after a (cors) preflight request, which is not answered
+        if self.headers.get_content_type() != 'application/json':
+            return self._respond({'id': None, 'error': 'Content-Type has to be application/json'}, 415)
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError as e:
+            response: dict[str, Any] = {'id': None, 'error': 'invalid json: %s' % e}
+        else:
+            response = self.server.server_obj.handle(request)
+        self._respond(response, 200 if 'error' not in response else 400)
+
+    def _respond(self, response: dict[str, Any], status: int) -> None:
+        body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        sys.stderr.write('%s - %s\n' % (self.address_string(), format % args))
+
+def serve_http(server: Server, host: str = '127.0.0.1', port: int = 8765, max_workers: int = 4) -> None:
+    """answers json requests (see Server.handle) sent via POST to http://host:port/, runs until interrupted (ctrl+c)
+
+        Only requests with Content-Type application/json and a Host header localhost:port, 127.0.0.1:port or host:port
+        are answered, so a web page that is open in a browser cannot send requests.
+    """
+    httpd = _PooledHTTPServer((host, port), _RequestHandler, server, max_workers)
+    print('serving on http://%s:%d/ (ctrl+c to stop)%s' % (host, httpd.server_address[1], ', files in %s' % server.root if server.root else ''), file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+def serve(port: Optional[int] = None, host: str = '127.0.0.1', max_workers: int = 4, use_cache: bool = True, root: Optional[str] = None) -> None:
+    """runs the server, on stdin/stdout if no port is given, otherwise via http (see Server)
+
+        The files of the requests have to be in the root directory (see Server), for http by default in the current directory.
+    """
+    if root is None and port is not None:
+        root = os.getcwd()
+    server = Server(use_cache, root)
+    if port is None:
+        serve_stdio(server, max_workers)
+    else:
+        serve_http(server, host, port, max_workers)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "answers json requests for detex, count_words, count_citations and create_new_bibliography\nreads one request per line from stdin (or via http if --port is given)",
+                formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-p', '--port', type = int, default = None, help = 'port of the http server. Default: None (stdin/stdout).')
+    parser.add_argument('--host', type = str, default = '127.0.0.1', help = 'host of the http server. Default: 127.0.0.1.')
+    parser.add_argument('-j', '--jobs', type = int, default = 4, help = 'number of threads that answer requests. Default: 4.')
+    parser.add_argument('-r', '--root', type = str, default = None, help = 'directory that contains all files of the requests (relative paths are relative to it). Default: None (the current directory for http, any path for stdin/stdout).')
+    args = parser.parse_args()
+
+    serve(args.port, args.host, args.jobs, root=args.root)
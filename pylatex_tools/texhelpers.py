@@ -1,33 +1,161 @@
 # %%
+import os
 import re
+import bisect
 
-from pybtex.database import parse_file # type: ignore
-from pybtex.database import BibliographyData # type: ignore
+from array import array
+from typing import TYPE_CHECKING, Iterable, Iterator
 
+from pylatex_tools.citations import cite_commands, find_citations
+from pylatex_tools.profiling import profiled
+from pylatex_tools.archive import is_file, open_text, resolve_path
+
+if TYPE_CHECKING:
+    from pybtex.database import BibliographyData # type: ignore
+
+# a % preceded by an even number of backslashes starts a comment (\% is a percent sign, \\% a line break and a comment)
+comment_regexp = re.compile(r'(?<!\\)(?:\\\\)*%')
+# \bibliography{a,b} (bibtex, without .bib) and \addbibresource[options]{a.bib} (biblatex)
+bibliography_regexp = re.compile(r'\\(bibliography|addbibresource|addglobalbib|addsectionbib)\s*(?:\[[^\]]*\])?\s*\{([^{}]+)\}')
+
+@profiled('load')
 def load_file_as_list(filename: str) -> list[str]:
-    textfile = open(filename, 'r', encoding="utf8")
+    # filename can be in a zip archive (e.g., project.zip/main.tex or project.zip for its root document, see split_archive_path)
+    textfile = open_text(filename)
     lines = []
     for line in textfile:
         lines.append(line)
     textfile.close()
     return lines
 
+def iter_file_lines(filename: str) -> Iterator[tuple[str, str, int]]:
+    """reads a tex file lazily, line by line (also from a zip archive, see load_file_as_list)
+
+    Yields:
+        tuple (str, str, int): line, filename (the path to the root document for a zip archive), line number (starting at 1)
+    """
+    filename = resolve_path(filename)
+    with open_text(filename) as f:
+        for i, line in enumerate(f, 1):
+            yield line, filename, i
+
+def preprocess_lines(source: Iterable[tuple[str, str, int]], ignore_via_tc_ignore: bool = False, comment_environment: bool = True,
+                     comments: bool = True) -> Iterator[tuple[str, str, int]]:
+    """removes ignored lines and comments from the lines of a tex document in a single pass
+
+        Each line is handled as soon as it is read, so the source can be read lazily (see iter_file_lines and
+        TexProject.iter_lines). The filename and line number of each line are passed through, so the position of
+        anything found in the preprocessed lines can be traced back to the source.
+
+    Args:
+        source (iterable): tuples (line, filename, line number)
+        ignore_via_tc_ignore (bool, optional): whether to remove the lines between "%TC:ignore" and "%TC:endignore" (inclusive). Defaults to False.
+        comment_environment (bool, optional): whether to remove the lines between \\begin{comment} and \\end{comment} (inclusive). Defaults to True.
+        comments (bool, optional): whether to remove everything after a % (an escaped \\% is kept). Defaults to True.
+
+    Yields:
+        tuple (str, str, int): preprocessed line, filename, line number
+    """
+    in_tc_ignore = False
+    in_comment_block = False
+    for line, filename, linenum in source:
+        if ignore_via_tc_ignore:
+            ignored = in_tc_ignore or '%TC:ignore' in line
+            in_tc_ignore = ignored and '%TC:endignore' not in line
+            if ignored:
+                continue
+        if comment_environment:
+            if in_comment_block:
+                in_comment_block = '\\end{comment}' not in line
+                continue
+            if '\\begin{comment}' in line:
+                in_comment_block = True
+                continue
+        if comments and '%' in line:
+            m = comment_regexp.search(line)
+            if m is not None:
+                line = line[:m.end() - 1]
+        yield line, filename, linenum
+
+def _numbered(lines: Iterable[str]) -> Iterator[tuple[str, str, int]]:
+    return ((line, '', i) for i, line in enumerate(lines, 1))
+
+class LineMap:
+    """filename and line number of each preprocessed line, stored in arrays rather than one tuple per line
+
+    Attributes:
+        filenames (list): names of the source files
+    """
+
+    def __init__(self):
+        self.filenames: list[str] = []
+        self._file_index: dict[str, int] = {}
+        self._files = array('I')
+        self._line_numbers = array('I')
+        # character offset of each line in the joined preprocessed lines
+        self._offsets = array('Q')
+        self._length = 0
+
+    def append(self, filename: str, linenum: int, length: int) -> None:
+        """adds the next preprocessed line (length is its number of characters)"""
+        i = self._file_index.get(filename)
+        if i is None:
+            i = self._file_index[filename] = len(self.filenames)
+            self.filenames.append(filename)
+        self._files.append(i)
+        self._line_numbers.append(linenum)
+        self._offsets.append(self._length)
+        self._length += length
+
+    def __len__(self) -> int:
+        return len(self._line_numbers)
+
+    def __getitem__(self, index: int) -> tuple[str, int]:
+        """filename and line number (starting at 1) of the preprocessed line with the given index"""
+        return self.filenames[self._files[index]], self._line_numbers[index]
+
+    def locate(self, offset: int) -> tuple[str, int]:
+        """filename and line number of a character offset in the joined preprocessed lines (e.g., Citation.offset)
+
+            Comments are removed together with the line break, so the offset is more reliable than counting lines in the joined text.
+        """
+        return self[max(0, bisect.bisect_right(self._offsets, offset) - 1)]
+
+    def __repr__(self) -> str:
+        return 'LineMap(%d lines in %d files)' % (len(self), len(self.filenames))
+
+@profiled('preprocess')
+def load_preprocessed(filename: str, ignore_via_tc_ignore: bool = False, follow_includes: bool = False, strip_comments: bool = True) -> tuple[list[str], LineMap]:
+    """reads a tex file (and the files it includes) and preprocesses it in a single pass, see preprocess_lines
+
+    Args:
+        filename (str): path to the tex file
+        ignore_via_tc_ignore (bool, optional): whether to remove the lines between "%TC:ignore" and "%TC:endignore". Defaults to False.
+        follow_includes (bool, optional): whether to insert the files included via \\input, \\include, \\subfile or \\import (see TexProject). Defaults to False.
+        strip_comments (bool, optional): whether to remove comments and comment environments. Defaults to True.
+
+    Returns:
+        tuple (list, LineMap): preprocessed lines and the filename and line number of each of them in the source
+    """
+    if follow_includes:
+        # texproject reads the files with load_file_as_list
+        from pylatex_tools.texproject import TexProject
+        source = TexProject(filename).iter_lines()
+    else:
+        source = iter_file_lines(filename)
+    lines = []
+    line_map = LineMap()
+    for line, name, linenum in preprocess_lines(source, ignore_via_tc_ignore, strip_comments, strip_comments):
+        lines.append(line)
+        line_map.append(name, linenum, len(line))
+    return lines, line_map
+
 def strip_comment_environment(tex_lines: list[str]) -> list[str]:
     """removes lines between \\begin{comment} and \\end{comment} (inclusive)"""
-    new_lines: list[str] = []
-    in_comment_block = False
-    for line in tex_lines:
-        if not in_comment_block and '\\begin{comment}' in line:
-            in_comment_block = True
-            continue
-        if in_comment_block:
-            if '\\end{comment}' in line:
-                in_comment_block = False
-            continue
-        new_lines.append(line)
-    return new_lines
+    return [line for line, _, _ in preprocess_lines(_numbered(tex_lines), comments=False)]
 
 
+@profiled('preprocess')
 def strip_comments_in_tex(tex_lines: list[str]) -> list[str]:
     """strips comments (%) from list of tex lines
 
@@ -35,15 +163,11 @@ def strip_comments_in_tex(tex_lines: list[str]) -> list[str]:
         tex_lines (list): list of strings with tex code
 
     Returns:
-        list: same list where everything after a % is removed
+        list: new list where everything after an unescaped % and comment environments are removed (tex_lines is not changed)
     """
-    tex_lines = strip_comment_environment(tex_lines)
-    for i, line in enumerate(tex_lines):
-        p = line.find('%')
-        if p >= 0:
-            tex_lines[i] = line[:p]
-    return tex_lines
+    return [line for line, _, _ in preprocess_lines(_numbered(tex_lines))]
 
+@profiled('preprocess')
 def strip_tc_ignore(lines: list[str]) -> list[str]:
     """removes lines that are between lines "%TC:ignore" and %TC:endignore"
     
@@ -53,68 +177,81 @@ def strip_tc_ignore(lines: list[str]) -> list[str]:
     Returns:
         list: list of lines with ignored lines removed
     """
-    new_lines = []
-    ignore_next_line = False
-    for l in lines:
-        p = l.find('%TC:ignore')
-        if p >=0:
-            ignore_next_line = True
-
-        if not ignore_next_line:
-            new_lines.append(l)
-
-        p = l.find('%TC:endignore')
-        if p >=0:
-            ignore_next_line = False                  
-    
-    return new_lines
+    return [line for line, _, _ in preprocess_lines(_numbered(lines), ignore_via_tc_ignore=True, comment_environment=False, comments=False)]
     
-def get_citations_in_tex(tex_lines: list[str], cite_commands:list[str] = ['autocite', 'cite'], unique_set: bool = True) -> list[str]: 
+@profiled('citations')
+def get_citations_in_tex(tex_lines: list[str], cite_commands: list[str] = cite_commands, unique_set: bool = True) -> list[str]: 
     """returns list of cite keys being used in a list of tex strings 
 
     Args:
         tex_string (list): list of strings with tex code
-        cite_commands (list, optional): keywords commands in the tex document. Defaults to ['autocite', 'cite'].
+        cite_commands (list, optional): keywords commands in the tex document. Defaults to the natbib and biblatex cite commands (see citations.cite_commands).
+        unique_set (bool, optional): whether to return each key only once (in the order of their first occurence). Defaults to True.
 
     Returns:
         list: list of citation keys (strings)
     """
-    cite_keys: list[str] = []
-    for line in tex_lines:
-        for cc in cite_commands:
-            # https://stackoverflow.com/questions/57064771/extract-cited-bibtex-keys-from-tex-file-using-regex-in-python
-            rx = re.compile(r'''(?<!\\)%.+|(\\(?:no)?''' + cc +  r'''?[\[\w|\.\-*\]]*?\{((?!\*)[^{}]+)\})''')
-            ck_str = [m.group(2) for m in rx.finditer(line) if m.group(2)]
-            if len(ck_str)>0:
-                for c in ck_str:
-                    c = c.split(',')
-                    cite_keys.extend(c)    
-    
-    for i,k in enumerate(cite_keys):
-        cite_keys[i] = cite_keys[i].strip()
+    cite_keys = [c.key for c in find_citations(tex_lines, cite_commands)]
     # unique set:
     if unique_set:
-        cite_keys = list(set(cite_keys))
+        cite_keys = list(dict.fromkeys(cite_keys))
 
     return cite_keys
 
 
-def read_bib_file(bib_filename: str) -> BibliographyData:
+def find_bib_files(tex_lines: list[str], main_filename: str) -> list[str]:
+    """returns the bib files of a tex document (\\bibliography, \\addbibresource, \\addglobalbib and \\addsectionbib), each only once
+
+    Args:
+        tex_lines (list): tex lines without comments
+        main_filename (str): path to the main tex file, the bib files are relative to its directory (also in a zip archive)
+
+    Returns:
+        list: paths to the bib files that exist, in the order of the commands
+    """
+    bib_files = []
+    directory = os.path.dirname(resolve_path(main_filename))
+    for m in bibliography_regexp.finditer(''.join(tex_lines)):
+        names = m.group(2).split(',') if m.group(1) == 'bibliography' else [m.group(2)]
+        for name in names:
+            name = name.strip()
+            if not name or '://' in name:
+                # remote resources (\addbibresource[location=remote]{https://...}) are not read
+                continue
+            path = os.path.normpath(os.path.join(directory, name))
+            if m.group(1) == 'bibliography' and not path.lower().endswith('.bib'):
+                path += '.bib'
+            if not is_file(path):
+                print('could not find bib file "%s" of %s' % (name, main_filename))
+            elif path not in bib_files:
+                bib_files.append(path)
+    return bib_files
+
+@profiled('bib')
+def read_bib_file(bib_filename: str, use_cache: bool = True, verbose: bool = True) -> 'BibliographyData':
     """ reads a bibtext bib file and returns the content as a BibliographyData object
 
     Args:
         bib_filename (string): path to bib file
+        use_cache (bool, optional): whether to use the cache of parsed bib files in ~/.cache/pylatex-tools (see bibcache). Defaults to True.
+        verbose (bool, optional): whether to print progress messages. Defaults to True.
 
     Returns:
         pybtex.database.BibliographyData: bibiliography object. (see https://docs.pybtex.org/api/parsing.html#pybtex.database.BibliographyData.to_file for docs)
     """
 
-    print('reading the bib file')
-    bib_data = parse_file(bib_filename)
+    # pybtex is only imported when a bib file is read
+    from pylatex_tools.bibcache import read_bib_file_cached, parse_bib_file
+
+    if verbose:
+        print('reading the bib file')
+    if use_cache:
+        return read_bib_file_cached(bib_filename, verbose=verbose)
+    bib_data = parse_bib_file(bib_filename)
     return bib_data
 
 
-def remove_fields_from_bibliography(bib_dict: BibliographyData, remove_fields: list[str] = []) -> BibliographyData:
+def remove_fields_from_bibliography(bib_dict: 'BibliographyData', remove_fields: list[str] = []) -> 'BibliographyData':
     """removes fields in a bibliography
 
     Args:
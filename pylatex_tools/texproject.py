@@ -0,0 +1,196 @@
+# %%
+import os
+import re
+
+from typing import Any, Callable, Iterator, Optional
+
+from pylatex_tools.texhelpers import load_file_as_list
+from pylatex_tools.archive import is_file, resolve_path
+from pylatex_tools.profiling import profiled
+
+# \input{file}, \include{file}, \subfile{file}
+include_regexp = re.compile(r'\\(input|include|subfile)\{([^{}]+)\}')
+# \import{dir}{file}, \subimport{dir}{file}, \inputfrom{dir}{file}, ...
+import_regexp = re.compile(r'\\(import|subimport|inputfrom|subinputfrom|includefrom|subincludefrom)\{([^{}]*)\}\{([^{}]+)\}')
+# everything after an unescaped % is a comment
+comment_regexp = re.compile(r'(?<!\\)%')
+
+class Inclusion:
+    """a single \\input, \\include, \\subfile or \\import command in a tex file
+
+    Args:
+        line (int): index of the line in the including file
+        start (int): position of the command in the line
+        end (int): position after the command in the line
+        command (str): name of the command (e.g., 'input')
+        filename (str): path to the included file, None if it could not be found
+    """
+
+    def __init__(self, line: int, start: int, end: int, command: str, filename: Optional[str]):
+        self.line = line
+        self.start = start
+        self.end = end
+        self.command = command
+        self.filename = filename
+
+class TexProject:
+    """a tex document that is split across several files
+
+        Starting at the main file, \\input, \\include, \\subfile and \\import (and their variants) are followed
+        recursively. Each file is read only once, even if it is included several times, and the files
+        included by one file are read concurrently.
+
+    Args:
+        main_filename (str): path to the main tex file, can be in a zip archive (e.g., project.zip/main.tex, or project.zip for its root document)
+        max_workers (int, optional): number of threads used to read the files. Defaults to 8.
+        check_path (callable, optional): called with the path of each included file before it is read, raises to reject it (e.g., a file outside of a directory). Defaults to None.
+
+    Attributes:
+        files (dict): filename -> list of lines
+        graph (dict): filename -> list of included filenames (dependency graph)
+        inclusions (dict): filename -> list of Inclusion objects
+    """
+
+    def __init__(self, main_filename: str, max_workers: int = 8, check_path: Optional[Callable[[str], Any]] = None):
+        self.main_filename = os.path.normpath(resolve_path(main_filename))
+        self.root_dir = os.path.dirname(self.main_filename)
+        self.max_workers = max_workers
+        self.check_path = check_path
+        self.files: dict[str, list[str]] = {}
+        self.graph: dict[str, list[str]] = {}
+        self.inclusions: dict[str, list[Inclusion]] = {}
+        self._base_dirs: dict[str, str] = {self.main_filename: self.root_dir}
+        self._load()
+
+    def _resolve(self, command: str, name: str, base_dir: str, current_dir: str, directory: str = '') -> tuple[Optional[str], str]:
+        # returns the path to the included file and the directory relative to which its own inclusions are resolved
+        name = name.strip()
+        if command.startswith('sub') and command != 'subfile':
+            base_dir = current_dir
+        if command in ['import', 'subimport', 'inputfrom', 'subinputfrom', 'includefrom', 'subincludefrom']:
+            base_dir = os.path.join(base_dir, directory.strip())
+            new_base_dir = base_dir
+        else:
+            new_base_dir = base_dir if command != 'subfile' else os.path.dirname(os.path.join(base_dir, name))
+        path = os.path.normpath(os.path.join(base_dir, name))
+        for candidate in [path + '.tex', path] if command in ['include', 'includefrom', 'subincludefrom'] else [path, path + '.tex']:
+            if is_file(candidate):
+                if self.check_path is not None:
+                    self.check_path(candidate)
+                return candidate, new_base_dir
+        return None, new_base_dir
+
+    def _scan(self, filename: str) -> tuple[list[str], list[Inclusion]]:
+        # reads a file and finds the inclusion commands outside of comments
+        lines = load_file_as_list(filename)
+        base_dir = self._base_dirs[filename]
+        current_dir = os.path.dirname(filename)
+        inclusions = []
+        for i, line in enumerate(lines):
+            if '\\' not in line:
+                continue
+            m = comment_regexp.search(line)
+            code = line[:m.start()] if m else line
+            found = []
+            for m in include_regexp.finditer(code):
+                target, new_base_dir = self._resolve(m.group(1), m.group(2), base_dir, current_dir)
+                found.append((m, target, new_base_dir))
+            for m in import_regexp.finditer(code):
+                target, new_base_dir = self._resolve(m.group(1), m.group(3), base_dir, current_dir, m.group(2))
+                found.append((m, target, new_base_dir))
+            for m, target, new_base_dir in sorted(found, key=lambda x: x[0].start()):
+                if target is None:
+                    print('could not find file included via "%s" in %s' % (m.group(0), filename))
+                else:
+                    self._base_dirs.setdefault(target, new_base_dir)
+                inclusions.append(Inclusion(i, m.start(), m.end(), m.group(1), target))
+        return lines, inclusions
+
+    def _load(self) -> None:
+        # breadth first search over the included files, reading each level concurrently
+        from concurrent.futures import ThreadPoolExecutor
+        pending = [self.main_filename]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending:
+                results = list(executor.map(self._scan, pending))
+                new_pending = []
+                for filename, (lines, inclusions) in zip(pending, results):
+                    self.files[filename] = lines
+                    self.inclusions[filename] = inclusions
+                    self.graph[filename] = []
+                    for inc in inclusions:
+                        if inc.filename is None:
+                            continue
+                        if inc.filename not in self.graph[filename]:
+                            self.graph[filename].append(inc.filename)
+                        if inc.filename not in self.files and inc.filename not in new_pending and inc.filename not in pending:
+                            new_pending.append(inc.filename)
+                pending = new_pending
+
+    def _body(self, filename: str, command: str) -> tuple[int, int]:
+        # subfiles are complete documents, only the part between \begin{document} and \end{document} is included
+        lines = self.files[filename]
+        if command != 'subfile':
+            return 0, len(lines)
+        start, end = 0, len(lines)
+        for i, line in enumerate(lines):
+            if '\\begin{document}' in line:
+                start = i + 1
+            elif '\\end{document}' in line:
+                end = i
+                break
+        return start, end
+
+    def iter_lines(self) -> Iterator[tuple[str, str, int]]:
+        """yields the lines of the whole document with the included files inserted in place of the inclusion commands
+
+        Yields:
+            tuple (str, str, int): line (or part of a line), filename, line number in that file (starting at 1)
+        """
+        yield from self._iter_file(self.main_filename, 'input', [])
+
+    def _iter_file(self, filename: str, command: str, stack: list[str]) -> Iterator[tuple[str, str, int]]:
+        lines = self.files[filename]
+        start, end = self._body(filename, command)
+        inclusions = [inc for inc in self.inclusions[filename] if start <= inc.line < end]
+        stack = stack + [filename]
+        k = 0
+        for i in range(start, end):
+            line = lines[i]
+            p = 0
+            while k < len(inclusions) and inclusions[k].line == i:
+                inc = inclusions[k]
+                k += 1
+                if inc.filename is None:
+                    continue
+                if inc.filename in stack:
+                    print('skipping circular inclusion of %s in %s' % (inc.filename, filename))
+                    continue
+                if inc.start > p:
+                    yield line[p:inc.start], filename, i + 1
+                yield from self._iter_file(inc.filename, inc.command, stack)
+                p = inc.end
+            if not p:
+                yield line, filename, i + 1
+            elif p < len(line):
+                yield line[p:], filename, i + 1
+
+    def lines(self) -> list[str]:
+        """returns the lines of the whole document, see iter_lines"""
+        return [line for line, _, _ in self.iter_lines()]
+
+    def source_map(self) -> list[tuple[str, int]]:
+        """returns the (filename, line number) of each line returned by lines()"""
+        return [(filename, linenum) for _, filename, linenum in self.iter_lines()]
+
+@profiled('load')
+def load_project_as_list(filename: str) -> list[str]:
+    """reads a tex document including all files it includes via \\input, \\include, \\subfile or \\import
+
+    Args:
+        filename (str): path to the main tex file
+
+    Returns:
+        list: list of lines of the whole document
+    """
+    return TexProject(filename).lines()
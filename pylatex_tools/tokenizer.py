@@ -0,0 +1,303 @@
+# %%
+import hashlib
+import unicodedata
+import regex # type: ignore
+
+from typing import Iterator, Optional
+
+from pylatex_tools.citations import cite_commands, multicite_commands
+from pylatex_tools.profiling import profiled
+
+# a tex document as a sequence of tokens: commands (\name, \name* or a control symbol like \%), curly and square
+# brackets, $, comments, the special characters ~ and &, and text
+_token_pattern = regex.compile(r'(?P<command>\\(?:[A-Za-z@]+\*?|[^A-Za-z@])?)|(?P<open>\{)|(?P<close>\})|(?P<open_bracket>\[)|'
+                               r'(?P<close_bracket>\])|(?P<math>\$)|(?P<comment>%[^\n]*)|(?P<special>[~&])|(?P<text>[^\\{}\[\]$%~&]+)')
+
+class Token:
+    """a single token of a tex document
+
+    Args:
+        kind (str): one of command, open, close, open_bracket, close_bracket, math, comment, special, text
+        value (str): text of the token (for commands without the backslash)
+        offset (int): character offset of the token in the document
+    """
+
+    def __init__(self, kind: str, value: str, offset: int):
+        self.kind = kind
+        self.value = value
+        self.offset = offset
+
+    def __repr__(self) -> str:
+        return 'Token(%r, %r, offset=%d)' % (self.kind, self.value, self.offset)
+
+def tokenize(text: str) -> Iterator[Token]:
+    """splits a tex document into tokens in a single pass
+
+    Args:
+        text (str): tex document
+
+    Returns:
+        iterator: tokens
+    """
+    for m in _token_pattern.finditer(text):
+        kind = m.lastgroup
+        yield Token(kind, m.group()[1:] if kind == 'command' else m.group(), m.start())
+
+# what happens to a command and its arguments: (action, number of mandatory arguments)
+#   reduce: replaced by the content of its last argument, e.g., \emph{text} -> text
+#   section: highlighted as a heading, e.g., \section{Introduction} -> #--Introduction--#
+#   bracket: content in square brackets, e.g., \cite{key} -> [key]
+#   remove: replaced by a single space together with its arguments, e.g., \footnote{text} ->
+#   environment: \begin and \end, removed together with the name of the environment and its arguments
+#   accent: combined with the following letter, e.g., \'{e} -> é
+# optional arguments ([...]) directly after the command or between its arguments are removed. Other commands are
+# removed, the content of curly brackets following them is kept.
+command_actions: dict[str, tuple[str, int]] = {}
+command_actions.update({c: ('reduce', 1) for c in ['emph', 'textbf', 'textit', 'text', 'textsc', 'texttt', 'textsf', 'textrm', 'underline',
+                                                   'mbox', 'IEEEauthorblockA', 'IEEEauthorblockN', 'author', 'caption', 'thanks']})
+command_actions.update({'multicolumn': ('reduce', 3), 'href': ('reduce', 2)})
+command_actions.update({c: ('section', 1) for c in ['part', 'chapter', 'section', 'subsection', 'subsubsection', 'paragraph']})
+command_actions.update({c: ('bracket', 1) for c in ['title', 'ref', 'eqref', 'pageref', 'autoref', 'cref', 'Cref'] + cite_commands + multicite_commands})
+command_actions.update({c: ('remove', 0) for c in ['maketitle', 'centering', 'IEEEpeerreviewmaketitle', 'big', 'right', 'left', 'noindent',
+                                                   'newpage', 'clearpage', 'tableofcontents', 'listoffigures', 'listoftables', 'printbibliography']})
+command_actions.update({c: ('remove', 1) for c in ['footnote', 'includegraphics', 'IEEEauthorrefmark', 'label', 'documentclass', 'usepackage',
+                                                   'bibliographystyle', 'bibliography', 'addbibresource', 'cline', 'input', 'include',
+                                                   'vspace', 'hspace', 'url']})
+command_actions.update({c: ('remove', 2) for c in ['setlength', 'newcommand', 'renewcommand']})
+command_actions.update({'begin': ('environment', 1), 'end': ('environment', 1)})
+command_actions.update({c: ('accent', 1) for c in ["'", '`', '^', '"', '~', '=', '.', 'c', 'v', 'u', 'H', 'r']})
+
+# commands replaced by a text
+symbols = {'ldots': '...', 'dots': '...', 'Rightarrow': '=>', 'rightarrow': '->', 'le': '<=', 'leq': '<=', 'ge': '>=', 'geq': '>=',
+           'eg': 'e.g., ', 'item': '\t- ', '\\': '\n', '_': '_', '&': '&', '%': '%', '$': '$', '#': '#', '{': '{', '}': '}',
+           ' ': ' ', '\n': ' ', ',': ' ', 'i': 'i', 'j': 'j', 'ss': 'ß', 'hline': '_' * 45}
+DOUBLE_HLINE = '=' * 45
+
+# combining characters of the accent commands
+accents = {"'": '\u0301', '`': '\u0300', '^': '\u0302', '"': '\u0308', '~': '\u0303', '=': '\u0304', '.': '\u0307',
+           'c': '\u0327', 'v': '\u030c', 'u': '\u0306', 'H': '\u030b', 'r': '\u030a'}
+
+# number of mandatory arguments of environments after their name, e.g., \begin{tabular}{l|r}
+environment_arguments = {'tabular': 1, 'array': 1, 'tabularx': 2, 'tabulary': 2, 'longtable': 1, 'minipage': 1, 'multicols': 1, 'wrapfigure': 2}
+
+# spacing corrections, same as at the end of the regex rules (all linear in the length of the text)
+_cleanup = [(regex.compile(left), right) for left, right in [(r' +,', ','), (r' +', ' '), (r' +\)', ')'), (r'\( +', '('), (r' +\.', '.'),
+                                                              (r'[ \t]*\n', '\n'), (r'([ \t]*\n){3,}', '\n')]]
+
+def fingerprint() -> str:
+    """identifies the tables of the tokenizer backend, e.g., for caching detexed texts"""
+    return hashlib.sha1(repr((command_actions, symbols, accents, environment_arguments)).encode('utf-8')).hexdigest()
+
+class _Command:
+    # a command whose arguments are being read. out[start] is a slot reserved for its output (e.g., #-- of a section),
+    # the arguments read so far end at out[end]
+    __slots__ = ('name', 'action', 'n_args', 'start', 'end', 'args', 'space')
+
+    def __init__(self, name: str, action: str, n_args: int, start: int):
+        self.name = name
+        self.action = action
+        self.n_args = n_args
+        self.start = start
+        self.end = start + 1
+        self.args: list[tuple[int, int]] = []
+        # index of the white space between the command and its next argument
+        self.space: Optional[int] = None
+
+class _Frame:
+    # an open curly (kind group or argument) or square bracket (kind option) and the command waiting for its arguments
+    __slots__ = ('kind', 'start', 'command', 'expecting')
+
+    def __init__(self, kind: str, start: int, command: Optional[_Command] = None):
+        self.kind = kind
+        self.start = start
+        self.command = command
+        self.expecting: Optional[_Command] = None
+
+def _is_space(text: str) -> bool:
+    # white space allowed between a command and its arguments (at most one line break)
+    return not text.strip(' \t\n') and text.count('\n') <= 1
+
+def _accent(name: str, letter: str) -> str:
+    return unicodedata.normalize('NFC', letter + accents[name])
+
+class _Skip(str):
+    # first (empty) cell of removed output out[i:end], skipped as a whole when output around it is removed or searched
+    end: int
+
+def _skip(out: list[str], start: int, stop: int) -> None:
+    # marks the empty cells out[start:stop] to be skipped as a whole
+    if start < stop:
+        skip = _Skip()
+        skip.end = stop
+        out[start] = skip
+
+def _blank(out: list[str], start: int, stop: int) -> None:
+    # removes out[start:stop] without moving the output after it, each cell is blanked once
+    i = start
+    while i < stop:
+        cell = out[i]
+        out[i] = ''
+        i = cell.end if type(cell) is _Skip and cell.end <= stop else i + 1
+    _skip(out, start, stop)
+
+def _first_text(out: list[str], start: int, stop: int) -> Optional[int]:
+    # index of the first non-empty cell of out[start:stop], None if there is none
+    i = start
+    skipped = []
+    while i < stop:
+        cell = out[i]
+        if type(cell) is _Skip and cell.end <= stop:
+            skipped.append(cell)
+            i = cell.end
+        elif cell:
+            # everything up to i is empty, the next search skips it at once
+            for skip in skipped:
+                skip.end = i
+            return i
+        else:
+            i += 1
+    return None
+
+def _finish(frame: _Frame, out: list[str]) -> None:
+    # replaces the output of the command (out[start:end]) according to its action
+    # the output is only removed or replaced at the end of out or in place (in the reserved slot out[start] and by
+    # blanking the optional and the other arguments), so the argument, which may hold most of the document, is not moved
+    cmd = frame.expecting
+    frame.expecting = None
+    a, b = cmd.start, cmd.end
+    if cmd.action in ('remove', 'environment'):
+        out[a:b] = [' ']
+        return
+    if not cmd.args:
+        del out[a:b]
+        return
+    s, e = cmd.args[-1]
+    if cmd.action == 'section':
+        out[e:b] = ['--#\n']
+        out[a] = '\n#--'
+        _blank(out, a + 1, s)
+    elif cmd.action == 'bracket':
+        out[e:b] = [']']
+        out[a] = '['
+        _blank(out, a + 1, s)
+    else:
+        del out[e:b]
+        if s == len(out):
+            # empty argument at the end
+            del out[a:]
+            return
+        _blank(out, a, s)
+        if cmd.action == 'accent':
+            i = _first_text(out, s, e)
+            if i is not None:
+                # the accented letter goes to the reserved slot (all cells up to out[i] are empty), so accents
+                # stacked on a letter do not copy the letter with all of its accents again
+                out[a] = _accent(cmd.name, out[i][0])
+                out[i] = out[i][1:]
+                _skip(out, a + 1, i)
+
+@profiled('detex', 'tokenizer')
+def detex_tokenizer(text: str) -> str:
+    """removes all tex commands from a tex document and creates a text-only version of the document
+
+        Single pass over the tokens of the document with a stack of open brackets, so nested arguments (e.g.,
+        \\footnote{see \\cite{key}}) are handled and the time is linear in the length of the document. Each command
+        is handled according to command_actions and symbols.
+
+    Args:
+        text (string): input latex string
+
+    Returns:
+        string: text-only version of the input
+    """
+    begin = text.find('\\begin{document}')
+    pos = begin + len('\\begin{document}') if begin >= 0 else 0
+    out: list[str] = []
+    stack = [_Frame('root', 0)]
+    for m in _token_pattern.finditer(text, pos):
+        kind = m.lastgroup
+        value = m.group()
+        frame = stack[-1]
+        cmd = frame.expecting
+        if cmd is not None:
+            if kind == 'open' and (len(cmd.args) < cmd.n_args):
+                if cmd.space is not None:
+                    del out[cmd.space:]
+                    cmd.space = None
+                stack.append(_Frame('argument', len(out), cmd))
+                continue
+            if kind == 'open_bracket' and cmd.space is None:
+                stack.append(_Frame('option', len(out), cmd))
+                continue
+            if kind == 'text' and len(cmd.args) < cmd.n_args:
+                # the letter after the accent, e.g., \'e or \c c (spaces are skipped after a command name)
+                letter = value.lstrip(' \t') if cmd.action == 'accent' and cmd.name.isalpha() else value
+                if cmd.action == 'accent' and letter and not letter[0].isspace():
+                    frame.expecting = None
+                    del out[cmd.start:]
+                    out.append(_accent(cmd.name, letter[0]))
+                    out.append(letter[1:])
+                    continue
+                if cmd.space is None and _is_space(value):
+                    cmd.space = len(out)
+                    out.append(value)
+                    continue
+            _finish(frame, out)
+
+        if kind == 'text':
+            out.append(value)
+        elif kind == 'command':
+            name = value[1:]
+            action = command_actions.get(name) or command_actions.get(name.rstrip('*'))
+            if action is not None:
+                frame.expecting = _Command(name.rstrip('*'), action[0], action[1], len(out))
+                out.append('')
+            elif name in symbols:
+                replacement = symbols[name]
+                if name == 'hline':
+                    while out and out[-1] and not out[-1].strip(' \t'):
+                        out.pop()
+                    if out and out[-1] == replacement:
+                        out[-1] = DOUBLE_HLINE
+                        continue
+                out.append(replacement)
+        elif kind == 'open':
+            stack.append(_Frame('group', len(out)))
+        elif kind == 'close':
+            if frame.kind in ('group', 'argument'):
+                _close(stack, out)
+        elif kind == 'open_bracket':
+            out.append('[')
+        elif kind == 'close_bracket':
+            if frame.kind == 'option':
+                _close(stack, out)
+            else:
+                out.append(']')
+        elif kind == 'special':
+            out.append(' ' if value == '~' else '\t')
+        # comments and $ are dropped
+
+    while len(stack) > 1:
+        _close(stack, out)
+    if stack[0].expecting is not None:
+        _finish(stack[0], out)
+    text = ''.join(out)
+    for pattern, right in _cleanup:
+        text = pattern.sub(right, text)
+    return text
+
+def _close(stack: list[_Frame], out: list[str]) -> None:
+    # closes the innermost bracket
+    frame = stack.pop()
+    if frame.expecting is not None:
+        _finish(frame, out)
+    cmd = frame.command
+    if cmd is None:
+        return
+    if frame.kind == 'argument':
+        cmd.args.append((frame.start, len(out)))
+        if cmd.action == 'environment' and cmd.name == 'begin' and len(cmd.args) == 1:
+            cmd.n_args += environment_arguments.get(''.join(out[frame.start:]).strip(), 0)
+    cmd.end = len(out)
+    if len(cmd.args) >= cmd.n_args and not (cmd.action == 'environment' and cmd.name == 'begin'):
+        _finish(stack[-1], out)
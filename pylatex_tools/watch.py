@@ -0,0 +1,164 @@
+# %%
+import os
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+import traceback
+
+from typing import Callable, Optional
+
+from pylatex_tools.archive import watched_file
+
+# inotify event flags (see man 7 inotify)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+class PollingWatcher:
+    """waits for changes of files by polling their modification time and size
+
+    Args:
+        interval (float, optional): time between two checks in seconds. Defaults to 0.05.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.states: dict[str, Optional[tuple[int, int]]] = {}
+
+    def _state(self, filename: str) -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def set_files(self, filenames: list[str]) -> None:
+        """sets the files to be watched, changes of files that were already watched since they were set are still reported"""
+        self.states = {f: self.states[f] if f in self.states else self._state(f) for f in filenames}
+
+    def wait(self) -> list[str]:
+        """blocks until at least one of the files changed
+
+        Returns:
+            list: changed files
+        """
+        while True:
+            time.sleep(self.interval)
+            changed = [f for f, state in self.states.items() if self._state(f) != state]
+            if changed:
+                for f in changed:
+                    self.states[f] = self._state(f)
+                return changed
+
+    def close(self) -> None:
+        pass
+
+class InotifyWatcher:
+    """waits for changes of files using the linux inotify api
+
+        The directories of the files are watched (instead of the files), so that files that are saved
+        by writing a new file and renaming it (as many editors do) are still detected.
+
+    Args:
+        settle_time (float, optional): events arriving within this time after the first event are combined. Defaults to 0.02.
+    """
+
+    def __init__(self, settle_time: float = 0.02):
+        self.settle_time = settle_time
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._watches: dict[int, str] = {}
+        self._filenames: set[str] = set()
+
+    def set_files(self, filenames: list[str]) -> None:
+        """sets the files to be watched, changes of files that were already watched since they were set are still reported"""
+        self._filenames = {os.path.abspath(f) for f in filenames}
+        watched_dirs = set(self._watches.values())
+        for d in {os.path.dirname(f) for f in self._filenames} - watched_dirs:
+            wd = self._libc.inotify_add_watch(self._fd, d.encode(), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for %s' % d)
+            self._watches[wd] = d
+
+    def _read_events(self) -> set[str]:
+        changed = set()
+        data = os.read(self._fd, 64 * 1024)
+        p = 0
+        while p < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, p)
+            name = data[p + EVENT_HEADER.size:p + EVENT_HEADER.size + length].rstrip(b'\0').decode()
+            p += EVENT_HEADER.size + length
+            filename = os.path.join(self._watches.get(wd, ''), name)
+            if filename in self._filenames:
+                changed.add(filename)
+        return changed
+
+    def wait(self) -> list[str]:
+        """blocks until at least one of the files changed
+
+        Returns:
+            list: changed files
+        """
+        changed: set[str] = set()
+        while not changed:
+            select.select([self._fd], [], [])
+            changed |= self._read_events()
+        # combine the events of a single save (e.g., truncate and write)
+        while select.select([self._fd], [], [], self.settle_time)[0]:
+            changed |= self._read_events()
+        return sorted(changed)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+def make_watcher():
+    """returns an InotifyWatcher if inotify is available, otherwise a PollingWatcher"""
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError, TypeError):
+        return PollingWatcher()
+
+def watch(get_filenames: Callable[[], list[str]], run: Callable[[], None]) -> None:
+    """calls run and calls it again whenever one of the files changes, until interrupted (ctrl+c)
+
+        The files are watched while run is running, so a file that is saved during a run triggers another run.
+        An error in run (e.g., a file that is read while it is being saved, or a half typed command) is printed and
+        the files are watched further (the files of the last successful call of get_filenames).
+
+    Args:
+        get_filenames (callable): returns the files to be watched, called before the first run and after each run (e.g., included files can change)
+        run (callable): function that is called after each change
+    """
+    def files() -> list[str]:
+        # the files in a zip archive change with the archive
+        return list(dict.fromkeys(watched_file(f) for f in get_filenames()))
+
+    watcher = make_watcher()
+    try:
+        filenames = files()
+        watcher.set_files(filenames)
+        while True:
+            try:
+                run()
+            except Exception:
+                traceback.print_exc()
+            try:
+                filenames = files()
+            except Exception:
+                traceback.print_exc()
+            watcher.set_files(filenames)
+            print('\nwatching %d file(s) for changes (press ctrl+c to stop)' % len(filenames))
+            changed = watcher.wait()
+            print('\n' + '=' * 50)
+            print('changed: %s' % ', '.join(changed))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()